@@ -2,134 +2,164 @@
 import sys
 import os
 import json
-import markdown
 import uuid
 import tempfile
 import base64
+import gzip
 from datetime import datetime
-from werkzeug.utils import secure_filename
+from werkzeug.utils import secure_filename, get_content_type
 from io import BytesIO
 
-# Import required libraries for PDF and DOCX generation
-try:
-    from weasyprint import HTML, CSS
-    from weasyprint.text.fonts import FontConfiguration
-    WEASYPRINT_AVAILABLE = True
-except ImportError:
-    WEASYPRINT_AVAILABLE = False
+# Make the shared conversion modules in the project root importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# WeasyPrint and python-docx are imported by the first PDF or DOCX download, not on cold start
+from pdf_context import PDFRenderContext, load_weasyprint, weasyprint_status
+from storage import create_store
+from converter import convert_markdown, parse_document, document_html
+from metrics import registry as metrics_registry, timed, size_bucket
+from ingest import UploadTooLarge, read_upload
+from renderers import SourceDocument, get_renderer, is_supported, render
+from rendering import asset_fetcher
+from static_pages import accepted_encodings, accepts_encoding
 
 try:
-    from docx import Document
-    from docx.shared import Inches
-    DOCX_AVAILABLE = True
+    import brotli
+    BROTLI_AVAILABLE = True
 except ImportError:
-    DOCX_AVAILABLE = False
+    BROTLI_AVAILABLE = False
+
+# Bounded upload storage for Vercel (temporary)
+file_storage = create_store()
+
+# Same per-file limit as the Flask app
+MAX_UPLOAD_BYTES = 16 * 1024 * 1024
 
-# In-memory storage for Vercel (temporary)
-file_storage = {}
+# Stylesheet for generated PDFs
+PDF_STYLESHEET = """
+    body { font-family: 'Arial', sans-serif; line-height: 1.6; margin: 40px; }
+    h1 { color: #333; border-bottom: 2px solid #667eea; padding-bottom: 10px; }
+    h2 { color: #444; margin-top: 30px; }
+    h3 { color: #555; }
+    code { background: #f4f4f4; padding: 2px 4px; border-radius: 3px; }
+    pre { background: #f8f8f8; padding: 15px; border-radius: 5px; overflow-x: auto; }
+    blockquote { border-left: 4px solid #667eea; padding-left: 15px; margin: 20px 0; }
+    table { border-collapse: collapse; width: 100%; margin: 20px 0; }
+    th, td { border: 1px solid #ddd; padding: 8px; text-align: left; }
+    th { background-color: #f2f2f2; }
+"""
+
+# Fonts and compiled stylesheet shared across invocations of a warm function; images go
+# through the same cached, time-limited fetcher as the Flask app
+pdf_context = PDFRenderContext(PDF_STYLESHEET, url_fetcher=asset_fetcher)
+
+# Content types for raw binary downloads
+DOWNLOAD_MIMETYPES = {
+    'pdf': 'application/pdf',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+}
 
 def allowed_file(filename):
     """Check if file has allowed extension"""
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in {'md', 'markdown'}
 
-def generate_pdf(html_content, filename):
-    """Generate PDF from HTML content"""
-    if not WEASYPRINT_AVAILABLE:
-        return None, "WeasyPrint not available"
-    
-    try:
-        # Create styled HTML
-        styled_html = f"""
+def build_styled_html(html_content, inline_styles=True):
+    """Wrap converted markdown in a standalone HTML document"""
+    style_block = f"<style>{PDF_STYLESHEET}</style>" if inline_styles else ""
+    return f"""
         <!DOCTYPE html>
         <html>
         <head>
             <meta charset="UTF-8">
-            <style>
-                body {{ font-family: 'Arial', sans-serif; line-height: 1.6; margin: 40px; }}
-                h1 {{ color: #333; border-bottom: 2px solid #667eea; padding-bottom: 10px; }}
-                h2 {{ color: #444; margin-top: 30px; }}
-                h3 {{ color: #555; }}
-                code {{ background: #f4f4f4; padding: 2px 4px; border-radius: 3px; }}
-                pre {{ background: #f8f8f8; padding: 15px; border-radius: 5px; overflow-x: auto; }}
-                blockquote {{ border-left: 4px solid #667eea; padding-left: 15px; margin: 20px 0; }}
-                table {{ border-collapse: collapse; width: 100%; margin: 20px 0; }}
-                th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
-                th {{ background-color: #f2f2f2; }}
-            </style>
+            {style_block}
         </head>
         <body>
             {html_content}
         </body>
         </html>
         """
+
+def wants_binary(request):
+    """Check whether the client asked for the raw file instead of base64 JSON
+
+    Either ?mode=binary or an Accept header naming the file type (or
+    application/octet-stream) selects binary mode; JSON stays the default.
+    """
+    mode = request.args.get('mode', '')
+    if mode:
+        return mode == 'binary'
+    accept = request.headers.get('Accept', '')
+    return any(mimetype in accept for mimetype in list(DOWNLOAD_MIMETYPES.values()) + ['application/octet-stream'])
+
+def binary_response(data, mimetype, download_name):
+    """Return raw file bytes as an attachment"""
+    return data, 200, {
+        # Text formats are UTF-8; get_content_type adds the charset to text/* types only
+        'Content-Type': get_content_type(mimetype, 'utf-8'),
+        'Content-Disposition': f'attachment; filename="{download_name}"',
+        'Content-Length': str(len(data)),
+        'Cache-Control': 'no-cache'
+    }
+
+def compressed_response(body, mimetype, download_name, accept_encoding):
+    """Return a text attachment, compressed with brotli or gzip if the client accepts it"""
+    data = body.encode('utf-8')
+    headers = {
+        'Content-Type': f'{mimetype}; charset=utf-8',
+        'Content-Disposition': f'attachment; filename="{download_name}"',
+        'Cache-Control': 'no-cache',
+        'Vary': 'Accept-Encoding'
+    }
+    accepted = accepted_encodings(accept_encoding)
+    if BROTLI_AVAILABLE and accepts_encoding(accepted, 'br'):
+        data = brotli.compress(data, quality=5)
+        headers['Content-Encoding'] = 'br'
+    elif accepts_encoding(accepted, 'gzip'):
+        data = gzip.compress(data, compresslevel=6)
+        headers['Content-Encoding'] = 'gzip'
+    headers['Content-Length'] = str(len(data))
+    return data, 200, headers
+
+def generate_pdf(html_content, filename, images=()):
+    """Generate PDF from HTML content, fetching its remote images concurrently first"""
+    if not load_weasyprint():
+        return None, "WeasyPrint not available"
+    
+    try:
+        asset_fetcher.prefetch(images, wait=True)
+        
+        # Styles come from the shared pre-compiled stylesheet
+        styled_html = build_styled_html(html_content, inline_styles=False)
         
         # Generate PDF
-        font_config = FontConfiguration()
-        html_doc = HTML(string=styled_html)
-        pdf = html_doc.write_pdf(
-            stylesheets=[],
-            font_config=font_config,
-            optimize_images=False
-        )
+        pdf = pdf_context.write_pdf(styled_html)
         
         return pdf, None
     except Exception as e:
         return None, str(e)
 
-def generate_docx(md_content, filename):
-    """Generate DOCX from markdown content"""
-    if not DOCX_AVAILABLE:
+def generate_docx(md_content, filename, html_content=None):
+    """Generate DOCX from markdown content, or its already-converted HTML"""
+    if not get_renderer('docx').available():
         return None, "python-docx not available"
     
     try:
-        # Create Word document
-        doc = Document()
-        
-        # Add title
-        title = doc.add_heading(filename.replace('.md', '').replace('.markdown', ''), 0)
-        
-        # Convert markdown to HTML for parsing
-        html_content = markdown.markdown(
-            md_content, 
-            extensions=['extra', 'tables', 'codehilite', 'toc']
-        )
+        from docx_writer import new_document, html_to_docx, docx_bytes
+        # Convert markdown to HTML and write it into the document in one pass
+        if html_content is None:
+            html_content = convert_markdown(md_content)
         
-        # Simple parsing of HTML to add content
-        lines = html_content.split('\n')
-        for line in lines:
-            line = line.strip()
-            if line.startswith('<h1>'):
-                doc.add_heading(line.replace('<h1>', '').replace('</h1>', ''), 1)
-            elif line.startswith('<h2>'):
-                doc.add_heading(line.replace('<h2>', '').replace('</h2>', ''), 2)
-            elif line.startswith('<h3>'):
-                doc.add_heading(line.replace('<h3>', '').replace('</h3>', ''), 3)
-            elif line.startswith('<p>') and line.endswith('</p>'):
-                text = line.replace('<p>', '').replace('</p>', '')
-                doc.add_paragraph(text)
-            elif line.startswith('<ul>') or line.startswith('<ol>'):
-                # Handle lists
-                pass
-            elif line.startswith('<li>'):
-                text = line.replace('<li>', '').replace('</li>', '')
-                doc.add_paragraph(text, style='List Bullet')
-            elif line.startswith('<blockquote>'):
-                text = line.replace('<blockquote><p>', '').replace('</p></blockquote>', '')
-                doc.add_paragraph(text, style='Quote')
-            elif line.startswith('<pre>'):
-                # Handle code blocks
-                pass
-            elif line and not line.startswith('<'):
-                # Plain text
-                doc.add_paragraph(line)
-        
-        # Save to bytes
-        docx_bytes = BytesIO()
-        doc.save(docx_bytes)
-        docx_bytes.seek(0)
+        with timed('docx_build'):
+            # Create Word document
+            doc = new_document()
+            
+            # Add title
+            title = doc.add_heading(filename.replace('.md', '').replace('.markdown', ''), 0)
+            html_to_docx(html_content, doc)
         
-        return docx_bytes.getvalue(), None
+        with timed('docx_save'):
+            return docx_bytes(doc), None
     except Exception as e:
         return None, str(e)
 
@@ -137,6 +167,10 @@ def handler(request):
     """Vercel serverless function handler for all routes"""
     path = request.path
     method = request.method
+    metrics_registry.reset_labels()
+    
+    if path == '/metrics':
+        return metrics_registry.render(), 200, {'Content-Type': 'text/plain; version=0.0.4'}
     
     # Handle ads.txt
     if path == '/ads.txt':
@@ -155,8 +189,8 @@ def handler(request):
             'request_method': method,
             'request_path': path,
             'file_storage_count': len(file_storage),
-            'weasyprint_available': WEASYPRINT_AVAILABLE,
-            'docx_available': DOCX_AVAILABLE,
+            'weasyprint_available': load_weasyprint(),
+            'docx_available': get_renderer('docx').available(),
             'temp_dir': tempfile.gettempdir(),
             'environment': 'vercel'
         }
@@ -180,27 +214,33 @@ def handler(request):
             unique_id = str(uuid.uuid4())
             filename = f"{unique_id}_{secure_filename(file.filename or 'upload')}"
             
-            # Read file content
-            content = file.read().decode('utf-8')
+            # Read file content in chunks, stopping once it passes the limit
+            try:
+                with timed('upload_read'):
+                    content, content_hash, size = read_upload(file.stream, MAX_UPLOAD_BYTES)
+            except UploadTooLarge as e:
+                return json.dumps({'error': str(e)}), 413, {'Content-Type': 'application/json'}
+            metrics_registry.bind(format='md', size=size_bucket(size))
             
-            # Store in memory
-            file_storage[filename] = {
-                'content': content,
-                'original_filename': file.filename,
-                'upload_time': datetime.now().isoformat()
-            }
+            # Parse once; downloads reuse the stored HTML
+            document = parse_document(content, content_hash=content_hash)
             
-            # Convert markdown to HTML for preview
-            html_content = markdown.markdown(
-                content, 
-                extensions=['extra', 'tables', 'codehilite', 'toc']
-            )
+            # Store in memory
+            with timed('store'):
+                file_storage[filename] = {
+                    'content': content,
+                    'original_filename': file.filename,
+                    'upload_time': datetime.now().isoformat(),
+                    **document
+                }
             
             return json.dumps({
                 'success': True,
                 'filename': filename,
                 'original_filename': file.filename,
-                'preview_html': html_content,
+                'preview_html': document['html'],
+                'toc_html': document['toc'],
+                'metadata': document['metadata'],
                 'message': 'File uploaded successfully!'
             }), 200, {'Content-Type': 'application/json'}
             
@@ -215,50 +255,91 @@ def handler(request):
         try:
             parts = path.split('/')
             if len(parts) >= 4:
-                format_type = parts[2]  # pdf or docx
+                format_type = parts[2]  # pdf, docx or another registered format
                 filename = parts[3]
                 
-                if filename not in file_storage:
+                file_data = file_storage.get(filename)
+                if file_data is None:
                     return json.dumps({'error': 'File not found'}), 404, {'Content-Type': 'application/json'}
                 
-                file_data = file_storage[filename]
                 md_content = file_data['content']
+                metrics_registry.bind(format=format_type, size=size_bucket(len(md_content)))
+                html_content = document_html(file_data)
+                
+                binary = wants_binary(request)
                 
                 if format_type == 'pdf':
-                    pdf_data, error = generate_pdf(
-                        markdown.markdown(md_content, extensions=['extra', 'tables', 'codehilite', 'toc']),
-                        filename
-                    )
+                    pdf_filename = filename.replace('.md', '.pdf').replace('.markdown', '.pdf')
+                    pdf_data, error = generate_pdf(html_content, filename,
+                                                   images=file_data.get('metadata', {}).get('images', []))
                     if error:
+                        if binary:
+                            # Serve the styled HTML instead so the user still gets a printable document
+                            html_filename = filename.replace('.md', '.html').replace('.markdown', '.html')
+                            return compressed_response(
+                                build_styled_html(html_content), 'text/html', html_filename,
+                                request.headers.get('Accept-Encoding', '')
+                            )
                         return json.dumps({'error': f'PDF generation failed: {error}'}), 500, {'Content-Type': 'application/json'}
                     
+                    if binary:
+                        return binary_response(pdf_data, DOWNLOAD_MIMETYPES['pdf'], pdf_filename)
+                    
                     # Return PDF as base64
-                    pdf_base64 = base64.b64encode(pdf_data).decode('utf-8')
+                    with timed('response'):
+                        pdf_base64 = base64.b64encode(pdf_data).decode('utf-8')
                     return json.dumps({
                         'success': True,
                         'format': 'pdf',
-                        'filename': filename.replace('.md', '.pdf').replace('.markdown', '.pdf'),
+                        'filename': pdf_filename,
                         'data': pdf_base64,
                         'message': 'PDF generated successfully'
                     }), 200, {'Content-Type': 'application/json'}
                 
                 elif format_type == 'docx':
-                    docx_data, error = generate_docx(md_content, filename)
+                    docx_filename = filename.replace('.md', '.docx').replace('.markdown', '.docx')
+                    docx_data, error = generate_docx(md_content, filename, html_content)
                     if error:
                         return json.dumps({'error': f'DOCX generation failed: {error}'}), 500, {'Content-Type': 'application/json'}
                     
+                    if binary:
+                        return binary_response(docx_data, DOWNLOAD_MIMETYPES['docx'], docx_filename)
+                    
                     # Return DOCX as base64
-                    docx_base64 = base64.b64encode(docx_data).decode('utf-8')
+                    with timed('response'):
+                        docx_base64 = base64.b64encode(docx_data).decode('utf-8')
                     return json.dumps({
                         'success': True,
                         'format': 'docx',
-                        'filename': filename.replace('.md', '.docx').replace('.markdown', '.docx'),
+                        'filename': docx_filename,
                         'data': docx_base64,
                         'message': 'DOCX generated successfully'
                     }), 200, {'Content-Type': 'application/json'}
                 
+                elif is_supported(format_type):
+                    base_name = filename.replace('.md', '').replace('.markdown', '')
+                    output_filename = f'{base_name}.{format_type}'
+                    try:
+                        data = render(SourceDocument(md_content, html_content, file_data.get('toc'), base_name,
+                                                       metadata=file_data.get('metadata')), format_type)
+                    except Exception as e:
+                        return json.dumps({'error': f'{format_type} generation failed: {e}'}), 500, {'Content-Type': 'application/json'}
+                    
+                    if binary:
+                        return binary_response(data, get_renderer(format_type).mimetype, output_filename)
+                    
+                    with timed('response'):
+                        encoded = base64.b64encode(data).decode('utf-8')
+                    return json.dumps({
+                        'success': True,
+                        'format': format_type,
+                        'filename': output_filename,
+                        'data': encoded,
+                        'message': f'{get_renderer(format_type).label} generated successfully'
+                    }), 200, {'Content-Type': 'application/json'}
+                
                 else:
-                    return json.dumps({'error': 'Invalid format. Use pdf or docx'}), 400, {'Content-Type': 'application/json'}
+                    return json.dumps({'error': 'Invalid format'}), 400, {'Content-Type': 'application/json'}
             else:
                 return json.dumps({'error': 'Invalid download path'}), 400, {'Content-Type': 'application/json'}
         except Exception as e:
@@ -267,8 +348,7 @@ def handler(request):
     # Default response for other routes
     return json.dumps({
         'message': 'Markdown to PDF Converter API',
-        'available_routes': ['/upload', '/download/{format}/{filename}', '/ads.txt', '/debug'],
+        'available_routes': ['/upload', '/download/{format}/{filename}[?mode=binary]', '/ads.txt', '/debug'],
         'status': 'running',
-        'weasyprint_available': WEASYPRINT_AVAILABLE,
-        'docx_available': DOCX_AVAILABLE
+        'backends': {'pdf': weasyprint_status(), 'docx': get_renderer('docx').status()}
     }), 200, {'Content-Type': 'application/json'}
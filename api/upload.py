@@ -1,13 +1,19 @@
 from flask import Flask, request, jsonify
-import markdown
 import uuid
 import os
 import tempfile
 from datetime import datetime
+import sys
 from werkzeug.utils import secure_filename
 
-# In-memory storage for Vercel
-file_storage = {}
+# Make the shared modules in the project root importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import create_store
+from converter import parse_document
+
+# Bounded in-memory storage for Vercel
+file_storage = create_store()
 
 def allowed_file(filename):
     """Check if file has allowed extension"""
@@ -38,24 +44,24 @@ def handler(request):
         # Read file content
         content = file.read().decode('utf-8')
         
+        # Parse once; downloads reuse the stored HTML
+        document = parse_document(content)
+        
         # Store in memory
         file_storage[filename] = {
             'content': content,
             'original_filename': file.filename,
-            'upload_time': datetime.now()
+            'upload_time': datetime.now().isoformat(),
+            **document
         }
         
-        # Convert markdown to HTML for preview
-        html_content = markdown.markdown(
-            content, 
-            extensions=['extra', 'tables', 'codehilite', 'toc']
-        )
-        
         return jsonify({
             'success': True,
             'filename': filename,
             'original_filename': file.filename,
-            'preview_html': html_content,
+            'preview_html': document['html'],
+            'toc_html': document['toc'],
+            'metadata': document['metadata'],
             'message': 'File uploaded successfully!'
         })
         
@@ -1,19 +1,32 @@
 import os
 import logging
-import markdown
-import requests
 import json
-from flask import Flask, request, render_template, send_file, flash, redirect, url_for, Response, jsonify
+from flask import Flask, request, render_template, send_file, flash, redirect, url_for, Response, jsonify, g
 from werkzeug.utils import secure_filename
-from docx import Document
-from docx.shared import Pt
-from docx.enum.text import WD_ALIGN_PARAGRAPH
 import io
 import uuid
+import time
 from datetime import datetime
-from weasyprint import HTML, CSS
-from weasyprint.text.fonts import FontConfiguration
 import tempfile
+from render_cache import RenderCache
+from storage import create_store
+from reaper import ExpiryReaper, remove_file
+from rendering import (
+    RENDER_VERSION, pdf_context, asset_fetcher,
+    build_styled_html, render_pdf, render_document
+)
+from jobs import JobQueue, QueueFullError
+from converter import PREVIEW_EXTENSIONS, get_pool, pool_stats, parse_document, convert_markdown
+from batch import BatchConverter, BatchError, read_uploaded_documents, stream_zip
+from sections import IncrementalRenderer
+from pdf_chunks import ChunkedPDFRenderer
+from metrics import registry as metrics_registry, timed, size_bucket
+from ingest import UploadQuota, UploadTooLarge, read_upload
+from highlighting import highlight_cache, warm_lexers
+from static_pages import StaticPages
+from renderers import (
+    RENDERERS, SourceDocument, RendererUnavailable, get_renderer, is_supported, load_all, render, render_many
+)
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -42,14 +55,196 @@ try:
 except Exception as e:
     logging.error(f"Error creating upload folder: {e}")
 
-# File storage for Vercel serverless environment
-file_storage = {}
-
 # Configure for Vercel serverless environment
 def get_temp_dir():
     """Get temporary directory for Vercel"""
     return '/tmp' if os.path.exists('/tmp') else tempfile.gettempdir()
 
+# Uploaded file storage; the disk backend is shared by all workers on the host
+file_storage = create_store(default_backend='disk', base_dir=get_temp_dir())
+
+# Uploads and previews need the lightweight parser on every worker
+get_pool(PREVIEW_EXTENSIONS).warm()
+
+# Exercises the code paths a first real conversion hits: toc, tables, codehilite and PDF/DOCX layout
+WARM_UP_DOCUMENT = """# Warm-up document
+
+A paragraph with **bold**, *italic*, `inline code` and a [link](https://example.com).
+
+## Table
+
+| Format | Library | Notes |
+|--------|---------|-------|
+| PDF | WeasyPrint | Fonts, *layout* |
+| DOCX | python-docx | `styles` |
+
+## Code
+
+```python
+def convert(path):
+    return {'path': path, 'pages': 1}
+```
+
+```javascript
+const result = await fetch('/upload', { method: 'POST' });
+```
+
+```bash
+gunicorn --config gunicorn_config.py main:app
+```
+
+> A quote, then a list:
+
+1. First
+2. Second
+    - Nested
+"""
+
+def warm_up(render_sample=False):
+    """Load the conversion backends and build shared render state ahead of the first download
+
+    WeasyPrint (with Pango/Cairo) and python-docx are otherwise imported on
+    first use, so page, blog and upload requests never pay for them. Call
+    this before forking workers, or set PRELOAD_BACKENDS=1 to run it at import.
+    With render_sample, WARM_UP_DOCUMENT is also converted to every loaded
+    format so fonts, shaping caches and styles are built too.
+    Returns the seconds spent on each step.
+    """
+    timings = {}
+    for format, seconds in load_all().items():
+        timings[f'import_{format}'] = seconds
+    started = time.perf_counter()
+    try:
+        # Fonts and compiled stylesheet, rather than on the first PDF download
+        pdf_context.warm()
+    except Exception as e:
+        logging.warning(f"PDF render context not initialised at startup: {e}")
+    timings['pdf_context'] = time.perf_counter() - started
+    started = time.perf_counter()
+    # Full Markdown parsers (extensions, Pygments) for conversions
+    get_pool().warm()
+    warm_lexers()
+    timings['markdown'] = time.perf_counter() - started
+    if render_sample:
+        started = time.perf_counter()
+        # Label the sample's stage timings so they are not mistaken for real conversions
+        metrics_registry.bind(phase='warm_up')
+        try:
+            document = parse_document(WARM_UP_DOCUMENT)
+            source = SourceDocument(WARM_UP_DOCUMENT, document['html'], document['toc'], title='Warm-up')
+            formats = [format for format in ('pdf', 'docx') if get_renderer(format).status() == 'loaded']
+            for format, data, error in render_many(source, formats):
+                if error:
+                    logging.warning(f"Warm-up {format} render failed: {error}")
+        finally:
+            metrics_registry.reset_labels()
+        timings['sample_render'] = time.perf_counter() - started
+    logging.info(f"Backends warmed up in {sum(timings.values()) * 1000:.0f}ms")
+    return timings
+
+if os.environ.get('PRELOAD_BACKENDS', '0') == '1':
+    warm_up()
+
+# PDFs up to this size are rendered in memory; larger ones are spooled to disk and streamed
+PDF_SPOOL_THRESHOLD = int(os.environ.get('PDF_SPOOL_THRESHOLD', 4 * 1024 * 1024))
+
+# Cache of rendered PDF/DOCX output keyed by content hash
+render_cache = RenderCache(
+    max_bytes=int(os.environ.get('RENDER_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+    disk_dir=os.path.join(get_temp_dir(), 'render_cache') if os.environ.get('RENDER_CACHE_DISK', '1') == '1' else None,
+    disk_max_bytes=int(os.environ.get('RENDER_CACHE_DISK_MAX_BYTES', 512 * 1024 * 1024)),
+    max_entry_bytes=PDF_SPOOL_THRESHOLD
+)
+
+# Per-section HTML/DOCX cache so edits to large documents only re-render what changed
+section_cache = RenderCache(
+    max_bytes=int(os.environ.get('SECTION_CACHE_MAX_BYTES', 32 * 1024 * 1024)),
+    disk_dir=os.path.join(get_temp_dir(), 'section_cache') if os.environ.get('RENDER_CACHE_DISK', '1') == '1' else None,
+    disk_max_bytes=int(os.environ.get('SECTION_CACHE_DISK_MAX_BYTES', 256 * 1024 * 1024))
+)
+incremental_renderer = IncrementalRenderer(section_cache)
+
+# Documents at least this large (in characters) are rendered incrementally; 0 disables
+INCREMENTAL_MIN_BYTES = int(os.environ.get('INCREMENTAL_MIN_BYTES', 256 * 1024))
+
+# PDFs of documents at least this large (in characters) are laid out in chunks on parallel
+# worker processes and merged, bounding WeasyPrint's memory per process; 0 disables
+CHUNKED_PDF_MIN_BYTES = int(os.environ.get('CHUNKED_PDF_MIN_BYTES', 2 * 1024 * 1024))
+chunked_pdf_renderer = ChunkedPDFRenderer(
+    max_workers=int(os.environ.get('CHUNKED_PDF_WORKERS', 0)) or None,
+    chunk_bytes=int(os.environ.get('CHUNKED_PDF_CHUNK_BYTES', 512 * 1024)),
+    timeout=int(os.environ.get('CONVERT_JOB_TIMEOUT', 120))
+)
+
+# Per-tenant upload volume cap over the storage TTL; 0 disables
+upload_quota = UploadQuota(
+    max_bytes=int(os.environ.get('UPLOAD_TENANT_QUOTA_BYTES', 0)),
+    window=file_storage.ttl
+)
+# Tenants are identified by this header when a trusted proxy sets it, otherwise by client address
+UPLOAD_TENANT_HEADER = os.environ.get('UPLOAD_TENANT_HEADER', '')
+# Request bodies of these types are read as the markdown file itself, skipping form parsing
+RAW_UPLOAD_MIMETYPES = {'text/markdown', 'text/x-markdown', 'text/plain', 'application/octet-stream'}
+
+# Expires uploads off the request path; other workers' uploads are caught by the periodic purge
+upload_reaper = ExpiryReaper(sweep_interval=int(os.environ.get('CLEANUP_SWEEP_INTERVAL', 300)))
+upload_reaper.add_sweep(file_storage.purge_expired)
+upload_reaper.add_sweep(upload_quota.purge_expired)
+
+# Background conversion jobs for POST /convert. Job state lives in file_storage and results in
+# render_cache, so any worker can answer /jobs polls for a job another worker ran
+conversion_jobs = JobQueue(
+    render_document,
+    max_workers=int(os.environ.get('CONVERT_WORKERS', 0)) or None,
+    max_pending=int(os.environ.get('CONVERT_QUEUE_DEPTH', 16)),
+    timeout=int(os.environ.get('CONVERT_JOB_TIMEOUT', 120)),
+    on_result=lambda job, data: render_cache.put(job['cache_key'], data),
+    store=file_storage
+)
+
+# Process pool for POST /batch, sized to the host's cores by default
+batch_converter = BatchConverter(
+    render_document,
+    max_workers=int(os.environ.get('BATCH_WORKERS', 0)) or None,
+    timeout=int(os.environ.get('CONVERT_JOB_TIMEOUT', 120))
+)
+BATCH_MAX_FILES = int(os.environ.get('BATCH_MAX_FILES', 500))
+BATCH_MAX_BYTES = int(os.environ.get('BATCH_MAX_BYTES', 64 * 1024 * 1024))
+
+# Blog post slugs and the pre-rendered HTML files they are served from
+BLOG_POSTS = {
+    'convert-markdown-to-pdf-online-free': 'blog/convert-markdown-to-pdf-online-free.html',
+    'best-free-markdown-to-pdf-converters-2025': 'blog/best-free-markdown-to-pdf-converters-2025.html',
+    'convert-markdown-to-word-documents-online': 'blog/convert-markdown-to-word-documents-online.html',
+    'markdown-tips-tricks-technical-writers': 'blog/markdown-tips-tricks-technical-writers.html',
+    'troubleshooting-markdown-to-pdf-conversion': 'blog/troubleshooting-markdown-to-pdf-conversion.html'
+}
+
+# Landing and blog pages, rendered and compressed once and served from memory
+static_pages = StaticPages(max_age=int(os.environ.get('STATIC_PAGE_MAX_AGE', 3600)))
+
+def load_static_pages():
+    """Render the page templates and read the blog posts into static_pages"""
+    with app.app_context():
+        for template in ['index.html', 'blog_index.html']:
+            try:
+                static_pages.add(template, render_template(template))
+            except Exception as e:
+                logging.error(f"Could not pre-render {template}: {e}")
+    for post_name, path in BLOG_POSTS.items():
+        static_pages.load(f'blog/{post_name}', path)
+
+load_static_pages()
+
+def static_page_response(name, status=200):
+    """Serve a preloaded page, honouring Accept-Encoding and If-None-Match"""
+    return static_pages.respond(
+        name,
+        if_none_match=request.headers.get('If-None-Match', ''),
+        accept_encoding=request.headers.get('Accept-Encoding', ''),
+        status=status
+    )
+
 # reCAPTCHA configuration
 RECAPTCHA_SECRET_KEY = "6LeSYJ0rAAAAABx3xOqWudqBdr36gK6IcTUnBgaK"
 RECAPTCHA_VERIFY_URL = "https://www.google.com/recaptcha/api/siteverify"
@@ -59,25 +254,145 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def cleanup_old_files():
-    """Remove files older than 1 hour from uploads directory"""
+def schedule_upload_folder_cleanup():
+    """Index existing files in the uploads directory so the reaper removes them after 1 hour"""
     try:
-        current_time = datetime.now()
-        for filename in os.listdir(UPLOAD_FOLDER):
-            if filename == '.gitkeep':
-                continue
-            filepath = os.path.join(UPLOAD_FOLDER, filename)
-            if os.path.isfile(filepath):
-                file_time = datetime.fromtimestamp(os.path.getctime(filepath))
-                if (current_time - file_time).seconds > 3600:  # 1 hour
-                    os.remove(filepath)
-                    logging.info(f"Removed old file: {filename}")
+        with os.scandir(UPLOAD_FOLDER) as entries:
+            for entry in entries:
+                if entry.name == '.gitkeep' or not entry.is_file():
+                    continue
+                upload_reaper.schedule(entry.stat().st_ctime + file_storage.ttl, remove_file, entry.path)
     except Exception as e:
-        logging.error(f"Error cleaning up files: {e}")
+        logging.error(f"Error scheduling upload cleanup: {e}")
+
+# Index the uploads folder once at startup instead of scanning it on every page load
+schedule_upload_folder_cleanup()
+
+def download_base_name(filename):
+    """Get original filename without extension and unique ID"""
+    original_name = filename.split('_', 1)[1] if '_' in filename else filename
+    return os.path.splitext(original_name)[0]
+
+def converted_file_response(data, format, base_name, size=None):
+    """Build the download response for converted output in any registered format
+
+    data may be bytes, the path of a file on disk, or an open binary file
+    of the given size. Bytes and paths get Content-Length and Range support;
+    paths are sent with zero-copy sendfile where the server supports it.
+    """
+    if isinstance(data, bytes):
+        data = io.BytesIO(data)
+    
+    with timed('response'):
+        response = send_file(
+            data,
+            as_attachment=True,
+            download_name=f'{base_name}.{format}',
+            mimetype=get_renderer(format).mimetype,
+            conditional=True
+        )
+    if response.content_length is None and size is not None:
+        response.content_length = size
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def document_html(file_data):
+    """Return the syntax-highlighted HTML for an upload, converting it at most once per content
+
+    Uploads only store a plain preview render, so the highlighted HTML is
+    built on first use by /preview or a download and kept in the render
+    cache, shared by identical documents and by other workers.
+    """
+    if file_data.get('html') is not None:
+        # Records stored before previews were rendered lazily
+        return file_data['html']
+    key = RenderCache.make_key(file_data['content'], 'html-fragment', RENDER_VERSION)
+    cached = render_cache.get(key)
+    if cached is not None:
+        return cached.decode('utf-8')
+    html_content = convert_markdown(file_data['content'])
+    render_cache.put(key, html_content.encode('utf-8'))
+    return html_content
+
+def source_document(file_data, base_name, html_content=None):
+    """Wrap an upload record for the renderers, reusing its HTML and stored TOC"""
+    if html_content is None:
+        html_content = document_html(file_data)
+    return SourceDocument(file_data['content'], html_content, file_data.get('toc'), title=base_name,
+                          metadata=file_data.get('metadata'))
+
+def requested_formats(value):
+    """Split a comma-separated format list, returning None if any format is unknown"""
+    formats = list(dict.fromkeys(f.strip() for f in value.split(',') if f.strip()))
+    if not formats or not all(is_supported(f) for f in formats):
+        return None
+    return formats
+
+def archive_response(file_data, formats, base_name):
+    """Stream a zip with the upload converted to each format, sharing one parsed document"""
+    md_content = file_data['content']
+    
+    def results():
+        document = None
+        for format in formats:
+            cache_key = RenderCache.make_key(md_content, format, RENDER_VERSION)
+            data, error = render_cache.get(cache_key), None
+            if data is None:
+                document = document or source_document(file_data, base_name)
+                _, data, error = render_many(document, [format])[0]
+                if error is None:
+                    render_cache.put(cache_key, data)
+            yield f'{base_name}.md', format, data, error
+    
+    return Response(
+        stream_zip(results()),
+        mimetype='application/zip',
+        headers={
+            'Content-Disposition': f'attachment; filename="{base_name}.zip"',
+            'Cache-Control': 'no-cache'
+        }
+    )
+
+def render_pdf_response(html_content, cache_key, base_name, write_pdf=None):
+    """Render a PDF into a spooled temp file, cache it and stream it back
+
+    Peak memory is bounded by PDF_SPOOL_THRESHOLD rather than by the size
+    of the document; larger output rolls over to disk before being sent.
+    write_pdf(target) replaces the default full render when given.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_THRESHOLD, dir=get_temp_dir())
+    try:
+        if write_pdf is not None:
+            write_pdf(spool)
+        else:
+            render_pdf(html_content, target=spool)
+        size = spool.tell()
+        spool.seek(0)
+        
+        if size <= PDF_SPOOL_THRESHOLD:
+            pdf = spool.read()
+            spool.close()
+            with timed('cache_store'):
+                render_cache.put(cache_key, pdf)
+            return converted_file_response(pdf, 'pdf', base_name)
+        
+        with timed('cache_store'):
+            cached_path = render_cache.put_file(cache_key, spool, size)
+        if cached_path:
+            spool.close()
+            return converted_file_response(cached_path, 'pdf', base_name)
+        
+        # No disk tier to serve from: stream the spool itself, closed with the response
+        spool.seek(0)
+        return converted_file_response(spool, 'pdf', base_name, size=size)
+    except Exception:
+        spool.close()
+        raise
 
 def verify_recaptcha(recaptcha_response):
     """Verify reCAPTCHA response with Google's API"""
     try:
+        import requests
         data = {
             'secret': RECAPTCHA_SECRET_KEY,
             'response': recaptcha_response
@@ -97,8 +412,7 @@ def verify_recaptcha(recaptcha_response):
 def index():
     """Main page"""
     try:
-        cleanup_old_files()
-        return render_template('index.html')
+        return static_page_response('index.html') or render_template('index.html')
     except Exception as e:
         logging.error(f"Error in index route: {e}")
         return render_template('index.html')
@@ -130,28 +444,162 @@ def debug():
         'files_in_cwd': os.listdir('.'),
         'temp_dir': get_temp_dir(),
         'temp_dir_exists': os.path.exists(get_temp_dir()),
-        'file_storage_count': len(file_storage)
+        'file_storage_count': len(file_storage),
+        'file_storage': file_storage.stats(),
+        'upload_reaper': upload_reaper.stats(),
+        'upload_quota': upload_quota.stats(),
+        'highlight_cache': highlight_cache.stats(),
+        'static_pages': static_pages.stats(),
+        'render_cache': render_cache.stats(),
+        'conversion_jobs': conversion_jobs.stats(),
+        'chunked_pdf': chunked_pdf_renderer.stats(),
+        'asset_fetcher': asset_fetcher.stats(),
+        'markdown_pools': pool_stats(),
+        'output_backends': {renderer.format: renderer.status() for renderer in RENDERERS.values()},
+        'batch': batch_converter.stats(),
+        'section_cache': section_cache.stats(),
+        'incremental': incremental_renderer.stats()
     })
 
+@app.before_request
+def start_request_timer():
+    metrics_registry.reset_labels()
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        labels = {'endpoint': request.endpoint or 'unknown', 'method': request.method}
+        metrics_registry.observe('http_request_seconds', time.perf_counter() - started, **labels)
+        metrics_registry.inc('http_requests_total', status=str(response.status_code), **labels)
+    return response
+
+def collect_app_metrics():
+    """Scrape-time gauges for storage, caches and queues"""
+    storage = file_storage.stats()
+    yield 'file_storage_entries', 'gauge', 'Records (upload handles and shared documents) currently stored', storage['entries']
+    if 'bytes' in storage:
+        yield 'file_storage_bytes', 'gauge', 'Bytes held by the upload store', storage['bytes']
+    for name, cache in [('render', render_cache), ('section', section_cache)]:
+        stats = cache.stats()
+        yield f'{name}_cache_lookups_total', 'counter', f'{name.capitalize()} cache lookups by result', {
+            (('result', 'memory_hit'),): stats['memory_hits'],
+            (('result', 'disk_hit'),): stats['disk_hits'],
+            (('result', 'miss'),): stats['misses'],
+        }
+        yield f'{name}_cache_hit_rate', 'gauge', f'{name.capitalize()} cache hit rate since startup', stats['hit_rate']
+        yield f'{name}_cache_bytes', 'gauge', f'{name.capitalize()} cache size by tier', {
+            (('tier', 'memory'),): stats['bytes'],
+            (('tier', 'disk'),): stats['disk_bytes'],
+        }
+    jobs = conversion_jobs.stats()
+    yield 'conversion_queue_depth', 'gauge', 'Background conversions queued or running', jobs['depth']
+    yield 'conversion_jobs_total', 'counter', 'Background conversions by outcome', {
+        (('outcome', outcome),): jobs[outcome] for outcome in ['submitted', 'completed', 'failed', 'rejected']
+    }
+    chunked = chunked_pdf_renderer.stats()
+    yield 'chunked_pdf_chunks_total', 'counter', 'Chunks laid out for large-document PDFs', chunked['chunks']
+    yield 'chunked_pdf_documents_total', 'counter', 'Large-document PDFs rendered in chunks by outcome', {
+        (('outcome', 'rendered'),): chunked['documents'] - chunked['failed'],
+        (('outcome', 'failed'),): chunked['failed'],
+    }
+    assets = asset_fetcher.stats()
+    yield 'asset_fetches_total', 'counter', 'Remote image and asset fetches for PDFs by outcome', {
+        (('outcome', 'fetched'),): assets['fetched'],
+        (('outcome', 'failed'),): assets['failed'],
+        (('outcome', 'refused'),): assets['refused'],
+    }
+    yield 'asset_cache_lookups_total', 'counter', 'Asset cache lookups by result', {
+        (('result', 'hit'),): assets['cache_hits'],
+        (('result', 'miss'),): assets['cache_misses'],
+    }
+    batch = batch_converter.stats()
+    yield 'batch_files_total', 'counter', 'Batch conversions by outcome', {
+        (('outcome', 'converted'),): batch['converted'],
+        (('outcome', 'failed'),): batch['failed'],
+    }
+    highlight = highlight_cache.stats()
+    yield 'highlight_cache_lookups_total', 'counter', 'Code block highlighting cache lookups by result', {
+        (('result', 'hit'),): highlight['hits'],
+        (('result', 'miss'),): highlight['misses'],
+    }
+    yield 'highlight_cache_hit_rate', 'gauge', 'Code block highlighting cache hit rate since startup', highlight['hit_rate']
+    yield 'upload_quota_rejections_total', 'counter', 'Uploads refused for exceeding the tenant quota', upload_quota.stats()['rejected']
+    yield 'upload_expiries_pending', 'gauge', 'Upload expiry actions waiting in the reaper', upload_reaper.pending()
+    yield 'markdown_parsers', 'gauge', 'Markdown parser instances by state', {
+        (('state', 'created'),): sum(pool['created'] for pool in pool_stats()),
+        (('state', 'idle'),): sum(pool['idle'] for pool in pool_stats()),
+    }
+    yield 'output_backends', 'gauge', 'Output format backends by load state', {
+        (('format', renderer.format), ('state', renderer.status())): 1 for renderer in RENDERERS.values()
+    }
+
+metrics_registry.add_collector(collect_app_metrics)
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus-style metrics: per-stage timings, request latency, storage, caches and queues"""
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+def upload_tenant():
+    """Identify who an upload counts against for the upload quota"""
+    if UPLOAD_TENANT_HEADER and request.headers.get(UPLOAD_TENANT_HEADER):
+        return request.headers[UPLOAD_TENANT_HEADER]
+    return request.remote_addr or 'unknown'
+
+def upload_too_large(quota_limited):
+    """Response for an upload over the size limit or the tenant's quota"""
+    if quota_limited:
+        upload_quota.reject()
+        return jsonify({
+            'success': False,
+            'error': 'Upload quota exceeded. Please try again later.'
+        }), 429, {'Retry-After': str(upload_quota.window)}
+    return jsonify({
+        'success': False,
+        'error': f'File is too large. The maximum size is {MAX_CONTENT_LENGTH // (1024 * 1024)} MB.'
+    }), 413
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
-    """Handle file upload"""
+    """Handle file upload
+
+    Accepts a multipart form with a 'file' field, or the markdown itself as
+    the request body with the name in ?filename= or an X-Filename header.
+    """
     try:
-        if 'file' not in request.files:
-            return jsonify({
-                'success': False,
-                'error': 'No file selected'
-            }), 400
+        # Uploads never exceed the request limit or what remains of the tenant's quota
+        tenant = upload_tenant()
+        limit = MAX_CONTENT_LENGTH
+        remaining = upload_quota.remaining(tenant)
+        quota_limited = remaining is not None and remaining < limit
+        if quota_limited:
+            limit = remaining
         
-        file = request.files['file']
+        if request.mimetype in RAW_UPLOAD_MIMETYPES:
+            original_filename = request.args.get('filename') or request.headers.get('X-Filename', '')
+            # Reject from the declared length before reading any of the body
+            if request.content_length is not None and request.content_length > limit:
+                return upload_too_large(quota_limited)
+            stream = request.stream
+        else:
+            if 'file' not in request.files:
+                return jsonify({
+                    'success': False,
+                    'error': 'No file selected'
+                }), 400
+            file = request.files['file']
+            original_filename = file.filename
+            stream = file.stream
         
-        if file.filename == '':
+        if not original_filename:
             return jsonify({
                 'success': False,
                 'error': 'No file selected'
             }), 400
         
-        if not allowed_file(file.filename):
+        if not allowed_file(original_filename):
             return jsonify({
                 'success': False,
                 'error': 'Please upload a valid Markdown file (.md or .markdown)'
@@ -159,40 +607,56 @@ def upload_file():
         
         # Generate unique filename to avoid conflicts
         unique_id = str(uuid.uuid4())
-        filename = f"{unique_id}_{secure_filename(file.filename or 'upload')}"
+        filename = f"{unique_id}_{secure_filename(original_filename or 'upload')}"
+        
+        # Decode and hash in chunks, stopping as soon as the limit is passed
+        try:
+            with timed('upload_read'):
+                content, content_hash, size = read_upload(stream, limit)
+        except UploadTooLarge as e:
+            logging.warning(f"Rejected upload {original_filename} from {tenant}: {e}")
+            return upload_too_large(quota_limited)
+        except UnicodeDecodeError:
+            return jsonify({
+                'success': False,
+                'error': 'The file is not valid UTF-8 text'
+            }), 400
+        upload_quota.record(tenant, size)
+        metrics_registry.bind(format='md', size=size_bucket(size))
         
-        # Read file content
-        content = file.read().decode('utf-8')
+        # Identical bodies share one stored document; only new content is parsed
+        document = file_storage.find_document(content_hash)
+        if document is not None:
+            logging.debug(f"Upload {filename} matches stored document {content_hash[:12]}")
+        else:
+            # A plain render keeps the upload fast however much code it has;
+            # /preview and downloads add syntax highlighting later
+            document = parse_document(content, PREVIEW_EXTENSIONS, content_hash=content_hash)
+            document['preview_html'] = document.pop('html')
         
-        # Store in memory for Vercel serverless environment
-        file_storage[filename] = {
+        file_record = {
+            **document,
             'content': content,
-            'original_filename': file.filename,
-            'upload_time': datetime.now()
+            'original_filename': original_filename,
+            'upload_time': datetime.now().isoformat()
         }
         
-        # Also save to temp directory for Vercel
-        temp_dir = get_temp_dir()
-        temp_file_path = os.path.join(temp_dir, filename)
-        try:
-            with open(temp_file_path, 'w', encoding='utf-8') as f:
-                f.write(content)
-            file_storage[filename]['temp_path'] = temp_file_path
-        except Exception as e:
-            logging.warning(f"Could not save to temp directory: {e}")
-        
-        # Convert markdown to HTML for preview
-        html_content = markdown.markdown(
-            content, 
-            extensions=['extra', 'tables', 'codehilite', 'toc']
-        )
+        # The store is the only copy; the disk and SQLite backends already persist it
+        with timed('store'):
+            file_storage.put(filename, file_record)
+        
+        upload_reaper.schedule(time.time() + file_storage.ttl, file_storage.delete, filename)
         
         # Return JSON response for AJAX requests
         return jsonify({
             'success': True,
             'filename': filename,
-            'original_filename': file.filename,
-            'preview_html': html_content,
+            'original_filename': original_filename,
+            # Documents stored before plain previews only have 'html'
+            'preview_html': document['preview_html'] if 'preview_html' in document else document['html'],
+            'preview_url': url_for('preview_file', filename=filename),
+            'toc_html': document['toc'],
+            'metadata': document['metadata'],
             'message': 'File uploaded successfully!'
         })
         
@@ -203,432 +667,254 @@ def upload_file():
             'error': f'Error uploading file: {str(e)}'
         }), 500
 
+@app.route('/preview/<filename>')
+def preview_file(filename):
+    """Return the syntax-highlighted preview HTML for an upload, revalidated by ETag"""
+    file_data = file_storage.get(filename)
+    if file_data is None:
+        logging.warning(f"File not found in storage: {filename}")
+        return jsonify({'error': 'File not found'}), 404
+    
+    # The ETag covers the content and renderer version, so unchanged previews are never rebuilt
+    etag = RenderCache.make_key(file_data['content'], 'preview', RENDER_VERSION)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        with timed('preview'):
+            response = Response(document_html(file_data), mimetype='text/html')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
 @app.route('/download/<format>/<filename>')
 def download_file(format, filename):
-    """Download converted file"""
+    """Download converted file
+
+    format is any registered output format (pdf, docx, html, epub, txt), or
+    several joined by commas for a zip of them all rendered from one parse.
+    """
     try:
         # Validate file exists in storage
-        if filename not in file_storage:
+        file_data = file_storage.get(filename)
+        if file_data is None:
             logging.warning(f"File not found in storage: {filename}")
             return jsonify({'error': 'File not found'}), 404
         
         # Validate format
-        if format not in ['pdf', 'docx']:
+        formats = requested_formats(format)
+        if formats is None:
             logging.warning(f"Invalid format requested: {format}")
             return jsonify({'error': 'Invalid file format'}), 400
         
-        file_data = file_storage[filename]
         md_content = file_data['content']
+        base_name = download_base_name(filename)
         
-        # Convert markdown to HTML
-        html_content = markdown.markdown(
-            md_content, 
-            extensions=['extra', 'tables', 'codehilite', 'toc']
-        )
+        if len(formats) > 1:
+            metrics_registry.bind(format='zip', size=size_bucket(len(md_content)))
+            return archive_response(file_data, formats, base_name)
+        
+        format = formats[0]
+        metrics_registry.bind(format=format, size=size_bucket(len(md_content)))
+        
+        # Serve repeat conversions of identical content from the render cache
+        with timed('cache_lookup'):
+            cache_key = RenderCache.make_key(md_content, format, RENDER_VERSION)
+            cached, cached_path = render_cache.open(cache_key)
+        if cached is not None or cached_path is not None:
+            logging.debug(f"Render cache hit for {filename} ({format})")
+            return converted_file_response(cached if cached is not None else cached_path, format, base_name)
+        
+        html_content = document_html(file_data)
+        
+        # Large documents reuse the unchanged sections of earlier renders
+        incremental = INCREMENTAL_MIN_BYTES and len(md_content) >= INCREMENTAL_MIN_BYTES
         
         if format == 'pdf':
-            # Create beautifully formatted HTML for PDF conversion
-            styled_html = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <meta charset="UTF-8">
-                <title>Markdown Document</title>
-                <style>
-                    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap');
-                    
-                    * {{
-                        margin: 0;
-                        padding: 0;
-                        box-sizing: border-box;
-                    }}
-                    
-                    body {{
-                        font-family: 'Inter', -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-                        line-height: 1.7;
-                        color: #1a202c;
-                        max-width: 800px;
-                        margin: 0 auto;
-                        padding: 40px 20px;
-                        background-color: white;
-                        font-size: 16px;
-                    }}
-                    
-                    h1, h2, h3, h4, h5, h6 {{
-                        color: #2d3748;
-                        margin-top: 40px;
-                        margin-bottom: 20px;
-                        page-break-after: avoid;
-                        font-weight: 600;
-                        line-height: 1.3;
-                    }}
-                    
-                    h1 {{
-                        font-size: 2.5rem;
-                        border-bottom: 3px solid #667eea;
-                        padding-bottom: 15px;
-                        margin-top: 0;
-                        margin-bottom: 30px;
-                        color: #1a202c;
-                    }}
-                    
-                    h2 {{
-                        font-size: 2rem;
-                        border-bottom: 2px solid #e2e8f0;
-                        padding-bottom: 10px;
-                        margin-top: 35px;
-                        color: #2d3748;
-                    }}
-                    
-                    h3 {{
-                        font-size: 1.5rem;
-                        color: #4a5568;
-                        margin-top: 30px;
-                    }}
-                    
-                    h4 {{
-                        font-size: 1.25rem;
-                        color: #4a5568;
-                        margin-top: 25px;
-                    }}
-                    
-                    p {{
-                        margin-bottom: 1.5rem;
-                        text-align: justify;
-                        color: #2d3748;
-                    }}
-                    
-                    code {{
-                        background-color: #f7fafc;
-                        color: #e53e3e;
-                        padding: 4px 8px;
-                        border-radius: 6px;
-                        font-family: 'Monaco', 'Courier New', 'Fira Code', monospace;
-                        font-size: 0.9em;
-                        border: 1px solid #e2e8f0;
-                    }}
-                    
-                    pre {{
-                        background-color: #f7fafc;
-                        border: 1px solid #e2e8f0;
-                        border-radius: 8px;
-                        padding: 20px;
-                        overflow-x: auto;
-                        margin: 25px 0;
-                        box-shadow: 0 2px 8px rgba(0,0,0,0.1);
-                    }}
-                    
-                    pre code {{
-                        background-color: transparent;
-                        padding: 0;
-                        color: #2d3748;
-                        border: none;
-                        font-size: 0.95em;
-                        line-height: 1.6;
-                    }}
-                    
-                    blockquote {{
-                        border-left: 4px solid #667eea;
-                        margin: 25px 0;
-                        padding: 15px 25px;
-                        color: #4a5568;
-                        font-style: italic;
-                        background-color: #f7fafc;
-                        border-radius: 0 8px 8px 0;
-                        box-shadow: 0 2px 4px rgba(0,0,0,0.05);
-                    }}
-                    
-                    table {{
-                        border-collapse: collapse;
-                        width: 100%;
-                        margin: 25px 0;
-                        font-size: 0.95rem;
-                        box-shadow: 0 4px 12px rgba(0,0,0,0.1);
-                        border-radius: 8px;
-                        overflow: hidden;
-                    }}
-                    
-                    table th, table td {{
-                        border: 1px solid #e2e8f0;
-                        padding: 15px;
-                        text-align: left;
-                    }}
-                    
-                    table th {{
-                        background-color: #667eea;
-                        color: white;
-                        font-weight: 600;
-                        text-transform: uppercase;
-                        font-size: 0.85rem;
-                        letter-spacing: 0.5px;
-                    }}
-                    
-                    table tr:nth-child(even) {{
-                        background-color: #f7fafc;
-                    }}
-                    
-                    table tr:hover {{
-                        background-color: #edf2f7;
-                    }}
-                    
-                    ul, ol {{
-                        margin-bottom: 1.5rem;
-                        padding-left: 2.5rem;
-                        color: #2d3748;
-                    }}
-                    
-                    li {{
-                        margin-bottom: 0.75rem;
-                        line-height: 1.6;
-                    }}
-                    
-                    a {{
-                        color: #667eea;
-                        text-decoration: none;
-                        border-bottom: 1px solid transparent;
-                        transition: border-bottom 0.2s ease;
-                    }}
-                    
-                    a:hover {{
-                        border-bottom: 1px solid #667eea;
-                    }}
-                    
-                    img {{
-                        max-width: 100%;
-                        height: auto;
-                        border-radius: 8px;
-                        margin: 15px 0;
-                        box-shadow: 0 4px 12px rgba(0,0,0,0.1);
-                    }}
-                    
-                    hr {{
-                        border: none;
-                        border-top: 2px solid #e2e8f0;
-                        margin: 40px 0;
-                        height: 1px;
-                    }}
-                    
-                    /* Print styles for excellent PDF output */
-                    @media print {{
-                        body {{
-                            margin: 0;
-                            padding: 30px;
-                            font-size: 12pt;
-                            line-height: 1.6;
-                        }}
-                        
-                        h1, h2, h3, h4, h5, h6 {{
-                            page-break-after: avoid;
-                            margin-top: 20pt;
-                            margin-bottom: 10pt;
-                        }}
-                        
-                        h1 {{
-                            font-size: 24pt;
-                            margin-top: 0;
-                        }}
-                        
-                        h2 {{
-                            font-size: 18pt;
-                        }}
-                        
-                        h3 {{
-                            font-size: 14pt;
-                        }}
-                        
-                        pre, blockquote, table {{
-                            page-break-inside: avoid;
-                            margin: 15pt 0;
-                        }}
-                        
-                        p {{
-                            margin-bottom: 12pt;
-                            text-align: justify;
-                        }}
-                        
-                        a {{
-                            color: #000;
-                            text-decoration: underline;
-                        }}
-                        
-                        code {{
-                            font-size: 10pt;
-                        }}
-                        
-                        pre {{
-                            font-size: 10pt;
-                            padding: 15pt;
-                        }}
-                        
-                        table {{
-                            font-size: 10pt;
-                        }}
-                        
-                        table th, table td {{
-                            padding: 8pt;
-                        }}
-                        
-                        ul, ol {{
-                            margin-bottom: 12pt;
-                        }}
-                        
-                        li {{
-                            margin-bottom: 6pt;
-                        }}
-                    }}
-                </style>
-            </head>
-            <body>
-                {html_content}
-            </body>
-            </html>
-            """
-            
-            # Generate actual PDF using WeasyPrint
+            # Generate actual PDF using WeasyPrint with the shared fonts and stylesheet
             try:
-                # Configure fonts
-                font_config = FontConfiguration()
-                
-                # Create PDF from HTML with Vercel-compatible settings
-                html_doc = HTML(string=styled_html)
-                pdf = html_doc.write_pdf(
-                    stylesheets=[],
-                    font_config=font_config,
-                    optimize_images=False  # Disable image optimization for Vercel
-                )
-                
-                # Get original filename without extension and unique ID
-                original_name = filename.split('_', 1)[1] if '_' in filename else filename
-                base_name = os.path.splitext(original_name)[0]
-                
-                # Create response with PDF data
-                response = Response(pdf, mimetype='application/pdf')
-                response.headers['Content-Disposition'] = f'attachment; filename="{base_name}.pdf"'
-                response.headers['Content-Type'] = 'application/pdf'
-                response.headers['Cache-Control'] = 'no-cache'
-                
-                return response
+                get_renderer('pdf').load()
+                asset_fetcher.prefetch(file_data.get('metadata', {}).get('images', []), wait=True)
+                if (CHUNKED_PDF_MIN_BYTES and len(md_content) >= CHUNKED_PDF_MIN_BYTES
+                        and chunked_pdf_renderer.available()):
+                    return render_pdf_response(html_content, cache_key, base_name,
+                                               lambda target: chunked_pdf_renderer.write_pdf(
+                                                   html_content, file_data.get('toc'), target))
+                if incremental and incremental_renderer.pdf_available():
+                    return render_pdf_response(html_content, cache_key, base_name,
+                                               lambda target: incremental_renderer.write_pdf(
+                                                   md_content, target, file_data.get('toc')))
+                return render_pdf_response(html_content, cache_key, base_name)
                 
             except Exception as e:
                 logging.error(f"PDF generation error: {e}")
-                # Fallback to HTML if PDF generation fails
-                original_name = filename.split('_', 1)[1] if '_' in filename else filename
-                base_name = os.path.splitext(original_name)[0]
-                
-                return Response(
-                    styled_html,
-                    mimetype='text/html',
-                    headers={
-                        'Content-Disposition': f'attachment; filename="{base_name}.html"',
-                        'Content-Type': 'text/html'
-                    }
-                )
-            
-        elif format == 'docx':
-            # Convert to Word document with improved formatting
-            doc = Document()
-            
-            # Set document styles
-            style = doc.styles['Normal']
-            style.font.name = 'Calibri'
-            style.font.size = Pt(11)
-            style.paragraph_format.line_spacing = 1.15
-            
-            # Process markdown content
-            lines = md_content.split('\n')
-            in_list = False
-            list_type = None
-            
-            for line in lines:
-                line = line.strip()
-                
-                if line.startswith('# '):
-                    heading = doc.add_heading(line[2:], 0)
-                    heading.alignment = WD_ALIGN_PARAGRAPH.LEFT
-                elif line.startswith('## '):
-                    heading = doc.add_heading(line[3:], 1)
-                    heading.alignment = WD_ALIGN_PARAGRAPH.LEFT
-                elif line.startswith('### '):
-                    heading = doc.add_heading(line[4:], 2)
-                    heading.alignment = WD_ALIGN_PARAGRAPH.LEFT
-                elif line.startswith('#### '):
-                    heading = doc.add_heading(line[5:], 3)
-                    heading.alignment = WD_ALIGN_PARAGRAPH.LEFT
-                elif line.startswith('- ') or line.startswith('* '):
-                    # Unordered list
-                    if not in_list or list_type != 'unordered':
-                        in_list = True
-                        list_type = 'unordered'
-                    p = doc.add_paragraph(line[2:], style='List Bullet')
-                elif line.startswith('1. ') or line.startswith('2. ') or line.startswith('3. ') or line.startswith('4. ') or line.startswith('5. '):
-                    # Ordered list
-                    if not in_list or list_type != 'ordered':
-                        in_list = True
-                        list_type = 'ordered'
-                    p = doc.add_paragraph(line[3:], style='List Number')
-                elif line.startswith('```'):
-                    # Code block
-                    if not in_list:
-                        in_list = False
-                    p = doc.add_paragraph()
-                    p.style = 'No Spacing'
-                elif line.startswith('> '):
-                    # Blockquote
-                    if not in_list:
-                        in_list = False
-                    p = doc.add_paragraph(line[2:])
-                    p.style = 'Quote'
-                elif line == '':
-                    # Empty line - end lists
-                    if in_list:
-                        in_list = False
-                        list_type = None
-                elif line and not line.startswith('#'):
-                    # Regular paragraph
-                    if not in_list:
-                        in_list = False
-                        list_type = None
-                    
-                    # Handle inline formatting
-                    formatted_text = line
-                    formatted_text = formatted_text.replace('**', '**')  # Bold
-                    formatted_text = formatted_text.replace('*', '*')    # Italic
-                    formatted_text = formatted_text.replace('`', '`')    # Code
-                    
-                    p = doc.add_paragraph(formatted_text)
-                    
-                    # Apply formatting
-                    for run in p.runs:
-                        if '**' in run.text:
-                            run.bold = True
-                        if '*' in run.text and not '**' in run.text:
-                            run.italic = True
-                        if '`' in run.text:
-                            run.font.name = 'Courier New'
-                            run.font.size = Pt(10)
-            
-            doc_io = io.BytesIO()
-            doc.save(doc_io)
-            doc_io.seek(0)
-            
-            # Get original filename without extension and unique ID
-            original_name = filename.split('_', 1)[1] if '_' in filename else filename
-            base_name = os.path.splitext(original_name)[0]
-            
-            return send_file(
-                doc_io,
-                as_attachment=True,
-                download_name=f'{base_name}.docx',
-                mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-            )
+                # Serve printable HTML instead, labelled so clients know it is not a PDF
+                with timed('html_fallback'):
+                    fallback_html = build_styled_html(html_content).encode('utf-8')
+                response = converted_file_response(fallback_html, 'html', base_name)
+                response.headers['X-Requested-Format'] = 'pdf'
+                response.headers['X-Fallback-Reason'] = ('PDF output is not available' if isinstance(e, RendererUnavailable)
+                                                         else 'PDF rendering failed')
+                return response
+        
+        if format == 'docx' and incremental:
+            data = incremental_renderer.docx(md_content)
         else:
-            logging.warning(f"Invalid format requested: {format}")
-            return jsonify({'error': 'Invalid file format'}), 400
+            data = render(source_document(file_data, base_name, html_content), format)
+        with timed('cache_store'):
+            render_cache.put(cache_key, data)
+        return converted_file_response(data, format, base_name)
             
     except Exception as e:
         logging.error(f"Download error: {e}")
         return jsonify({'error': f'Error converting file: {str(e)}'}), 500
 
+@app.route('/convert', methods=['POST'])
+def convert_file():
+    """Queue a background conversion and return its job id"""
+    try:
+        data = request.get_json(silent=True) or request.form
+        filename = data.get('filename', '')
+        format = data.get('format', '')
+        
+        file_data = file_storage.get(filename)
+        if file_data is None:
+            logging.warning(f"File not found in storage: {filename}")
+            return jsonify({'success': False, 'error': 'File not found'}), 404
+        
+        if not is_supported(format):
+            logging.warning(f"Invalid format requested: {format}")
+            return jsonify({'success': False, 'error': 'Invalid file format'}), 400
+        
+        md_content = file_data['content']
+        cache_key = RenderCache.make_key(md_content, format, RENDER_VERSION)
+        job_info = {'filename': filename, 'format': format, 'cache_key': cache_key}
+        
+        # Previously rendered content completes immediately
+        cached = render_cache.get(cache_key)
+        if cached is not None:
+            job_id = conversion_jobs.add_completed(cached, **job_info)
+        else:
+            try:
+                job_id = conversion_jobs.submit(md_content, format, document_html(file_data), file_data.get('toc'),
+                                                file_data.get('metadata'), download_base_name(filename), **job_info)
+            except QueueFullError as e:
+                logging.warning(f"Rejecting conversion of {filename}: {e}")
+                return jsonify({
+                    'success': False,
+                    'error': 'Too many conversions in progress. Please try again shortly.'
+                }), 429, {'Retry-After': '5'}
+        
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'status': conversion_jobs.get(job_id)['status'],
+            'status_url': url_for('job_status', job_id=job_id)
+        }), 202
+        
+    except Exception as e:
+        logging.error(f"Convert error: {e}")
+        return jsonify({'success': False, 'error': f'Error queueing conversion: {str(e)}'}), 500
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Report the status of a background conversion"""
+    job = conversion_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    status = {
+        'job_id': job_id,
+        'status': job['status'],
+        'format': job['format'],
+        'filename': job['filename']
+    }
+    if job['error']:
+        status['error'] = job['error']
+    if job['status'] == 'done':
+        status['download_url'] = url_for('job_download', job_id=job_id)
+    return jsonify(status)
+
+@app.route('/jobs/<job_id>/download')
+def job_download(job_id):
+    """Serve the artifact produced by a finished conversion job"""
+    job = conversion_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    if job['status'] != 'done':
+        return jsonify({'error': f"Job is {job['status']}", 'status': job['status']}), 409
+    
+    data, path = render_cache.open(job['cache_key'])
+    if data is None and path is None:
+        # Evicted from the render cache since the job finished
+        return jsonify({'error': 'Job result expired; please convert again', 'status': 'expired'}), 410
+    return converted_file_response(data if data is not None else path, job['format'],
+                                   download_base_name(job['filename']))
+
+def batch_results(documents, formats):
+    """Yield (name, format, data, error) for every document and format, cached renders first"""
+    tasks = []
+    for name, content in documents:
+        for format in formats:
+            cached = render_cache.get(RenderCache.make_key(content, format, RENDER_VERSION))
+            if cached is not None:
+                yield name, format, cached, None
+            else:
+                tasks.append((name, format, content))
+    
+    if not tasks:
+        return
+    for (name, format, content), data, error in batch_converter.run(tasks):
+        if error is None:
+            render_cache.put(RenderCache.make_key(content, format, RENDER_VERSION), data)
+        yield name, format, data, error
+
+@app.route('/batch', methods=['POST'])
+def batch_convert():
+    """Convert a zip or multipart set of markdown files and stream back a zip of the results"""
+    try:
+        requested = request.values.get('formats') or request.values.get('format') or 'pdf'
+        formats = requested_formats(requested)
+        if formats is None:
+            logging.warning(f"Invalid batch formats requested: {requested}")
+            return jsonify({'success': False, 'error': 'Invalid file format'}), 400
+        
+        # Accept a raw zip body as well as multipart uploads
+        if request.mimetype in ['application/zip', 'application/x-zip-compressed']:
+            uploads = [('batch.zip', io.BytesIO(request.get_data()))]
+        else:
+            uploads = [(f.filename or '', f.stream) for _, f in request.files.items(multi=True) if f.filename]
+        
+        if not uploads:
+            return jsonify({'success': False, 'error': 'No files selected'}), 400
+        
+        try:
+            documents, errors = read_uploaded_documents(uploads, BATCH_MAX_FILES, BATCH_MAX_BYTES)
+        except BatchError as e:
+            logging.warning(f"Rejected batch: {e}")
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        if not documents:
+            return jsonify({
+                'success': False,
+                'error': 'No markdown files found in the upload',
+                'errors': errors
+            }), 400
+        
+        logging.info(f"Batch of {len(documents)} files to {', '.join(formats)}")
+        return Response(
+            stream_zip(batch_results(documents, formats), errors),
+            mimetype='application/zip',
+            headers={
+                'Content-Disposition': 'attachment; filename="converted.zip"',
+                'Cache-Control': 'no-cache'
+            }
+        )
+        
+    except Exception as e:
+        logging.error(f"Batch error: {e}")
+        return jsonify({'success': False, 'error': f'Error converting batch: {str(e)}'}), 500
+
 @app.route('/api/send-ad-inquiry', methods=['POST'])
 def send_ad_inquiry():
     """Handle advertiser contact form submissions with reCAPTCHA verification"""
@@ -691,7 +977,7 @@ def send_ad_inquiry():
 def blog_index():
     """Blog index page"""
     try:
-        return render_template('blog_index.html')
+        return static_page_response('blog_index.html') or render_template('blog_index.html')
     except Exception as e:
         logging.error(f"Error in blog index route: {e}")
         return "Blog coming soon!", 404
@@ -700,21 +986,11 @@ def blog_index():
 def blog_post(post_name):
     """Serve individual blog posts"""
     try:
-        # Map post names to their HTML files
-        post_files = {
-            'convert-markdown-to-pdf-online-free': 'blog/convert-markdown-to-pdf-online-free.html',
-            'best-free-markdown-to-pdf-converters-2025': 'blog/best-free-markdown-to-pdf-converters-2025.html',
-            'convert-markdown-to-word-documents-online': 'blog/convert-markdown-to-word-documents-online.html',
-            'markdown-tips-tricks-technical-writers': 'blog/markdown-tips-tricks-technical-writers.html',
-            'troubleshooting-markdown-to-pdf-conversion': 'blog/troubleshooting-markdown-to-pdf-conversion.html'
-        }
-        
-        if post_name in post_files:
-            with open(post_files[post_name], 'r', encoding='utf-8') as f:
-                content = f.read()
-            return content
-        else:
-            return "Blog post not found", 404
+        # Posts are read and compressed at startup; unknown names never touch the filesystem
+        response = static_page_response(f'blog/{post_name}')
+        if response is not None:
+            return response
+        return "Blog post not found", 404
     except Exception as e:
         logging.error(f"Error serving blog post {post_name}: {e}")
         return "Blog post not found", 404
@@ -726,7 +1002,7 @@ def too_large(e):
 
 @app.errorhandler(404)
 def not_found(e):
-    return render_template('index.html'), 404
+    return static_page_response('index.html', status=404) or (render_template('index.html'), 404)
 
 @app.errorhandler(500)
 def server_error(e):
@@ -1,16 +1,16 @@
 import os
 import logging
-import markdown
 import json
 import base64
-import requests
 from flask import Flask, request, render_template, send_file, flash, redirect, url_for, jsonify, Response
 from werkzeug.utils import secure_filename
-from docx import Document
 import io
 import tempfile
 import uuid
 from datetime import datetime
+from storage import create_store
+from converter import parse_document, document_html
+from renderers import SourceDocument, RendererUnavailable, get_renderer, is_supported, render
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -25,8 +25,8 @@ MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
 
 app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
 
-# In-memory storage for Vercel (since filesystem is read-only)
-file_storage = {}
+# Bounded in-memory storage for Vercel (since filesystem is read-only)
+file_storage = create_store()
 
 # reCAPTCHA configuration
 RECAPTCHA_SECRET_KEY = "6LeSYJ0rAAAAABx3xOqWudqBdr36gK6IcTUnBgaK"
@@ -40,6 +40,7 @@ def allowed_file(filename):
 def verify_recaptcha(recaptcha_response):
     """Verify reCAPTCHA response with Google's API"""
     try:
+        import requests
         data = {
             'secret': RECAPTCHA_SECRET_KEY,
             'response': recaptcha_response
@@ -55,137 +56,6 @@ def verify_recaptcha(recaptcha_response):
         logging.error(f"Error verifying reCAPTCHA: {e}")
         return False
 
-def convert_to_pdf_html(content):
-    """Convert markdown to styled HTML for PDF conversion"""
-    html_content = markdown.markdown(
-        content, 
-        extensions=['extra', 'tables', 'codehilite', 'toc']
-    )
-    
-    styled_html = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <title>Markdown Document</title>
-        <style>
-            body {{
-                font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-                line-height: 1.6;
-                color: #333;
-                max-width: 800px;
-                margin: 0 auto;
-                padding: 20px;
-                background-color: white;
-            }}
-            h1, h2, h3, h4, h5, h6 {{
-                color: #2c3e50;
-                margin-top: 24px;
-                margin-bottom: 12px;
-                page-break-after: avoid;
-            }}
-            h1 {{
-                font-size: 2rem;
-                border-bottom: 2px solid #007bff;
-                padding-bottom: 0.5rem;
-            }}
-            h2 {{
-                font-size: 1.5rem;
-                border-bottom: 1px solid #e9ecef;
-                padding-bottom: 0.25rem;
-            }}
-            p {{
-                margin-bottom: 1rem;
-            }}
-            code {{
-                background-color: #f8f9fa;
-                color: #e83e8c;
-                padding: 2px 4px;
-                border-radius: 3px;
-                font-family: 'Monaco', 'Courier New', monospace;
-                font-size: 0.875em;
-            }}
-            pre {{
-                background-color: #f8f9fa;
-                border: 1px solid #e9ecef;
-                border-radius: 5px;
-                padding: 12px;
-                overflow-x: auto;
-                margin-bottom: 1rem;
-            }}
-            pre code {{
-                background-color: transparent;
-                padding: 0;
-                color: #333;
-            }}
-            blockquote {{
-                border-left: 4px solid #007bff;
-                margin: 1rem 0;
-                padding-left: 16px;
-                color: #6c757d;
-                font-style: italic;
-            }}
-            table {{
-                border-collapse: collapse;
-                width: 100%;
-                margin: 16px 0;
-                font-size: 0.9rem;
-            }}
-            table th, table td {{
-                border: 1px solid #dee2e6;
-                padding: 8px;
-                text-align: left;
-            }}
-            table th {{
-                background-color: #f8f9fa;
-                font-weight: 600;
-            }}
-            ul, ol {{
-                margin-bottom: 1rem;
-                padding-left: 2rem;
-            }}
-            li {{
-                margin-bottom: 0.25rem;
-            }}
-            a {{
-                color: #007bff;
-                text-decoration: none;
-            }}
-            a:hover {{
-                text-decoration: underline;
-            }}
-            img {{
-                max-width: 100%;
-                height: auto;
-                border-radius: 4px;
-                margin: 0.5rem 0;
-            }}
-            hr {{
-                border: none;
-                border-top: 2px solid #e9ecef;
-                margin: 2rem 0;
-            }}
-            @media print {{
-                body {{
-                    margin: 0;
-                    padding: 20px;
-                }}
-                h1, h2, h3, h4, h5, h6 {{
-                    page-break-after: avoid;
-                }}
-                pre, blockquote {{
-                    page-break-inside: avoid;
-                }}
-            }}
-        </style>
-    </head>
-    <body>
-        {html_content}
-    </body>
-    </html>
-    """
-    return styled_html
-
 @app.route('/')
 def index():
     """Main page"""
@@ -229,22 +99,20 @@ def upload_file():
         # Read file content
         content = file.read().decode('utf-8')
         
+        # Parse once; downloads reuse the stored HTML
+        document = parse_document(content)
+        
         # Store in memory (in production, use cloud storage)
         file_storage[filename] = {
             'content': content,
             'original_filename': file.filename,
-            'upload_time': datetime.now()
+            'upload_time': datetime.now().isoformat(),
+            **document
         }
         
-        # Convert markdown to HTML for preview
-        html_content = markdown.markdown(
-            content, 
-            extensions=['extra', 'tables', 'codehilite', 'toc']
-        )
-        
         flash('File uploaded successfully!', 'success')
         return render_template('index.html', 
-                             preview_content=html_content, 
+                             preview_content=document['html'], 
                              filename=filename,
                              original_filename=file.filename)
         
@@ -257,73 +125,43 @@ def upload_file():
 def download_file(format, filename):
     """Download converted file"""
     try:
-        if filename not in file_storage:
+        file_data = file_storage.get(filename)
+        if file_data is None:
             flash('File not found. Please upload a file first.', 'error')
             return redirect(url_for('index'))
         
-        file_data = file_storage[filename]
-        md_content = file_data['content']
-        
-        # Convert markdown to HTML
-        html_content = markdown.markdown(
-            md_content, 
-            extensions=['extra', 'tables', 'codehilite', 'toc']
-        )
-        
-        if format == 'pdf':
-            # For Vercel, we'll return HTML that can be printed to PDF
-            # In production, use a cloud PDF service
-            styled_html = convert_to_pdf_html(md_content)
-            
-            # Get original filename without extension and unique ID
-            original_name = filename.split('_', 1)[1] if '_' in filename else filename
-            base_name = os.path.splitext(original_name)[0]
-            
-            return Response(
-                styled_html,
-                mimetype='text/html',
-                headers={
-                    'Content-Disposition': f'attachment; filename="{base_name}.html"',
-                    'Content-Type': 'text/html'
-                }
-            )
-            
-        elif format == 'docx':
-            # Convert to Word document
-            doc = Document()
-            
-            # Add title if present
-            lines = md_content.split('\n')
-            for line in lines:
-                line = line.strip()
-                if line.startswith('# '):
-                    doc.add_heading(line[2:], 0)
-                elif line.startswith('## '):
-                    doc.add_heading(line[3:], 1)
-                elif line.startswith('### '):
-                    doc.add_heading(line[4:], 2)
-                elif line.startswith('#### '):
-                    doc.add_heading(line[5:], 3)
-                elif line and not line.startswith('#'):
-                    doc.add_paragraph(line)
-            
-            doc_io = io.BytesIO()
-            doc.save(doc_io)
-            doc_io.seek(0)
-            
-            # Get original filename without extension and unique ID
-            original_name = filename.split('_', 1)[1] if '_' in filename else filename
-            base_name = os.path.splitext(original_name)[0]
-            
-            return send_file(
-                doc_io,
-                as_attachment=True,
-                download_name=f'{base_name}.docx',
-                mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-            )
-        else:
+        if not is_supported(format):
             flash('Invalid download format', 'error')
             return redirect(url_for('index'))
+        
+        # Get original filename without extension and unique ID
+        original_name = filename.split('_', 1)[1] if '_' in filename else filename
+        base_name = os.path.splitext(original_name)[0]
+        
+        # Reuse the HTML converted at upload time
+        document = SourceDocument(file_data['content'], document_html(file_data), file_data.get('toc'), base_name,
+                                  metadata=file_data.get('metadata'))
+        output_format = format
+        try:
+            data = render(document, format)
+        except RendererUnavailable as e:
+            if format != 'pdf':
+                raise
+            # Without WeasyPrint, send printable HTML under an .html name rather than a fake PDF
+            logging.warning(f"{e}; serving HTML instead")
+            output_format = 'html'
+            data = render(document, 'html')
+        
+        response = send_file(
+            io.BytesIO(data),
+            as_attachment=True,
+            download_name=f'{base_name}.{output_format}',
+            mimetype=get_renderer(output_format).mimetype
+        )
+        if output_format != format:
+            response.headers['X-Requested-Format'] = format
+            response.headers['X-Fallback-Reason'] = 'PDF output is not available'
+        return response
             
     except Exception as e:
         logging.error(f"Download error: {e}")
@@ -0,0 +1,314 @@
+import time
+import socket
+import logging
+import ipaddress
+import threading
+import http.client
+import urllib.request
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from render_cache import RenderCache
+from metrics import timed
+
+REMOTE_SCHEMES = {'http', 'https'}
+READ_CHUNK_SIZE = 64 * 1024
+USER_AGENT = 'MarkdownConverter asset fetcher'
+
+
+class AssetFetchError(Exception):
+    """Raised when an asset is refused, too large, times out or cannot be fetched"""
+
+
+def is_public_address(ip):
+    """Whether ip is globally routable, i.e. not loopback, private, link-local or reserved"""
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def public_addresses(host, port):
+    """Resolve host, refusing it unless every address it resolves to is public"""
+    try:
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise AssetFetchError(f"Cannot resolve {host}: {e}") from e
+    addresses = []
+    for _, _, _, _, sockaddr in infos:
+        ip = ipaddress.ip_address(sockaddr[0].split('%')[0])
+        if not is_public_address(ip):
+            raise AssetFetchError(f"{host} resolves to non-public address {ip}")
+        addresses.append(str(ip))
+    return list(dict.fromkeys(addresses))
+
+
+def _connect_public(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+    """socket.create_connection, but only to the checked addresses of the host
+
+    Connecting to the address that was checked (rather than resolving the
+    name again) means a DNS answer cannot change between check and connect.
+    """
+    host, port = address
+    error = None
+    for ip in public_addresses(host, port):
+        try:
+            return socket.create_connection((ip, port), timeout, source_address)
+        except OSError as e:
+            error = e
+    raise error
+
+
+class _PublicHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _connect_public
+
+
+class _PublicHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _connect_public
+
+
+class _PublicHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(_PublicHTTPConnection, req)
+
+
+class _PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(_PublicHTTPSConnection, req, context=self._context)
+
+
+class _RedirectHandler(urllib.request.HTTPRedirectHandler):
+    max_redirections = 5
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        # urllib would also follow redirects to ftp:
+        if urlsplit(newurl).scheme.lower() not in REMOTE_SCHEMES:
+            raise AssetFetchError(f"Redirect to {newurl[:200]} refused")
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+_fetcher_classes = {}
+
+
+def _weasyprint_fetcher_class(urls):
+    """Build (once) the URLFetcher subclass delegating to an AssetFetcher"""
+    if urls not in _fetcher_classes:
+        class CachedURLFetcher(urls.URLFetcher):
+            def __init__(self, assets, **kwargs):
+                super().__init__(**kwargs)
+                self.assets = assets
+
+            def fetch(self, url, headers=None):
+                with timed('asset_fetch'):
+                    mime_type, data = self.assets.fetch(url)
+                return urls.URLFetcherResponse(url, data, {'Content-Type': mime_type})
+
+        _fetcher_classes[urls] = CachedURLFetcher
+    return _fetcher_classes[urls]
+
+
+class AssetFetcher:
+    """URL fetcher for the PDF pipeline: cached, bounded and optionally offline.
+
+    Instances are passed to WeasyPrint as its url_fetcher. data: URLs are
+    decoded in place; http(s) assets are fetched with a timeout and size
+    cap and kept in a RenderCache, whose disk tier is shared by every
+    worker. prefetch() downloads a document's images concurrently ahead of
+    layout, so WeasyPrint's one-at-a-time fetches become cache hits. In
+    local_only mode nothing is fetched: remote assets are served from the
+    cache or refused at once. Other schemes (file: included) are refused.
+
+    Documents come from anonymous uploads, so unless allow_private is set
+    every connection, redirects included, must go to a public address (no
+    loopback, private, link-local or cloud metadata hosts), and one
+    document can make at most max_per_document network fetches.
+    """
+
+    def __init__(self, cache_dir=None, timeout=5.0, max_bytes=10 * 1024 * 1024, local_only=False,
+                 max_workers=8, failure_ttl=300, cache_max_bytes=32 * 1024 * 1024,
+                 cache_disk_max_bytes=256 * 1024 * 1024, max_per_document=50, allow_private=False):
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.local_only = local_only
+        self.max_workers = max_workers
+        self.max_per_document = max_per_document
+        self.allow_private = allow_private
+        if allow_private:
+            self._opener = urllib.request.build_opener(_RedirectHandler)
+        else:
+            # No proxies either: the address check must see the real destination
+            self._opener = urllib.request.build_opener(urllib.request.ProxyHandler({}), _RedirectHandler,
+                                                       _PublicHTTPHandler, _PublicHTTPSHandler)
+        # Failed URLs are not retried for this long, so a dead host stalls one render at most
+        self.failure_ttl = failure_ttl
+        self.cache = RenderCache(max_bytes=cache_max_bytes, disk_dir=cache_dir, disk_max_bytes=cache_disk_max_bytes)
+
+        self._executor = None
+        self._inflight = {}
+        self._failures = {}
+        self._lock = threading.Lock()
+        self._budget = threading.local()
+
+        self.fetched = 0
+        self.failed = 0
+        self.refused = 0
+        self.prefetched = 0
+
+    def __call__(self, url, timeout=10, ssl_context=None, **kwargs):
+        """The dict-returning url_fetcher interface of WeasyPrint before 68"""
+        with timed('asset_fetch'):
+            mime_type, data = self.fetch(url)
+        return {'string': data, 'mime_type': mime_type, 'redirected_url': url}
+
+    def for_weasyprint(self):
+        """Return what the installed WeasyPrint accepts as url_fetcher, backed by this fetcher
+
+        WeasyPrint 68 and later only accept weasyprint.urls.URLFetcher
+        subclasses returning URLFetcherResponse objects; earlier versions
+        call a plain function and take a dict, which __call__ provides.
+        """
+        from weasyprint import urls
+        if not hasattr(urls, 'URLFetcherResponse'):
+            return self
+        return _weasyprint_fetcher_class(urls)(self, timeout=self.timeout)
+
+    @contextmanager
+    def document(self):
+        """Count the network fetches made in this thread against max_per_document
+
+        Used around the layout of one document; fetches beyond the limit are
+        refused, cache hits are not counted.
+        """
+        self._budget.remaining = self.max_per_document
+        try:
+            yield
+        finally:
+            self._budget.remaining = None
+
+    def fetch(self, url):
+        """Return (mime_type, bytes) for url, from the cache when possible"""
+        scheme = urlsplit(url).scheme.lower()
+        if scheme == 'data':
+            return self._download(url)
+        if scheme not in REMOTE_SCHEMES:
+            self._refuse(url, f"{scheme or 'relative'} URLs are not fetched")
+
+        key = RenderCache.make_key(url, 'asset', '')
+        cached = self.cache.get(key)
+        if cached is not None:
+            mime_type, _, data = cached.partition(b'\n')
+            return mime_type.decode('ascii'), data
+        if self.local_only:
+            self._refuse(url, "not in the asset cache and remote fetching is disabled")
+
+        with self._lock:
+            failed_until = self._failures.get(url)
+            if failed_until is not None:
+                if failed_until > time.time():
+                    raise AssetFetchError(f"{url} failed recently; not retrying yet")
+                del self._failures[url]
+            future = self._inflight.get(url)
+        if future is not None:
+            # A prefetch is already downloading it
+            return future.result(timeout=self.timeout * 2)
+        remaining = getattr(self._budget, 'remaining', None)
+        if remaining is not None:
+            if remaining <= 0:
+                self._refuse(url, f"more than {self.max_per_document} remote assets in one document")
+            self._budget.remaining = remaining - 1
+        return self._fetch_and_store(url, key)
+
+    def prefetch(self, urls, wait=False):
+        """Start fetching every remote URL not yet cached, concurrently
+
+        urls are one document's; only the first max_per_document remote
+        ones are considered. With wait, block until they finish or the fetch
+        timeout passes. Returns the number of fetches started.
+        """
+        if self.local_only:
+            return 0
+        remote = [url for url in dict.fromkeys(urls) if urlsplit(url).scheme.lower() in REMOTE_SCHEMES]
+        futures = []
+        with self._lock:
+            for url in remote[:self.max_per_document]:
+                if url in self._inflight:
+                    continue
+                key = RenderCache.make_key(url, 'asset', '')
+                if self.cache.get(key) is not None:
+                    continue
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                        thread_name_prefix='asset-prefetch')
+                future = self._executor.submit(self._fetch_and_store, url, key)
+                self._inflight[url] = future
+                futures.append(future)
+            self.prefetched += len(futures)
+        if wait and futures:
+            with timed('asset_prefetch'):
+                wait_futures(futures, timeout=self.timeout * 2)
+        return len(futures)
+
+    def _fetch_and_store(self, url, key):
+        try:
+            mime_type, data = self._download(url)
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+                self._failures[url] = time.time() + self.failure_ttl
+                self._inflight.pop(url, None)
+            logging.warning(f"Asset fetch failed for {url}: {e}")
+            raise AssetFetchError(f"Could not fetch {url}: {e}") from e
+        self.cache.put(key, mime_type.encode('ascii', 'replace') + b'\n' + data)
+        with self._lock:
+            self.fetched += 1
+            self._failures.pop(url, None)
+            self._inflight.pop(url, None)
+        return mime_type, data
+
+    def _download(self, url):
+        """Read url with the timeout and size cap applied to the whole transfer"""
+        request = urllib.request.Request(url, headers={'User-Agent': USER_AGENT})
+        deadline = time.monotonic() + self.timeout
+        with self._opener.open(request, timeout=self.timeout) as response:
+            length = response.headers.get('Content-Length')
+            if length and length.isdigit() and int(length) > self.max_bytes:
+                raise AssetFetchError(f"{url} is larger than {self.max_bytes} bytes")
+            chunks = []
+            size = 0
+            while True:
+                chunk = response.read1(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > self.max_bytes:
+                    raise AssetFetchError(f"{url} is larger than {self.max_bytes} bytes")
+                if time.monotonic() > deadline:
+                    raise AssetFetchError(f"{url} took longer than {self.timeout} seconds")
+                chunks.append(chunk)
+            mime_type = response.headers.get_content_type()
+        return mime_type, b''.join(chunks)
+
+    def _refuse(self, url, reason):
+        with self._lock:
+            self.refused += 1
+        logging.info(f"Asset refused: {url[:200]} ({reason})")
+        raise AssetFetchError(f"{url[:200]}: {reason}")
+
+    def stats(self):
+        cache = self.cache.stats()
+        with self._lock:
+            return {
+                'local_only': self.local_only,
+                'allow_private': self.allow_private,
+                'fetched': self.fetched,
+                'failed': self.failed,
+                'refused': self.refused,
+                'prefetched': self.prefetched,
+                'inflight': len(self._inflight),
+                'cache_hits': cache['hits'],
+                'cache_misses': cache['misses'],
+                'cache_bytes': cache['bytes'] + cache['disk_bytes'],
+            }
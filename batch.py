@@ -0,0 +1,236 @@
+import io
+import json
+import time
+import logging
+import zipfile
+import posixpath
+import threading
+from concurrent.futures import as_completed
+from jobs import _run_job, new_process_pool, pool_size, JobTimeoutError
+
+MARKDOWN_SUFFIXES = ('.md', '.markdown')
+
+
+class BatchError(Exception):
+    """Raised when a batch request as a whole cannot be accepted"""
+
+
+def output_name(name, format):
+    """Name of the converted file inside the result archive"""
+    return f"{posixpath.splitext(name)[0]}.{format}"
+
+
+def safe_member_name(name):
+    """Normalise an archive path so outputs can never escape the extraction directory"""
+    name = posixpath.normpath(name.replace('\\', '/')).lstrip('/')
+    if name.startswith('..'):
+        name = posixpath.basename(name)
+    return name
+
+
+def _add_document(documents, errors, name, data):
+    try:
+        documents.append((name, data.decode('utf-8')))
+    except UnicodeDecodeError:
+        errors.append({'source': name, 'error': 'File is not valid UTF-8'})
+
+
+def read_zip_documents(fileobj, max_files, max_bytes):
+    """Extract markdown files from a zip archive
+
+    Returns (documents, errors): a list of (name, content) pairs and
+    manifest entries for members that could not be read. Non-markdown
+    members are ignored.
+    """
+    try:
+        archive = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile:
+        raise BatchError("Uploaded archive is not a valid zip file")
+
+    documents, errors = [], []
+    total = 0
+    with archive:
+        members = [info for info in archive.infolist()
+                   if not info.is_dir() and info.filename.lower().endswith(MARKDOWN_SUFFIXES)
+                   and not posixpath.basename(info.filename).startswith('.')]
+        if len(members) > max_files:
+            raise BatchError(f"Too many files in batch ({len(members)}, limit {max_files})")
+        for info in members:
+            # Check declared sizes before inflating anything
+            total += info.file_size
+            if total > max_bytes:
+                raise BatchError(f"Batch exceeds {max_bytes} bytes of markdown")
+            try:
+                with archive.open(info) as member:
+                    data = member.read(info.file_size + 1)
+            except Exception as e:
+                errors.append({'source': info.filename, 'error': f'Could not read file: {e}'})
+                continue
+            if len(data) > info.file_size:
+                errors.append({'source': info.filename, 'error': 'File size does not match the archive header'})
+                continue
+            _add_document(documents, errors, safe_member_name(info.filename), data)
+    return documents, errors
+
+
+def read_uploaded_documents(files, max_files, max_bytes):
+    """Collect markdown documents from uploaded files, expanding zip archives
+
+    files is a list of (filename, file object) pairs. Returns (documents,
+    errors) like read_zip_documents.
+    """
+    documents, errors = [], []
+    total = 0
+    for filename, fileobj in files:
+        lower = filename.lower()
+        if lower.endswith('.zip'):
+            found, failed = read_zip_documents(fileobj, max_files - len(documents), max_bytes - total)
+            documents.extend(found)
+            errors.extend(failed)
+            total += sum(len(content) for _, content in found)
+        elif lower.endswith(MARKDOWN_SUFFIXES):
+            if len(documents) >= max_files:
+                raise BatchError(f"Too many files in batch (limit {max_files})")
+            data = fileobj.read(max_bytes - total + 1)
+            total += len(data)
+            if total > max_bytes:
+                raise BatchError(f"Batch exceeds {max_bytes} bytes of markdown")
+            _add_document(documents, errors, safe_member_name(filename), data)
+        else:
+            errors.append({'source': filename, 'error': 'Not a markdown file or zip archive'})
+    return _dedupe_names(documents), errors
+
+
+def _dedupe_names(documents):
+    """Suffix repeated names so outputs never overwrite each other in the archive"""
+    seen = set()
+    unique = []
+    for name, content in documents:
+        candidate = name
+        counter = 1
+        while candidate.lower() in seen:
+            stem, ext = posixpath.splitext(name)
+            candidate = f"{stem}-{counter}{ext}"
+            counter += 1
+        seen.add(candidate.lower())
+        unique.append((candidate, content))
+    return unique
+
+
+class BatchConverter:
+    """Fan batch conversions out over a process pool sized to the host's cores.
+
+    Each worker process keeps its own parser and WeasyPrint context, so
+    font and extension setup is paid once per worker rather than once per
+    file. Results are yielded in completion order.
+    """
+
+    def __init__(self, func, max_workers=None, timeout=120):
+        self.func = func
+        self.max_workers = max_workers or pool_size()
+        self.timeout = timeout
+        self._executor = None
+        self._lock = threading.Lock()
+
+        self.batches = 0
+        self.converted = 0
+        self.failed = 0
+
+    def _get_executor(self):
+        # Created on first use so importing the app never forks
+        with self._lock:
+            if self._executor is None:
+                self._executor = new_process_pool(self.max_workers)
+            return self._executor
+
+    def run(self, tasks):
+        """Convert tasks and yield (task, data, error) as each one finishes
+
+        tasks are (name, format, content) tuples and each runs
+        func(content, format). Closing the generator early cancels
+        conversions that have not started.
+        """
+        executor = self._get_executor()
+        with self._lock:
+            self.batches += 1
+        futures = {executor.submit(_run_job, self.func, self.timeout, (task[2], task[1])): task
+                   for task in tasks}
+        try:
+            for future in as_completed(futures):
+                task = futures[future]
+                try:
+                    data, error = future.result(), None
+                except JobTimeoutError:
+                    data, error = None, f"Conversion exceeded {self.timeout} seconds"
+                except Exception as e:
+                    data, error = None, str(e) or e.__class__.__name__
+                with self._lock:
+                    if error is None:
+                        self.converted += 1
+                    else:
+                        self.failed += 1
+                yield task, data, error
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'batches': self.batches,
+                'converted': self.converted,
+                'failed': self.failed,
+            }
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+
+class _ZipStream(io.RawIOBase):
+    """Write-only sink that hands zipfile output back in chunks"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(results, errors=()):
+    """Yield a zip archive chunk by chunk as conversion results arrive
+
+    results yields (name, format, data, error) tuples. Each successful
+    output is written as soon as it is available; manifest.json, listing
+    every output and every per-file error, is written last.
+    """
+    sink = _ZipStream()
+    manifest = {'files': [], 'errors': list(errors)}
+    started = time.time()
+    # PDF and DOCX are already compressed, so store them as-is
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for name, format, data, error in results:
+            if error is not None:
+                logging.warning(f"Batch conversion of {name} to {format} failed: {error}")
+                manifest['errors'].append({'source': name, 'format': format, 'error': error})
+                continue
+            target = output_name(name, format)
+            archive.writestr(target, data)
+            manifest['files'].append({'source': name, 'format': format, 'output': target, 'size': len(data)})
+            yield sink.drain()
+
+        manifest['elapsed_seconds'] = round(time.time() - started, 3)
+        archive.writestr('manifest.json', json.dumps(manifest, indent=2),
+                         compress_type=zipfile.ZIP_DEFLATED)
+    yield sink.drain()
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Offline performance benchmarks for upload, preview and PDF/DOCX conversion
+
+Drives the Flask app through app.test_client() and the serverless handler
+in api/index.py with a generated markdown corpus, and reports latency
+percentiles, throughput and memory as JSON. Each scenario records how much
+resident memory it added; --trace-memory also records the peak Python heap
+it allocated (tracemalloc slows every request, so latencies are inflated).
+
+Usage: python benchmark_app.py [--iterations 3] [--docs small,tables] [--output results.json]
+       python benchmark_app.py --output new.json --compare baseline.json [--threshold 0.2]
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import resource
+import subprocess
+import tracemalloc
+from datetime import datetime, timezone
+
+# Add the current directory to the path
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+# Measure cold conversions in an isolated, in-memory setup unless overridden
+os.environ.setdefault('RENDER_CACHE_DISK', '0')
+os.environ.setdefault('FILE_STORAGE_BACKEND', 'memory')
+
+DOC_TYPES = ['small', 'large', 'tables', 'code', 'images']
+ENDPOINTS = [
+    'flask_upload', 'flask_download_pdf', 'flask_download_docx',
+    'handler_upload', 'handler_download_pdf', 'handler_download_docx',
+]
+MIMETYPES = {
+    'pdf': 'application/pdf',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+}
+# 1x1 transparent PNG, inlined so image-heavy documents never touch the network
+PIXEL_PNG = ('iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk'
+             'YPhfDwAChwGA60e6kgAAAABJRU5ErkJggg==')
+WORDS = ('markdown document conversion render layout table section heading paragraph '
+         'performance latency worker process cache upload download preview style font').split()
+
+
+def sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def generate_document(kind, rng):
+    """Build one benchmark document of the given kind"""
+    parts = [f"# Benchmark: {kind}\n\n{sentence(rng, 20)}\n"]
+    if kind == 'small':
+        parts.append(f"## Overview\n\n{sentence(rng)} **{rng.choice(WORDS)}** *{rng.choice(WORDS)}*\n\n"
+                     "- one\n- two\n- three\n\n")
+    elif kind == 'large':
+        size = len(parts[0])
+        chapter = 0
+        while size < 1024 * 1024:
+            chapter += 1
+            block = [f"\n## Chapter {chapter}\n\n"]
+            for _ in range(8):
+                block.append(' '.join(sentence(rng) for _ in range(6)) + '\n\n')
+            block.append(''.join(f"- {sentence(rng, 6)}\n" for _ in range(5)) + '\n')
+            text = ''.join(block)
+            parts.append(text)
+            size += len(text)
+    elif kind == 'tables':
+        for table in range(50):
+            rows = ''.join(f"| {n} | {rng.choice(WORDS)} | {rng.randint(0, 10000)} | {sentence(rng, 4)} |\n"
+                           for n in range(20))
+            parts.append(f"\n## Table {table}\n\n| # | Name | Value | Notes |\n|---|------|-------|-------|\n{rows}")
+    elif kind == 'code':
+        for block in range(200):
+            language = 'python' if block % 2 else 'javascript'
+            if language == 'python':
+                body = f"def handler_{block}(request):\n    data = request.get_json()\n    return {{'id': {block}, 'ok': True}}\n"
+            else:
+                body = f"function handler{block}(req, res) {{\n  const id = {block};\n  res.json({{ id, ok: true }});\n}}\n"
+            parts.append(f"\n### Snippet {block}\n\n{sentence(rng, 8)}\n\n```{language}\n{body}```\n")
+    elif kind == 'images':
+        for image in range(100):
+            parts.append(f"\n![Figure {image}](data:image/png;base64,{PIXEL_PNG})\n\n*Figure {image}: {sentence(rng, 6)}*\n")
+    return ''.join(parts)
+
+
+def generate_corpus(kinds, seed=1234):
+    """Generate the benchmark corpus deterministically"""
+    rng = random.Random(seed)
+    return {kind: generate_document(kind, rng) for kind in kinds}
+
+
+def percentile(sorted_values, q):
+    """Linear-interpolated percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def current_rss_bytes():
+    """Resident memory now, or the peak where /proc is not available"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return peak_rss_bytes()
+
+
+def vary(content, iteration):
+    """Make each iteration's upload distinct, so deduplication does not turn repeats into cache hits"""
+    return content + f"\n<!-- benchmark iteration {iteration} -->\n".encode('utf-8')
+
+
+def measure(func, iterations, reset=None):
+    """Call func(iteration) -> (ok, bytes_out, note) repeatedly and summarise the latencies"""
+    latencies = []
+    failures = 0
+    bytes_out = 0
+    notes = {}
+    rss_before = current_rss_bytes()
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+        traced_before = tracemalloc.get_traced_memory()[0]
+    for iteration in range(iterations):
+        if reset is not None:
+            reset()
+        start = time.perf_counter()
+        ok, size, note = func(iteration)
+        latencies.append(time.perf_counter() - start)
+        failures += 0 if ok else 1
+        bytes_out += size
+        if note:
+            notes[note] = notes.get(note, 0) + 1
+
+    ordered = sorted(latencies)
+    total = sum(latencies)
+    stats = {
+        'iterations': iterations,
+        'failures': failures,
+        'mean_ms': round(total / iterations * 1000, 3),
+        'min_ms': round(ordered[0] * 1000, 3),
+        'p50_ms': round(percentile(ordered, 0.50) * 1000, 3),
+        'p90_ms': round(percentile(ordered, 0.90) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+        'throughput_per_sec': round(iterations / total, 3) if total else None,
+        'bytes_out': bytes_out,
+        'rss_delta_bytes': current_rss_bytes() - rss_before,
+        'notes': notes,
+    }
+    if tracemalloc.is_tracing():
+        stats['traced_peak_bytes'] = tracemalloc.get_traced_memory()[1] - traced_before
+    return stats
+
+
+def response_note(format, mimetype):
+    """Flag conversions that fell back to another format (e.g. HTML when WeasyPrint is missing)"""
+    return None if mimetype == MIMETYPES[format] else f"served {mimetype}"
+
+
+def bench_flask(corpus, iterations, warm):
+    import app as app_module
+    client = app_module.app.test_client()
+
+    def reset():
+        if not warm:
+            app_module.render_cache.clear()
+            app_module.section_cache.clear()
+            app_module.highlight_cache.clear()
+
+    def upload(name, content):
+        response = client.post('/upload', data={'file': (io.BytesIO(content), f'{name}.md')},
+                               content_type='multipart/form-data')
+        return response
+
+    results = {}
+    for name, text in corpus.items():
+        content = text.encode('utf-8')
+        doc_results = {}
+
+        def do_upload(iteration):
+            response = upload(name, vary(content, iteration))
+            return response.status_code == 200, len(response.data), None
+        doc_results['flask_upload'] = measure(do_upload, iterations)
+
+        filename = upload(name, content).get_json()['filename']
+        for format in ['pdf', 'docx']:
+            def do_download(_, format=format):
+                response = client.get(f'/download/{format}/{filename}')
+                return response.status_code == 200, len(response.data), response_note(format, response.mimetype)
+            doc_results[f'flask_download_{format}'] = measure(do_download, iterations, reset)
+        results[name] = doc_results
+    return results
+
+
+def bench_handler(corpus, iterations):
+    from werkzeug.test import EnvironBuilder
+    from werkzeug.wrappers import Request
+    from api.index import handler
+
+    def call(path, method='GET', data=None, query=None):
+        builder = EnvironBuilder(path=path, method=method, data=data, query_string=query)
+        try:
+            return handler(Request(builder.get_environ()))
+        finally:
+            builder.close()
+
+    results = {}
+    for name, text in corpus.items():
+        content = text.encode('utf-8')
+        doc_results = {}
+
+        def do_upload(iteration):
+            body, status, _ = call('/upload', 'POST', {'file': (io.BytesIO(vary(content, iteration)), f'{name}.md')})
+            return status == 200, len(body), None
+        doc_results['handler_upload'] = measure(do_upload, iterations)
+
+        body, _, _ = call('/upload', 'POST', {'file': (io.BytesIO(content), f'{name}.md')})
+        filename = json.loads(body)['filename']
+        for format in ['pdf', 'docx']:
+            def do_download(_, format=format):
+                body, status, headers = call(f'/download/{format}/{filename}', query={'mode': 'binary'})
+                return status == 200, len(body), response_note(format, headers.get('Content-Type'))
+            doc_results[f'handler_download_{format}'] = measure(do_download, iterations)
+        results[name] = doc_results
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare(results, baseline, threshold):
+    """Return regressions where p50 latency grew by more than threshold (a fraction)"""
+    regressions = []
+    for doc, endpoints in results['results'].items():
+        for endpoint, stats in endpoints.items():
+            base = baseline.get('results', {}).get(doc, {}).get(endpoint)
+            if not base or not base.get('p50_ms'):
+                continue
+            change = stats['p50_ms'] / base['p50_ms'] - 1
+            line = f"{doc:>8} {endpoint:<24} {base['p50_ms']:>10.1f} -> {stats['p50_ms']:>10.1f} ms ({change:+.1%})"
+            print(line, file=sys.stderr)
+            if change > threshold:
+                regressions.append({'doc': doc, 'endpoint': endpoint, 'baseline_p50_ms': base['p50_ms'],
+                                    'p50_ms': stats['p50_ms'], 'change': round(change, 4)})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=3, help='Requests per document and endpoint')
+    parser.add_argument('--docs', default=','.join(DOC_TYPES), help=f"Comma-separated subset of {', '.join(DOC_TYPES)}")
+    parser.add_argument('--targets', default='flask,handler', help='Comma-separated subset of flask, handler')
+    parser.add_argument('--warm', action='store_true', help='Keep render caches between iterations')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='Record the peak Python heap of each scenario with tracemalloc (slows requests)')
+    parser.add_argument('--seed', type=int, default=1234, help='Corpus generator seed')
+    parser.add_argument('--output', help='Write JSON results to this file instead of stdout')
+    parser.add_argument('--compare', help='Baseline JSON results to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed p50 slowdown before failing (0.2 = 20%%)')
+    args = parser.parse_args(argv)
+
+    kinds = [kind.strip() for kind in args.docs.split(',') if kind.strip()]
+    unknown = [kind for kind in kinds if kind not in DOC_TYPES]
+    if unknown:
+        parser.error(f"unknown document types: {', '.join(unknown)}")
+    targets = [target.strip() for target in args.targets.split(',') if target.strip()]
+
+    corpus = generate_corpus(kinds, args.seed)
+
+    # The app logs every request at DEBUG; keep the benchmark output readable
+    logging.getLogger().setLevel(logging.WARNING)
+    from rendering import RENDER_VERSION
+    from pdf_context import load_weasyprint
+
+    results = {kind: {} for kind in kinds}
+    if args.trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    # Backends load lazily; import them up front so the first request is not charged for it
+    from renderers import load_all
+    load_all()
+    if 'flask' in targets:
+        import app  # (import cost is not part of any endpoint timing; see benchmark_startup.py)
+        app.warm_up()
+        logging.getLogger().setLevel(logging.WARNING)
+        for kind, stats in bench_flask(corpus, args.iterations, args.warm).items():
+            results[kind].update(stats)
+    if 'handler' in targets:
+        for kind, stats in bench_handler(corpus, args.iterations).items():
+            results[kind].update(stats)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'git_revision': git_revision(),
+            'render_version': RENDER_VERSION,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'weasyprint_available': load_weasyprint(),
+            'iterations': args.iterations,
+            'warm_cache': args.warm,
+            'trace_memory': args.trace_memory,
+            'seed': args.seed,
+            'elapsed_seconds': round(time.perf_counter() - started, 3),
+        },
+        'corpus': {kind: {'bytes': len(text.encode('utf-8'))} for kind, text in corpus.items()},
+        'results': results,
+        'peak_rss_bytes': peak_rss_bytes(),
+    }
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        report['regressions'] = compare(report, baseline, args.threshold)
+        if report['regressions']:
+            print(f"{len(report['regressions'])} regressions over {args.threshold:.0%}", file=sys.stderr)
+            exit_code = 1
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return exit_code
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark DOCX conversion: the single-pass HTML writer vs the old line-based converter
+
+Usage: python benchmark_docx.py [--sections 10,50,100,200,400] [--repeat 3]
+"""
+
+import io
+import os
+import sys
+import time
+import argparse
+
+# Add the current directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from docx import Document
+from docx.shared import Pt
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from rendering import render_docx
+
+SECTION = """## Section {n}
+
+Some **bold** text, some *italic* text and `inline code` with a [link](https://example.com/{n}).
+
+- First item
+- Second item
+    - Nested item
+- Third item
+
+1. One
+2. Two
+3. Three
+
+> A quoted paragraph for section {n}.
+
+```python
+def section_{n}():
+    return {n}
+```
+
+| Name | Value |
+|------|-------|
+| a    | {n}   |
+| b    | {n}   |
+
+"""
+
+
+def legacy_render_docx(md_content):
+    """The line-by-line startswith converter previously used by app.py"""
+    doc = Document()
+    style = doc.styles['Normal']
+    style.font.name = 'Calibri'
+    style.font.size = Pt(11)
+    style.paragraph_format.line_spacing = 1.15
+
+    for line in md_content.split('\n'):
+        line = line.strip()
+        if line.startswith('# '):
+            doc.add_heading(line[2:], 0).alignment = WD_ALIGN_PARAGRAPH.LEFT
+        elif line.startswith('## '):
+            doc.add_heading(line[3:], 1).alignment = WD_ALIGN_PARAGRAPH.LEFT
+        elif line.startswith('### '):
+            doc.add_heading(line[4:], 2).alignment = WD_ALIGN_PARAGRAPH.LEFT
+        elif line.startswith('#### '):
+            doc.add_heading(line[5:], 3).alignment = WD_ALIGN_PARAGRAPH.LEFT
+        elif line.startswith('- ') or line.startswith('* '):
+            doc.add_paragraph(line[2:], style='List Bullet')
+        elif line[:3] in ('1. ', '2. ', '3. ', '4. ', '5. '):
+            doc.add_paragraph(line[3:], style='List Number')
+        elif line.startswith('```'):
+            doc.add_paragraph().style = 'No Spacing'
+        elif line.startswith('> '):
+            doc.add_paragraph(line[2:]).style = 'Quote'
+        elif line and not line.startswith('#'):
+            p = doc.add_paragraph(line)
+            for run in p.runs:
+                if '**' in run.text:
+                    run.bold = True
+                if '*' in run.text and not '**' in run.text:
+                    run.italic = True
+                if '`' in run.text:
+                    run.font.name = 'Courier New'
+                    run.font.size = Pt(10)
+
+    doc_io = io.BytesIO()
+    doc.save(doc_io)
+    return doc_io.getvalue()
+
+
+def best_time(func, content, repeat):
+    """Return the fastest of repeat runs in seconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(content)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sections', default='10,50,100,200,400',
+                        help='Comma-separated document sizes, in sections')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per size (best is reported)')
+    args = parser.parse_args()
+
+    print(f"{'sections':>8} {'KB':>8} {'legacy s':>10} {'writer s':>10} {'writer ms/KB':>13}")
+    for sections in [int(n) for n in args.sections.split(',')]:
+        content = '# Benchmark\n\n' + ''.join(SECTION.format(n=n) for n in range(sections))
+        size_kb = len(content.encode('utf-8')) / 1024
+        legacy = best_time(legacy_render_docx, content, args.repeat)
+        writer = best_time(render_docx, content, args.repeat)
+        print(f"{sections:>8} {size_kb:>8.1f} {legacy:>10.3f} {writer:>10.3f} {writer * 1000 / size_kb:>13.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark cold-start import cost of the app and of each conversion backend
+
+Every measurement runs in a fresh interpreter, so nothing is already in
+sys.modules. Backends are timed on their own; the app entry points are
+timed with lazy backends (the default) and with PRELOAD_BACKENDS=1, and
+report which heavy modules their import pulled in.
+
+Usage: python benchmark_startup.py [--repeat 5] [--json]
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+# Add the current directory to the path
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+# (label, module to import, extra environment)
+BACKENDS = [
+    ('flask', 'flask', {}),
+    ('markdown', 'markdown', {}),
+    ('pygments', 'pygments.lexers', {}),
+    ('lxml', 'lxml.html', {}),
+    ('requests', 'requests', {}),
+    ('python-docx', 'docx', {}),
+    ('weasyprint', 'weasyprint', {}),
+]
+ENTRY_POINTS = [
+    ('app (lazy)', 'app', {'PRELOAD_BACKENDS': '0'}),
+    ('app (preloaded)', 'app', {'PRELOAD_BACKENDS': '1'}),
+    ('api/index (lazy)', 'api.index', {}),
+]
+HEAVY_MODULES = ['weasyprint', 'docx', 'requests']
+
+PROBE = """
+import sys, json, time, importlib
+started = time.perf_counter()
+error = None
+try:
+    importlib.import_module(sys.argv[1])
+except Exception as e:
+    error = f"{e.__class__.__name__}: {e}"
+seconds = time.perf_counter() - started
+print(json.dumps({'seconds': seconds, 'error': error,
+                  'loaded': [m for m in sys.argv[2].split(',') if m in sys.modules]}))
+"""
+
+
+def probe(module, env, repeat):
+    """Import module in `repeat` fresh interpreters; return the median time and the last run's details"""
+    environment = dict(os.environ, RENDER_CACHE_DISK='0', FILE_STORAGE_BACKEND='memory', **env)
+    runs = []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, '-c', PROBE, module, ','.join(HEAVY_MODULES)],
+                                cwd=ROOT, env=environment, capture_output=True, text=True)
+        if result.returncode != 0:
+            return {'seconds': None, 'error': result.stderr.strip().splitlines()[-1], 'loaded': []}
+        runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    return dict(runs[-1], seconds=statistics.median(run['seconds'] for run in runs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per measurement (median is reported)')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON instead of a table')
+    args = parser.parse_args()
+
+    results = {}
+    for label, module, env in BACKENDS + ENTRY_POINTS:
+        results[label] = probe(module, env, args.repeat)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'import':<20} {'ms':>8}  {'heavy modules loaded / error'}")
+    for label, result in results.items():
+        ms = f"{result['seconds'] * 1000:8.1f}" if result['seconds'] is not None else f"{'-':>8}"
+        note = result['error'] or ', '.join(result['loaded']) or '-'
+        print(f"{label:<20} {ms}  {note}")
+
+if __name__ == '__main__':
+    main()
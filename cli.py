@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Command-line bulk converter for markdown files
+
+Converts files and directories of markdown to PDF, DOCX, HTML, EPUB and
+plain text with the same rendering pipeline as the web app's downloads,
+without going through HTTP.
+
+Usage: markdown-converter docs/ -o build/ -f pdf,docx -j 4 --incremental
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+from batch import BatchConverter, MARKDOWN_SUFFIXES, output_name
+from render_cache import RenderCache
+from rendering import RENDER_VERSION, render_document
+from renderers import formats as registered_formats
+
+FORMATS = registered_formats()
+STATE_FILE = '.markdown-converter-state.json'
+
+
+def find_markdown(paths):
+    """Yield (source path, output-relative name) for every markdown file under paths"""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                # Skip hidden directories such as .git
+                dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+                for name in sorted(files):
+                    if name.lower().endswith(MARKDOWN_SUFFIXES) and not name.startswith('.'):
+                        source = os.path.join(root, name)
+                        yield source, os.path.relpath(source, path).replace(os.sep, '/')
+        elif os.path.isfile(path):
+            yield path, os.path.basename(path)
+        else:
+            logging.error(f"No such file or directory: {path}")
+
+
+def load_state(output_dir):
+    """Load the output hashes recorded by previous runs"""
+    try:
+        with open(os.path.join(output_dir, STATE_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_state(output_dir, state):
+    fd, tmp_path = tempfile.mkstemp(dir=output_dir, prefix='.tmp-')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, os.path.join(output_dir, STATE_FILE))
+
+
+def write_output(path, data):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def convert(paths, output_dir, formats, workers=None, incremental=False, timeout=120):
+    """Convert every markdown file under paths into output_dir and return a summary dict"""
+    os.makedirs(output_dir, exist_ok=True)
+    # Hashes are recorded on every run so a later --incremental run can skip unchanged files
+    state = load_state(output_dir)
+    summary = {'documents': 0, 'converted': 0, 'skipped': 0, 'failed': 0, 'bytes_in': 0, 'errors': []}
+    started = time.time()
+
+    tasks = []
+    keys = {}
+    # Output name (lowercased, for case-insensitive filesystems) -> the source claiming it
+    claimed = {}
+    for source, name in find_markdown(paths):
+        summary['documents'] += 1
+        other = claimed.setdefault(name.lower(), source)
+        if other != source:
+            # e.g. a/README.md and b/README.md given as separate inputs would overwrite each other
+            error = f"output name {name} is already used by {other}; convert them into separate output directories"
+            logging.error(f"{source}: {error}")
+            summary['failed'] += 1
+            summary['errors'].append({'source': source, 'error': error})
+            continue
+        try:
+            with open(source, encoding='utf-8') as f:
+                content = f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            summary['failed'] += 1
+            summary['errors'].append({'source': source, 'error': str(e)})
+            continue
+
+        queued = False
+        for format in formats:
+            # The render cache key covers content, format and renderer version
+            key = RenderCache.make_key(content, format, RENDER_VERSION)
+            target = output_name(name, format)
+            if incremental and state.get(target) == key and os.path.exists(os.path.join(output_dir, target)):
+                continue
+            keys[target] = key
+            tasks.append((name, format, content))
+            queued = True
+        if queued:
+            summary['bytes_in'] += len(content.encode('utf-8'))
+        else:
+            summary['skipped'] += 1
+
+    failed_sources = set()
+    converted_sources = set()
+    if tasks:
+        converter = BatchConverter(render_document, max_workers=workers, timeout=timeout)
+        try:
+            for (name, format, _), data, error in converter.run(tasks):
+                target = output_name(name, format)
+                if error is not None:
+                    logging.error(f"{name} -> {format}: {error}")
+                    summary['errors'].append({'source': name, 'format': format, 'error': error})
+                    failed_sources.add(name)
+                    state.pop(target, None)
+                    continue
+                write_output(os.path.join(output_dir, target), data)
+                state[target] = keys[target]
+                converted_sources.add(name)
+                logging.info(f"Wrote {target}")
+        finally:
+            converter.shutdown()
+
+    summary['converted'] = len(converted_sources - failed_sources)
+    summary['failed'] += len(failed_sources)
+    summary['elapsed_seconds'] = time.time() - started
+    save_state(output_dir, state)
+    return summary
+
+
+def print_summary(summary, stream=sys.stdout):
+    elapsed = max(summary['elapsed_seconds'], 1e-9)
+    processed = summary['converted'] + summary['failed']
+    print(f"{summary['documents']} documents: {summary['converted']} converted, "
+          f"{summary['skipped']} unchanged, {summary['failed']} failed", file=stream)
+    print(f"{summary['elapsed_seconds']:.2f}s, {processed / elapsed:.2f} docs/sec, "
+          f"{summary['bytes_in'] / (1024 * 1024) / elapsed:.2f} MB/sec", file=stream)
+
+
+def parse_formats(value):
+    formats = list(dict.fromkeys(f.strip().lower() for f in value.split(',') if f.strip()))
+    unknown = [f for f in formats if f not in FORMATS]
+    if not formats or unknown:
+        raise argparse.ArgumentTypeError(f"formats must be a comma-separated subset of {', '.join(FORMATS)}")
+    return formats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='markdown-converter',
+        description='Convert markdown files and directories to PDF, DOCX, HTML, EPUB and plain text'
+    )
+    parser.add_argument('paths', nargs='+', help='Markdown files or directories to convert')
+    parser.add_argument('-o', '--output', default='converted', help='Output directory (default: converted)')
+    parser.add_argument('-f', '--formats', type=parse_formats, default=['pdf'],
+                        help=f"Comma-separated output formats: {', '.join(FORMATS)} (default: pdf)")
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='Parallel worker processes (default: one per CPU core)')
+    parser.add_argument('-i', '--incremental', action='store_true',
+                        help='Skip files whose content and renderer are unchanged since the last run')
+    parser.add_argument('--timeout', type=int, default=120, help='Per-file conversion time limit in seconds')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Log every file written')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format='%(message)s')
+    if args.jobs is not None and args.jobs < 1:
+        parser.error('--jobs must be at least 1')
+
+    summary = convert(args.paths, args.output, args.formats, workers=args.jobs,
+                      incremental=args.incremental, timeout=args.timeout)
+    print_summary(summary)
+    return 1 if summary['failed'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
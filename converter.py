@@ -0,0 +1,142 @@
+import re
+import hashlib
+import threading
+from contextlib import contextmanager
+import markdown
+from metrics import timed
+# The cached codehilite must come after extra, whose fenced code preprocessor it replaces
+from highlighting import CODEHILITE_EXTENSION
+
+MARKDOWN_EXTENSIONS = ['extra', 'tables', CODEHILITE_EXTENSION, 'toc']
+# Upload previews skip Pygments; fenced code is left as plain <pre><code class="language-...">
+PREVIEW_EXTENSIONS = ['extra', 'tables', 'toc']
+
+IMG_SRC_RE = re.compile(r'<img\b[^>]*?\bsrc="([^"]*)"')
+TAG_RE = re.compile(r'<[^>]+>')
+WORD_RE = re.compile(r"\w[\w'-]*")
+
+
+class MarkdownPool:
+    """Reusable markdown.Markdown instances for one extension set.
+
+    Building a Markdown instance imports and configures every extension
+    (codehilite pulls in Pygments), so instances are kept and reset()
+    between documents instead. Each instance is only ever used by one
+    thread at a time; idle ones sit on a stack guarded by a lock.
+    """
+
+    def __init__(self, extensions, max_idle=8):
+        self.extensions = list(extensions)
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def acquire(self):
+        """Take an idle instance, building a new one if none is free"""
+        with self._lock:
+            if self._idle:
+                self.reused += 1
+                return self._idle.pop()
+            self.created += 1
+        return markdown.Markdown(extensions=self.extensions)
+
+    def release(self, md):
+        """Reset an instance and return it to the pool"""
+        md.reset()
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(md)
+
+    @contextmanager
+    def instance(self):
+        """Borrow an instance for the duration of a with block"""
+        md = self.acquire()
+        yield md
+        # Not reached if the block raised: a failed instance is dropped, not reused
+        self.release(md)
+
+    def convert(self, text):
+        """Convert markdown text to an HTML fragment"""
+        with self.instance() as md:
+            return md.convert(text)
+
+    def warm(self, count=1):
+        """Pre-build instances so the first requests skip extension setup"""
+        instances = [self.acquire() for _ in range(count)]
+        for md in instances:
+            self.release(md)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'extensions': self.extensions,
+                'created': self.created,
+                'reused': self.reused,
+                'idle': len(self._idle),
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(extensions=MARKDOWN_EXTENSIONS):
+    """Return the shared pool for an extension set"""
+    key = tuple(extensions)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(key, MarkdownPool(key))
+    return pool
+
+
+def convert_markdown(text, extensions=MARKDOWN_EXTENSIONS):
+    """Convert markdown text to HTML using a pooled parser"""
+    with timed('parse'):
+        return get_pool(extensions).convert(text)
+
+
+def pool_stats():
+    """Return stats for every extension profile in use"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [pool.stats() for pool in pools]
+
+
+def parse_document(text, extensions=MARKDOWN_EXTENSIONS, content_hash=None):
+    """Convert markdown once and return the HTML with its TOC, content hash and metadata
+
+    Uploads store this alongside the source so downloads reuse the HTML
+    instead of parsing the document again. content_hash, the SHA-256 of the
+    UTF-8 text, can be passed when the caller already hashed the upload.
+    """
+    with timed('parse'), get_pool(extensions).instance() as md:
+        html = md.convert(text)
+        # The toc extension leaves these on the instance until reset()
+        toc = getattr(md, 'toc', '')
+        toc_tokens = getattr(md, 'toc_tokens', [])
+    return {
+        'html': html,
+        'toc': toc,
+        'content_hash': content_hash or hashlib.sha256(text.encode('utf-8')).hexdigest(),
+        'metadata': {
+            'heading_count': count_headings(toc_tokens),
+            'word_count': len(WORD_RE.findall(TAG_RE.sub(' ', html))),
+            'images': IMG_SRC_RE.findall(html),
+        },
+    }
+
+
+def count_headings(toc_tokens):
+    """Count headings in the toc extension's nested token list"""
+    return sum(1 + count_headings(token.get('children', [])) for token in toc_tokens)
+
+
+def document_html(record):
+    """Return an upload record's precomputed HTML, converting records stored without it"""
+    html = record.get('html')
+    if html is None:
+        html = convert_markdown(record['content'])
+    return html
@@ -0,0 +1,340 @@
+import io
+import re
+from html.parser import HTMLParser
+from docx import Document
+from docx.shared import Pt, RGBColor
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from docx.opc.constants import RELATIONSHIP_TYPE
+
+HEADING_TAGS = {'h1': 0, 'h2': 1, 'h3': 2, 'h4': 3, 'h5': 4, 'h6': 5}
+BLOCK_TAGS = {'p', 'div', 'dt', 'dd'}
+INLINE_FORMATS = {
+    'strong': 'bold', 'b': 'bold',
+    'em': 'italic', 'i': 'italic',
+    'code': 'code', 'kbd': 'code', 'samp': 'code',
+    'del': 'strike', 's': 'strike',
+}
+# Elements whose text never reaches the document
+SKIPPED_TAGS = {'script', 'style', 'head', 'title'}
+MAX_LIST_DEPTH = 3
+
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+class DocxBuilder(HTMLParser):
+    """Build a python-docx Document from Markdown's HTML output in a single pass.
+
+    The HTML produced by Python-Markdown (including codehilite, tables and
+    toc output) is consumed as a token stream: each start tag, end tag and
+    text chunk is handled once, so conversion time is linear in the size of
+    the document.
+    """
+
+    def __init__(self, document):
+        super().__init__(convert_charrefs=True)
+        self.doc = document
+        self.paragraph = None
+        self.last_run = None
+        self.hyperlink = None
+        self.formats = []
+        self.lists = []
+        self.quote_depth = 0
+        self.pre_depth = 0
+        self.skip_depth = 0
+        self.heading_level = None
+        # Rows of cells, each cell a list of (text, formats) runs
+        self.table = None
+        self.cell = None
+        # python-docx scans every style on each lookup by name, so resolve ids once
+        self.style_ids = {}
+
+    @property
+    def paragraph(self):
+        return self._paragraph
+
+    @paragraph.setter
+    def paragraph(self, value):
+        # Track emptiness ourselves; Paragraph.runs rebuilds a list on every access
+        self._paragraph = value
+        self.paragraph_empty = True
+        self.line_start = True
+
+    # Tag handling
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self.skip_depth += 1
+            return
+        if self.skip_depth:
+            return
+
+        if self.table is not None:
+            self._table_starttag(tag, attrs)
+            return
+
+        if tag in HEADING_TAGS:
+            self.heading_level = HEADING_TAGS[tag]
+            self.paragraph = self._add_paragraph('Title' if self.heading_level == 0 else f'Heading {self.heading_level}')
+            self.paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
+        elif tag in ('ul', 'ol'):
+            self.lists.append(tag)
+            self.paragraph = None
+        elif tag == 'li':
+            self.paragraph = self._add_paragraph(self._list_style())
+        elif tag == 'p' and self._in_empty_list_item():
+            # Loose lists wrap item text in <p>; keep it in the bullet paragraph
+            pass
+        elif tag in BLOCK_TAGS:
+            self.paragraph = None
+            if tag == 'dt':
+                self.formats.append('bold')
+        elif tag == 'blockquote':
+            self.quote_depth += 1
+            self.paragraph = None
+        elif tag == 'pre':
+            self.pre_depth += 1
+            self.paragraph = self._add_paragraph('No Spacing')
+        elif tag == 'table':
+            self.paragraph = None
+            self.table = []
+        elif tag == 'hr':
+            self._add_rule()
+        elif tag == 'br':
+            self._ensure_paragraph().add_run().add_break()
+            self.paragraph_empty = False
+            self.line_start = True
+        elif tag == 'img':
+            alt = dict(attrs).get('alt') or dict(attrs).get('src') or 'image'
+            self._add_text(f"[Image: {alt}]", extra_formats=('italic',))
+        elif tag == 'a':
+            href = dict(attrs).get('href')
+            if href:
+                self.hyperlink = self._start_hyperlink(href)
+        elif tag in INLINE_FORMATS:
+            self.formats.append(INLINE_FORMATS[tag])
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+            return
+        if self.skip_depth:
+            return
+
+        if self.table is not None:
+            self._table_endtag(tag)
+            return
+
+        if tag in HEADING_TAGS:
+            self.heading_level = None
+            self.paragraph = None
+        elif tag in ('ul', 'ol'):
+            if self.lists:
+                self.lists.pop()
+            self.paragraph = None
+        elif tag == 'li':
+            self.paragraph = None
+        elif tag == 'p' and self.lists:
+            # Following text in the same item continues its paragraph
+            pass
+        elif tag in BLOCK_TAGS:
+            self.paragraph = None
+            if tag == 'dt':
+                self._pop_format('bold')
+        elif tag == 'blockquote':
+            self.quote_depth = max(0, self.quote_depth - 1)
+            self.paragraph = None
+        elif tag == 'pre':
+            self.pre_depth = max(0, self.pre_depth - 1)
+            # Drop the newline Markdown leaves before </code></pre>
+            if self.last_run is not None and not self.paragraph_empty and self.last_run.text.endswith('\n'):
+                self.last_run.text = self.last_run.text.rstrip('\n')
+            self.paragraph = None
+        elif tag == 'a':
+            self.hyperlink = None
+        elif tag in INLINE_FORMATS:
+            self._pop_format(INLINE_FORMATS[tag])
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in ('br', 'hr', 'img'):
+            self.handle_endtag(tag)
+
+    def handle_data(self, data):
+        if self.skip_depth:
+            return
+
+        if self.pre_depth:
+            # Preformatted text keeps its line breaks
+            text = data
+        else:
+            text = WHITESPACE_RE.sub(' ', data)
+            if text == ' ' and (self.paragraph is None or self.paragraph_empty):
+                return
+
+        if self.table is not None:
+            if self.cell is not None and text.strip():
+                self.cell.append((text, tuple(self.formats)))
+            return
+
+        self._add_text(text)
+
+    # Paragraph and run helpers
+
+    def _list_style(self):
+        depth = min(len(self.lists), MAX_LIST_DEPTH)
+        base = 'List Number' if self.lists and self.lists[-1] == 'ol' else 'List Bullet'
+        return base if depth <= 1 else f'{base} {depth}'
+
+    def _in_empty_list_item(self):
+        return bool(self.lists) and self.paragraph is not None and self.paragraph_empty
+
+    def _ensure_paragraph(self):
+        if self.paragraph is None:
+            if self.lists:
+                style = self._list_style()
+            elif self.quote_depth:
+                style = 'Quote'
+            else:
+                style = None
+            self.paragraph = self._add_paragraph(style)
+        return self.paragraph
+
+    def _add_paragraph(self, style=None):
+        paragraph = self.doc.add_paragraph()
+        if style is not None:
+            if style not in self.style_ids:
+                self.style_ids[style] = self.doc.styles[style].style_id
+            paragraph._p.style = self.style_ids[style]
+        return paragraph
+
+    def _add_text(self, text, extra_formats=()):
+        paragraph = self._ensure_paragraph()
+        if self.line_start:
+            text = text.lstrip('\n') if self.pre_depth else text.lstrip(' ')
+            if not text:
+                return
+
+        run = paragraph.add_run(text)
+        self.paragraph_empty = False
+        self.line_start = False
+        self.last_run = run
+        formats = set(self.formats) | set(extra_formats)
+        if self.pre_depth:
+            formats.add('code')
+        apply_formats(run, formats)
+
+        if self.hyperlink is not None:
+            run.font.color.rgb = RGBColor(0x66, 0x7E, 0xEA)
+            run.font.underline = True
+            self.hyperlink.append(run._r)
+
+    def _pop_format(self, name):
+        for index in range(len(self.formats) - 1, -1, -1):
+            if self.formats[index] == name:
+                del self.formats[index]
+                return
+
+    def _start_hyperlink(self, href):
+        paragraph = self._ensure_paragraph()
+        hyperlink = OxmlElement('w:hyperlink')
+        if href.startswith('#'):
+            # In-document links, e.g. from the toc extension
+            hyperlink.set(qn('w:anchor'), href[1:])
+        else:
+            rel_id = paragraph.part.relate_to(href, RELATIONSHIP_TYPE.HYPERLINK, is_external=True)
+            hyperlink.set(qn('r:id'), rel_id)
+        paragraph._p.append(hyperlink)
+        return hyperlink
+
+    def _add_rule(self):
+        self.paragraph = None
+        paragraph = self.doc.add_paragraph()
+        borders = OxmlElement('w:pBdr')
+        bottom = OxmlElement('w:bottom')
+        bottom.set(qn('w:val'), 'single')
+        bottom.set(qn('w:sz'), '6')
+        bottom.set(qn('w:space'), '1')
+        bottom.set(qn('w:color'), 'E2E8F0')
+        borders.append(bottom)
+        paragraph._p.get_or_add_pPr().append(borders)
+
+    # Tables are buffered until </table> since the column count is only known then
+
+    def _table_starttag(self, tag, attrs):
+        if tag == 'tr':
+            self.table.append([])
+        elif tag in ('th', 'td') and self.table:
+            self.cell = []
+            self.table[-1].append((tag == 'th', self.cell))
+        elif tag == 'br' and self.cell is not None:
+            self.cell.append(('\n', tuple(self.formats)))
+        elif tag in INLINE_FORMATS:
+            self.formats.append(INLINE_FORMATS[tag])
+
+    def _table_endtag(self, tag):
+        if tag in ('th', 'td'):
+            self.cell = None
+        elif tag in INLINE_FORMATS:
+            self._pop_format(INLINE_FORMATS[tag])
+        elif tag == 'table':
+            rows, self.table = [row for row in self.table if row], None
+            self._write_table(rows)
+
+    def _write_table(self, rows):
+        if not rows:
+            return
+        columns = max(len(row) for row in rows)
+        table = self.doc.add_table(rows=len(rows), cols=columns)
+        table.style = 'Table Grid'
+        for row_cells, row in zip(table.rows, rows):
+            for cell, (is_header, runs) in zip(row_cells.cells, row):
+                paragraph = cell.paragraphs[0]
+                for index, (text, formats) in enumerate(runs):
+                    if index == 0:
+                        text = text.lstrip()
+                    formats = set(formats)
+                    if is_header:
+                        formats.add('bold')
+                    apply_formats(paragraph.add_run(text), formats)
+        self.paragraph = None
+
+
+def apply_formats(run, formats):
+    """Apply inline formatting names to a python-docx run"""
+    if 'bold' in formats:
+        run.bold = True
+    if 'italic' in formats:
+        run.italic = True
+    if 'strike' in formats:
+        run.font.strike = True
+    if 'code' in formats:
+        run.font.name = 'Courier New'
+        run.font.size = Pt(10)
+
+
+def new_document():
+    """Create a Document with the default styles used for conversions"""
+    doc = Document()
+    style = doc.styles['Normal']
+    style.font.name = 'Calibri'
+    style.font.size = Pt(11)
+    style.paragraph_format.line_spacing = 1.15
+    return doc
+
+
+def html_to_docx(html_content, doc=None):
+    """Append Markdown-generated HTML to a Document (a new one by default) and return it"""
+    doc = doc if doc is not None else new_document()
+    builder = DocxBuilder(doc)
+    builder.feed(html_content)
+    builder.close()
+    return doc
+
+
+def docx_bytes(doc):
+    """Serialise a Document to bytes"""
+    doc_io = io.BytesIO()
+    doc.save(doc_io)
+    return doc_io.getvalue()
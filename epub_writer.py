@@ -0,0 +1,115 @@
+import io
+import uuid
+import zipfile
+from datetime import datetime, timezone
+from xml.sax.saxutils import escape
+from lxml import etree, html as lxml_html
+
+XHTML_NS = 'http://www.w3.org/1999/xhtml'
+# Markup that is not allowed in EPUB content documents
+STRIPPED_TAGS = ['script', 'iframe', 'object', 'embed', 'form']
+
+CONTAINER_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles>
+    <rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>
+  </rootfiles>
+</container>
+"""
+
+EPUB_STYLESHEET = """
+body { font-family: serif; line-height: 1.5; }
+h1, h2, h3, h4, h5, h6 { font-family: sans-serif; page-break-after: avoid; }
+pre { white-space: pre-wrap; font-size: 0.85em; background: #f7fafc; padding: 0.5em; }
+code { font-family: monospace; }
+table { border-collapse: collapse; }
+th, td { border: 1px solid #cbd5e0; padding: 0.25em 0.5em; }
+blockquote { margin-left: 1em; padding-left: 1em; border-left: 3px solid #cbd5e0; }
+img { max-width: 100%; }
+"""
+
+
+def html_to_xhtml(html_content):
+    """Serialise an HTML fragment as well-formed XHTML body content
+
+    Raw HTML passed through by Markdown need not be well-formed XML, so the
+    fragment is re-parsed leniently and written back out as XML.
+    """
+    root = lxml_html.fragment_fromstring(html_content or '', create_parent='div')
+    etree.strip_elements(root, *STRIPPED_TAGS, with_tail=False)
+    parts = [escape(root.text or '')]
+    parts.extend(etree.tostring(child, encoding='unicode', method='xml') for child in root)
+    return ''.join(parts)
+
+
+def toc_to_nav(toc_html, content_file):
+    """Turn the toc extension's nested <ul> into the <ol> list an EPUB nav document needs"""
+    if not toc_html:
+        return ''
+    root = lxml_html.fragment_fromstring(toc_html, create_parent='div')
+    top = root.find('.//ul')
+    if top is None:
+        return ''
+    for element in top.iter():
+        if element.tag == 'ul':
+            element.tag = 'ol'
+            element.attrib.clear()
+        elif element.tag == 'a':
+            element.set('href', f"{content_file}{element.get('href', '')}")
+    return etree.tostring(top, encoding='unicode', method='xml')
+
+
+def xhtml_document(title, body, extra_head='', nav=False):
+    epub_ns = ' xmlns:epub="http://www.idpf.org/2007/ops"' if nav else ''
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<!DOCTYPE html>\n'
+        f'<html xmlns="{XHTML_NS}"{epub_ns}>\n'
+        f'<head><meta charset="UTF-8"/><title>{escape(title)}</title>{extra_head}</head>\n'
+        f'<body>{body}</body>\n'
+        '</html>\n'
+    )
+
+
+def build_epub(html_content, title='Markdown Document', toc_html='', language='en'):
+    """Package converted markdown as EPUB 3 bytes
+
+    The document is one content file; the navigation document is built
+    from the toc extension's output so chapters link to heading anchors.
+    """
+    nav_list = toc_to_nav(toc_html, 'content.xhtml') or \
+        f'<ol><li><a href="content.xhtml">{escape(title)}</a></li></ol>'
+    modified = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    package = f"""<?xml version="1.0" encoding="UTF-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="book-id">
+  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/">
+    <dc:identifier id="book-id">urn:uuid:{uuid.uuid4()}</dc:identifier>
+    <dc:title>{escape(title)}</dc:title>
+    <dc:language>{escape(language)}</dc:language>
+    <meta property="dcterms:modified">{modified}</meta>
+  </metadata>
+  <manifest>
+    <item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>
+    <item id="content" href="content.xhtml" media-type="application/xhtml+xml"/>
+    <item id="style" href="style.css" media-type="text/css"/>
+  </manifest>
+  <spine>
+    <itemref idref="content"/>
+  </spine>
+</package>
+"""
+    stylesheet_link = '<link rel="stylesheet" type="text/css" href="style.css"/>'
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        # The mimetype entry must come first and be stored uncompressed
+        archive.writestr('mimetype', 'application/epub+zip', compress_type=zipfile.ZIP_STORED)
+        archive.writestr('META-INF/container.xml', CONTAINER_XML)
+        archive.writestr('OEBPS/content.opf', package)
+        archive.writestr('OEBPS/nav.xhtml', xhtml_document(
+            title, f'<nav epub:type="toc" id="toc"><h1>{escape(title)}</h1>{nav_list}</nav>', nav=True
+        ))
+        archive.writestr('OEBPS/content.xhtml', xhtml_document(
+            title, html_to_xhtml(html_content), extra_head=stylesheet_link
+        ))
+        archive.writestr('OEBPS/style.css', EPUB_STYLESHEET)
+    return buffer.getvalue()
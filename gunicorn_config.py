@@ -0,0 +1,42 @@
+"""
+Gunicorn settings for production: preload the app and warm it up before forking
+
+Usage: gunicorn --config gunicorn_config.py main:app
+
+With preload_app the master imports the app once and runs app.warm_up(),
+which loads WeasyPrint and python-docx, builds fonts, Markdown parsers and
+Pygments styles, and renders a sample document. Workers are forked from
+that warm master, so they serve their first PDF without initialising
+anything and share the warmed memory copy-on-write.
+"""
+
+import os
+import gc
+import time
+import multiprocessing
+
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', '5000')}")
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+# The app's conversion, batch and PDF chunk process pools split the cores among the workers
+os.environ['WEB_CONCURRENCY'] = str(workers)
+worker_class = 'sync'
+# PDF renders of large documents run well past gunicorn's 30 second default
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+# Recycled workers are forked from the warm master again, so recycling costs no warm-up
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+
+def when_ready(server):
+    """Warm up the preloaded app in the master, before any worker is forked"""
+    if not server.cfg.preload_app:
+        return
+    from app import warm_up
+    started = time.perf_counter()
+    timings = warm_up(render_sample=True)
+    # Keep the collector from touching (and so copying) the warmed objects in every worker
+    gc.freeze()
+    server.log.info(f"Warm-up took {(time.perf_counter() - started) * 1000:.0f}ms: "
+                    + ', '.join(f'{step}={seconds * 1000:.0f}ms' for step, seconds in timings.items()))
+
@@ -0,0 +1,167 @@
+import os
+import logging
+import hashlib
+import types
+import threading
+from collections import OrderedDict
+from markdown.extensions import codehilite, fenced_code
+
+# Languages whose lexers are imported at startup rather than on first use
+COMMON_LANGUAGES = ['python', 'bash', 'console', 'javascript', 'typescript', 'json', 'yaml',
+                    'toml', 'ini', 'html', 'css', 'sql', 'diff', 'dockerfile', 'text']
+
+
+class HighlightCache:
+    """Byte-bounded LRU of Pygments output for code blocks, sized by UTF-8 length.
+
+    Keys hash the language, the code text and every lexer/formatter
+    option codehilite passes to Pygments, so a block is only lexed and
+    formatted again when something that affects its HTML changes.
+    """
+
+    def __init__(self, max_bytes=16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(lang, src, options):
+        """Build a cache key from a code block's language, source and highlighting options"""
+        digest = hashlib.sha256()
+        digest.update(repr((lang, sorted(options.items(), key=lambda item: item[0]))).encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(src.encode('utf-8'))
+        return digest.digest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, html):
+        size = len(html.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            self._entries[key] = (html, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions,
+            }
+
+
+class CachedCodeHilite(codehilite.CodeHilite):
+    """CodeHilite that serves repeated code blocks from highlight_cache"""
+
+    def hilite(self, shebang=True):
+        if not (codehilite.pygments and self.use_pygments):
+            return super().hilite(shebang)
+        # Everything hilite() reads, captured before it strips the source and parses headers
+        options = {
+            **self.options,
+            'shebang': shebang,
+            'guess_lang': self.guess_lang,
+            'lang_prefix': self.lang_prefix,
+            'pygments_formatter': self.pygments_formatter if isinstance(self.pygments_formatter, str)
+                                  else f'{self.pygments_formatter.__module__}.{self.pygments_formatter.__qualname__}',
+        }
+        key = highlight_cache.make_key(self.lang, self.src, options)
+        html = highlight_cache.get(key)
+        if html is None:
+            html = super().hilite(shebang)
+            highlight_cache.put(key, html)
+        return html
+
+
+def _using_highlighter(func, highlighter):
+    """Copy func with the global name CodeHilite bound to highlighter
+
+    Markdown's processors build CodeHilite objects inline; running a copy of
+    their run() against its own globals switches the class for this
+    extension only, leaving markdown's modules untouched.
+    """
+    copy = types.FunctionType(func.__code__, dict(func.__globals__, CodeHilite=highlighter),
+                              func.__name__, func.__defaults__, func.__closure__)
+    copy.__kwdefaults__ = func.__kwdefaults__
+    copy.__doc__ = func.__doc__
+    return copy
+
+
+class CachedHiliteTreeprocessor(codehilite.HiliteTreeprocessor):
+    run = _using_highlighter(codehilite.HiliteTreeprocessor.run, CachedCodeHilite)
+
+
+class CachedFencedBlockPreprocessor(fenced_code.FencedBlockPreprocessor):
+    run = _using_highlighter(fenced_code.FencedBlockPreprocessor.run, CachedCodeHilite)
+
+
+class CachedCodeHiliteExtension(codehilite.CodeHiliteExtension):
+    """codehilite with highlight_cache in front of Pygments
+
+    Covers indented blocks and, when listed after extra or fenced_code,
+    fenced blocks: those are highlighted by fenced_code's preprocessor,
+    which is replaced by one using the cache.
+    """
+
+    def extendMarkdown(self, md):
+        hiliter = CachedHiliteTreeprocessor(md)
+        hiliter.config = self.getConfigs()
+        md.treeprocessors.register(hiliter, 'hilite', 30)
+        md.registerExtension(self)
+
+        if 'fenced_code_block' in md.preprocessors:
+            fenced = md.preprocessors['fenced_code_block']
+            md.preprocessors.register(CachedFencedBlockPreprocessor(md, fenced.config), 'fenced_code_block', 25)
+
+
+def makeExtension(**kwargs):
+    return CachedCodeHiliteExtension(**kwargs)
+
+
+def warm_lexers(languages=COMMON_LANGUAGES):
+    """Import the lexers and HTML formatter for common languages ahead of the first request"""
+    if not codehilite.pygments:
+        return
+    for language in languages:
+        try:
+            codehilite.get_lexer_by_name(language)
+        except Exception as e:
+            logging.warning(f"Could not load Pygments lexer {language!r}: {e}")
+    codehilite.get_formatter_by_name('html')
+
+
+highlight_cache = HighlightCache(max_bytes=int(os.environ.get('HIGHLIGHT_CACHE_MAX_BYTES', 16 * 1024 * 1024)))
+# The code highlighting extension for MARKDOWN_EXTENSIONS; a cache size of 0 uses plain codehilite
+CODEHILITE_EXTENSION = 'highlighting:CachedCodeHiliteExtension' if highlight_cache.max_bytes else 'codehilite'
+
@@ -0,0 +1,93 @@
+import time
+import codecs
+import hashlib
+import threading
+from collections import deque
+
+# Bytes pulled from the upload stream per read
+CHUNK_SIZE = 64 * 1024
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds the size limit or the uploader's quota"""
+
+
+def read_upload(stream, max_bytes, chunk_size=CHUNK_SIZE):
+    """Read a UTF-8 upload in chunks and return (text, sha256 hex digest, size in bytes)
+
+    Bytes are decoded and hashed as they arrive, so the raw body is never
+    held in memory alongside the text. Reading stops with UploadTooLarge as
+    soon as more than max_bytes have been received. Invalid UTF-8 raises
+    UnicodeDecodeError.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    digest = hashlib.sha256()
+    parts = []
+    size = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            raise UploadTooLarge(f"Upload exceeds the limit of {max_bytes} bytes")
+        digest.update(chunk)
+        parts.append(decoder.decode(chunk))
+    parts.append(decoder.decode(b'', final=True))
+    return ''.join(parts), digest.hexdigest(), size
+
+
+class UploadQuota:
+    """Per-tenant cap on bytes uploaded within a sliding time window.
+
+    Usage is tracked in this process only. A max_bytes of 0 disables the
+    quota.
+    """
+
+    def __init__(self, max_bytes=0, window=3600):
+        self.max_bytes = max_bytes
+        self.window = window
+        # tenant -> deque of (timestamp, size), oldest first
+        self._usage = {}
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def remaining(self, tenant):
+        """Bytes the tenant may still upload in the current window, or None if unlimited"""
+        if not self.max_bytes:
+            return None
+        with self._lock:
+            return max(self.max_bytes - self._used(tenant, time.time()), 0)
+
+    def record(self, tenant, size):
+        if not self.max_bytes:
+            return
+        with self._lock:
+            self._usage.setdefault(tenant, deque()).append((time.time(), size))
+
+    def reject(self):
+        with self._lock:
+            self.rejected += 1
+
+    def purge_expired(self):
+        """Forget tenants with no uploads in the current window and return how many were dropped"""
+        with self._lock:
+            now = time.time()
+            idle = [tenant for tenant in list(self._usage) if not self._used(tenant, now)]
+            return len(idle)
+
+    def stats(self):
+        with self._lock:
+            return {'max_bytes': self.max_bytes, 'window': self.window,
+                    'tenants': len(self._usage), 'rejected': self.rejected}
+
+    def _used(self, tenant, now):
+        entries = self._usage.get(tenant)
+        if not entries:
+            return 0
+        while entries and entries[0][0] + self.window <= now:
+            entries.popleft()
+        if not entries:
+            del self._usage[tenant]
+            return 0
+        return sum(size for _, size in entries)
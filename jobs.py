@@ -0,0 +1,261 @@
+import os
+import time
+import uuid
+import signal
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Pool workers are started from a clean server process rather than forked from the
+# web worker, which runs threads (reaper, prefetch, pool managers) that fork would copy mid-state
+POOL_START_METHOD = os.environ.get('POOL_START_METHOD', 'forkserver')
+
+
+class QueueFullError(Exception):
+    """Raised when the conversion queue is at its depth limit"""
+
+
+class JobTimeoutError(Exception):
+    """Raised inside a worker process when a job exceeds its time limit"""
+
+
+def _raise_timeout(signum, frame):
+    raise JobTimeoutError()
+
+
+def pool_size():
+    """Default size of a process pool: the host's cores divided among the WEB_CONCURRENCY web workers"""
+    web_workers = int(os.environ.get('WEB_CONCURRENCY', 1)) or 1
+    return max(1, (os.cpu_count() or 1) // web_workers)
+
+
+def new_process_pool(max_workers=None):
+    """Create a ProcessPoolExecutor of max_workers (default pool_size()) not started by forking"""
+    method = POOL_START_METHOD
+    if method not in multiprocessing.get_all_start_methods():
+        method = 'spawn'
+    return ProcessPoolExecutor(max_workers=max_workers or pool_size(),
+                               mp_context=multiprocessing.get_context(method))
+
+
+def _run_job(func, timeout, args):
+    """Run func(*args) in a worker process, aborting after timeout seconds"""
+    if timeout:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.alarm(int(timeout))
+    try:
+        return func(*args)
+    finally:
+        if timeout:
+            signal.alarm(0)
+
+
+class JobQueue:
+    """Bounded queue of background conversions executed on a process pool.
+
+    Jobs are tracked in memory by id. Submissions beyond max_pending
+    outstanding jobs raise QueueFullError so callers can apply
+    back-pressure, and finished jobs are forgotten after result_ttl seconds.
+
+    With a store (a FileStore shared between workers), every status change
+    is also written there as job-<id>, so get() finds jobs submitted by any
+    worker. Results are then not kept in memory: on_result is expected to
+    put them somewhere shared, and get() returns records with result None.
+    """
+
+    STORE_PREFIX = 'job-'
+
+    def __init__(self, func, max_workers=None, max_pending=16, timeout=120, result_ttl=600, on_result=None,
+                 store=None):
+        self.func = func
+        self.max_workers = max_workers or pool_size()
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.result_ttl = result_ttl
+        self.on_result = on_result
+        self.store = store
+
+        self._executor = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def _get_executor(self):
+        # Created on first use so importing the app never forks
+        if self._executor is None:
+            self._executor = new_process_pool(self.max_workers)
+        return self._executor
+
+    def submit(self, *args, **metadata):
+        """Queue func(*args) and return the new job id"""
+        with self._lock:
+            self._purge_expired()
+            if self._pending_count() >= self.max_pending:
+                self.rejected += 1
+                raise QueueFullError(f"Conversion queue is full ({self.max_pending} pending jobs)")
+
+            job_id = uuid.uuid4().hex
+            job = dict(metadata)
+            job.update({
+                'id': job_id,
+                'status': 'queued',
+                'created': time.time(),
+                'started': None,
+                'finished': None,
+                'error': None,
+                'result': None,
+                'future': None,
+            })
+            self._jobs[job_id] = job
+            self.submitted += 1
+
+            try:
+                future = self._get_executor().submit(_run_job, self.func, self.timeout, args)
+            except Exception:
+                del self._jobs[job_id]
+                raise
+            job['future'] = future
+            self._publish(job)
+
+        future.add_done_callback(lambda f: self._finish(job_id, f))
+        return job_id
+
+    def add_completed(self, result, **metadata):
+        """Record an already available result (e.g. a cache hit) as a finished job"""
+        with self._lock:
+            self._purge_expired()
+            job_id = uuid.uuid4().hex
+            now = time.time()
+            job = dict(metadata)
+            job.update({
+                'id': job_id,
+                'status': 'done',
+                'created': now,
+                'started': now,
+                'finished': now,
+                'error': None,
+                'result': result if self.store is None else None,
+                'future': None,
+            })
+            self._jobs[job_id] = job
+            self._publish(job)
+            return job_id
+
+    def get(self, job_id):
+        """Return the job record for job_id, or None if unknown or expired"""
+        with self._lock:
+            self._purge_expired()
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._refresh_status(job)
+                return job
+        if self.store is None:
+            return None
+        # Submitted by another worker
+        record = self.store.get(self.STORE_PREFIX + job_id)
+        if record is None:
+            return None
+        if record['finished'] is not None and record['finished'] < time.time() - self.result_ttl:
+            return None
+        return dict(record, result=None, future=None)
+
+    def depth(self):
+        """Number of queued or running jobs"""
+        with self._lock:
+            return self._pending_count()
+
+    def stats(self):
+        """Return queue counters"""
+        with self._lock:
+            return {
+                'depth': self._pending_count(),
+                'max_pending': self.max_pending,
+                'workers': self.max_workers,
+                'tracked_jobs': len(self._jobs),
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+            }
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+    def _finish(self, job_id, future):
+        """Done callback: record the outcome of a job"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['finished'] is not None:
+                return
+        status, result, error = 'done', None, None
+        try:
+            result = future.result()
+        except JobTimeoutError:
+            status, error = 'timeout', f"Conversion exceeded {self.timeout} seconds"
+        except Exception as e:
+            status, error = 'failed', str(e) or e.__class__.__name__
+
+        # Stored before the job reads as done, so a download never misses the result
+        if status == 'done' and self.on_result is not None:
+            try:
+                self.on_result(job, result)
+            except Exception as e:
+                logging.warning(f"Job result callback failed for {job_id}: {e}")
+        elif status != 'done':
+            logging.error(f"Conversion job {job_id} {status}: {error}")
+
+        with self._lock:
+            if job['finished'] is not None:
+                return
+            job.update({'status': status, 'error': error, 'finished': time.time(),
+                        'result': result if self.store is None else None})
+            if status == 'done':
+                self.completed += 1
+            else:
+                self.failed += 1
+            self._publish(job)
+
+    def _refresh_status(self, job):
+        """Update queued/running state and enforce the deadline (lock held)"""
+        future = job['future']
+        if job['finished'] is not None or future is None:
+            return
+        if future.running() and job['status'] == 'queued':
+            job['status'] = 'running'
+            job['started'] = time.time()
+            self._publish(job)
+        # Backstop in case the worker never delivered its alarm
+        if self.timeout and job['started'] and time.time() - job['started'] > self.timeout + 5:
+            future.cancel()
+            job['status'] = 'timeout'
+            job['error'] = f"Conversion exceeded {self.timeout} seconds"
+            job['finished'] = time.time()
+            self.failed += 1
+            self._publish(job)
+
+    def _publish(self, job):
+        """Write the job's state, without the result or future, to the shared store (lock held)"""
+        if self.store is None:
+            return
+        try:
+            self.store.put(self.STORE_PREFIX + job['id'],
+                           {key: value for key, value in job.items() if key not in ('result', 'future')})
+        except Exception as e:
+            logging.warning(f"Could not store state of job {job['id']}: {e}")
+
+    def _pending_count(self):
+        return sum(1 for job in self._jobs.values() if job['finished'] is None)
+
+    def _purge_expired(self):
+        cutoff = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job['finished'] is not None and job['finished'] < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
@@ -0,0 +1,175 @@
+import time
+import threading
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = ((10 * 1024, '10k'), (100 * 1024, '100k'), (1024 * 1024, '1m'), (10 * 1024 * 1024, '10m'))
+
+
+def size_bucket(size):
+    """Label for a document size in bytes, for grouping timings by size"""
+    for limit, label in SIZE_BUCKETS:
+        if size <= limit:
+            return label
+    return 'larger'
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(f'{key}="{_escape(value)}"' for key, value in labels)
+    return f'{{{pairs}}}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label set, in Prometheus style"""
+
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._series = {}
+
+    def observe(self, value, labels=()):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                series['counts'][index] += 1
+                break
+        series['sum'] += value
+        series['count'] += 1
+
+    def lines(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        for labels, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series['counts']):
+                cumulative += count
+                yield f'{self.name}_bucket{_format_labels(labels + (("le", _format_value(float(bound))),))} {cumulative}'
+            yield f'{self.name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {series["count"]}'
+            yield f'{self.name}_sum{_format_labels(labels)} {series["sum"]!r}'
+            yield f'{self.name}_count{_format_labels(labels)} {series["count"]}'
+
+
+class Counter:
+    """Monotonic counter keyed by label set"""
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._series = {}
+
+    def inc(self, amount=1, labels=()):
+        self._series[labels] = self._series.get(labels, 0) + amount
+
+    def lines(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} counter'
+        for labels, value in sorted(self._series.items()):
+            yield f'{self.name}{_format_labels(labels)} {_format_value(value)}'
+
+
+class MetricsRegistry:
+    """Process-wide timing histograms, counters and scrape-time gauges.
+
+    Pipeline code calls timed(stage) around each step; the request
+    handler sets labels such as format and size once with bind(), and
+    every stage the thread times afterwards carries them. Gauges (storage
+    size, cache hit rates, queue depth) are read from collectors only
+    when /metrics is scraped.
+    """
+
+    def __init__(self, prefix='markdown_converter'):
+        self.prefix = prefix
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.histogram('stage_seconds', 'Time spent in each conversion pipeline stage')
+
+    def histogram(self, name, help, buckets=DEFAULT_BUCKETS):
+        return self._get(name, lambda full_name: Histogram(full_name, help, buckets))
+
+    def counter(self, name, help):
+        return self._get(name, lambda full_name: Counter(full_name, help))
+
+    def _get(self, name, factory):
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(name)
+                if metric is None:
+                    metric = self._metrics[name] = factory(f'{self.prefix}_{name}')
+        return metric
+
+    def observe(self, name, value, **labels):
+        histogram = self.histogram(name, name.replace('_', ' '))
+        with self._lock:
+            histogram.observe(value, tuple(sorted(labels.items())))
+
+    def inc(self, name, amount=1, **labels):
+        counter = self.counter(name, name.replace('_', ' '))
+        with self._lock:
+            counter.inc(amount, tuple(sorted(labels.items())))
+
+    def bind(self, **labels):
+        """Attach labels to every stage this thread times until reset_labels()"""
+        self._local.labels = {**getattr(self._local, 'labels', {}), **labels}
+
+    def reset_labels(self):
+        self._local.labels = {}
+
+    @contextmanager
+    def timed(self, stage, **labels):
+        """Record the duration of the block in the stage_seconds histogram"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            merged = {**getattr(self._local, 'labels', {}), **labels, 'stage': stage}
+            self.observe('stage_seconds', time.perf_counter() - start, **merged)
+
+    def add_collector(self, func):
+        """Register a gauge collector called at scrape time
+
+        func() yields (name, type, help, value) tuples, where value is a
+        number or a dict mapping label tuples like (('tier', 'disk'),) to numbers.
+        """
+        self._collectors.append(func)
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for name in sorted(self._metrics):
+                lines.extend(self._metrics[name].lines())
+        for collector in self._collectors:
+            for name, kind, help, value in collector():
+                full_name = f'{self.prefix}_{name}'
+                lines.append(f'# HELP {full_name} {help}')
+                lines.append(f'# TYPE {full_name} {kind}')
+                samples = value.items() if isinstance(value, dict) else [((), value)]
+                for labels, sample in samples:
+                    if sample is not None:
+                        lines.append(f'{full_name}{_format_labels(labels)} {_format_value(sample)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+timed = registry.timed
+bind = registry.bind
+reset_labels = registry.reset_labels
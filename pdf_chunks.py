@@ -0,0 +1,200 @@
+import io
+import logging
+import threading
+import importlib.util
+from lxml import html as lxml_html
+from jobs import _run_job, new_process_pool, pool_size, JobTimeoutError
+from metrics import timed
+
+# Chunks only ever start at a top-level section heading
+SPLIT_TAGS = {'h1', 'h2'}
+
+
+def pypdf_available():
+    """Whether pypdf, needed to merge chunk PDFs, can be imported (without importing it)"""
+    return importlib.util.find_spec('pypdf') is not None
+
+
+def split_html(html_content, chunk_bytes):
+    """Split an HTML fragment into chunks of roughly chunk_bytes
+
+    Chunks break only between top-level elements, just before an h1 or h2,
+    so no section, table or code block is ever cut in two. A section
+    larger than chunk_bytes stays whole.
+    """
+    chunks = []
+    current = []
+    size = 0
+    for part in lxml_html.fragments_fromstring(html_content or ''):
+        if isinstance(part, str):
+            text = part
+        else:
+            if part.tag in SPLIT_TAGS and size >= chunk_bytes:
+                chunks.append(''.join(current))
+                current, size = [], 0
+            text = lxml_html.tostring(part, encoding='unicode')
+        current.append(text)
+        size += len(text)
+    if current or not chunks:
+        chunks.append(''.join(current))
+    return chunks
+
+
+def toc_outline(toc_html):
+    """Turn the toc extension's nested <ul> into [(title, anchor, children)] entries"""
+    if not toc_html:
+        return []
+    root = lxml_html.fragment_fromstring(toc_html, create_parent='div')
+    top = root.find('.//ul')
+
+    def entries(ul):
+        items = []
+        for li in ul.iterchildren('li'):
+            link = li.find('a')
+            if link is None:
+                continue
+            nested = li.find('ul')
+            items.append((link.text_content().strip(), link.get('href', '').lstrip('#'),
+                          entries(nested) if nested is not None else []))
+        return items
+
+    return entries(top) if top is not None else []
+
+
+def render_chunk(html_chunk):
+    """Lay out one chunk in a worker process
+
+    Returns the chunk's PDF bytes, its page count and the page each
+    anchor (heading id) landed on.
+    """
+    from rendering import build_styled_html, pdf_context
+    document = pdf_context.render(build_styled_html(html_chunk, inline_styles=False))
+    anchors = {}
+    for number, page in enumerate(document.pages):
+        for name in getattr(page, 'anchors', {}):
+            anchors.setdefault(name, number)
+    return pdf_context.write_documents([document]), len(document.pages), anchors
+
+
+def merge_chunks(results, toc_html, target=None):
+    """Concatenate chunk PDFs and add bookmarks from the toc extension's output
+
+    results are render_chunk return values in document order. Each chunk's
+    own outline is dropped; the merged outline links every toc entry to
+    the page its heading landed on. Returns bytes, or writes into target.
+    """
+    from pypdf import PdfReader, PdfWriter
+    writer = PdfWriter()
+    anchor_pages = {}
+    offset = 0
+    for index, (data, page_count, anchors) in enumerate(results):
+        reader = PdfReader(io.BytesIO(data))
+        if index == 0 and reader.metadata:
+            writer.add_metadata(dict(reader.metadata))
+        writer.append(reader, import_outline=False)
+        for name, page in anchors.items():
+            anchor_pages.setdefault(name, offset + page)
+        offset += page_count
+
+    def add_entries(entries, parent=None):
+        for title, anchor, children in entries:
+            if anchor in anchor_pages:
+                item = writer.add_outline_item(title, anchor_pages[anchor], parent=parent)
+                add_entries(children, item)
+            else:
+                add_entries(children, parent)
+
+    add_entries(toc_outline(toc_html))
+    if target is None:
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        return buffer.getvalue()
+    writer.write(target)
+    return None
+
+
+class ChunkedPDFRenderer:
+    """Render very large documents as chunks laid out in parallel worker processes.
+
+    WeasyPrint's memory use grows faster than linearly with document size,
+    so the HTML is split at section boundaries and each worker only ever
+    lays out one chunk. The chunk PDFs are merged in order with pypdf,
+    pages numbered continuously and bookmarks rebuilt from the toc. Every
+    chunk starts on a new page, and links between chunks are not kept.
+    """
+
+    def __init__(self, max_workers=None, chunk_bytes=512 * 1024, timeout=120):
+        self.max_workers = max_workers or pool_size()
+        self.chunk_bytes = chunk_bytes
+        self.timeout = timeout
+        self._executor = None
+        self._available = None
+        self._lock = threading.Lock()
+
+        self.documents = 0
+        self.chunks = 0
+        self.failed = 0
+
+    def available(self):
+        if self._available is None:
+            self._available = pypdf_available()
+            if not self._available:
+                logging.warning("pypdf not installed; large PDFs are rendered in one piece")
+        return self._available
+
+    def _get_executor(self):
+        # Created on first use so importing the app never forks
+        with self._lock:
+            if self._executor is None:
+                self._executor = new_process_pool(self.max_workers)
+            return self._executor
+
+    def write_pdf(self, html_content, toc_html, target=None):
+        """Render an HTML fragment to one PDF via parallel chunks
+
+        Returns bytes, or writes into target (a path or binary file) if given.
+        """
+        with timed('pdf_split'):
+            chunks = split_html(html_content, self.chunk_bytes)
+        logging.debug(f"Rendering PDF in {len(chunks)} chunks on {self.max_workers} workers")
+        executor = self._get_executor()
+        futures = [executor.submit(_run_job, render_chunk, self.timeout, (chunk,)) for chunk in chunks]
+        try:
+            with timed('pdf_chunks'):
+                results = [future.result() for future in futures]
+        except JobTimeoutError:
+            self._record(len(chunks), failed=True)
+            raise RuntimeError(f"PDF chunk rendering exceeded {self.timeout} seconds")
+        except Exception:
+            self._record(len(chunks), failed=True)
+            raise
+        finally:
+            for future in futures:
+                future.cancel()
+        with timed('pdf_merge'):
+            data = merge_chunks(results, toc_html, target)
+        self._record(len(chunks))
+        return data
+
+    def _record(self, chunks, failed=False):
+        with self._lock:
+            self.documents += 1
+            self.chunks += chunks
+            if failed:
+                self.failed += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'available': self.available(),
+                'workers': self.max_workers,
+                'chunk_bytes': self.chunk_bytes,
+                'documents': self.documents,
+                'chunks': self.chunks,
+                'failed': self.failed,
+            }
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,135 @@
+import logging
+import threading
+from contextlib import contextmanager, nullcontext
+from metrics import timed
+
+# WeasyPrint and its Pango/Cairo bindings are imported on first use, so
+# processes that never render a PDF never load them
+HTML = CSS = FontConfiguration = None
+_import_error = None
+_import_lock = threading.Lock()
+
+
+def load_weasyprint():
+    """Import WeasyPrint once, returning True if it is usable"""
+    global HTML, CSS, FontConfiguration, _import_error
+    if HTML is not None:
+        return True
+    with _import_lock:
+        if HTML is None and _import_error is None:
+            try:
+                with timed('weasyprint_import'):
+                    from weasyprint import HTML as html_class, CSS as css_class
+                    from weasyprint.text.fonts import FontConfiguration as font_config_class
+                CSS, FontConfiguration = css_class, font_config_class
+                HTML = html_class
+            except (ImportError, OSError) as e:
+                # WeasyPrint raises OSError rather than ImportError when Pango/Cairo are missing
+                _import_error = str(e) or e.__class__.__name__
+                logging.warning(f"WeasyPrint not available: {_import_error}")
+    return HTML is not None
+
+
+def weasyprint_status():
+    """'loaded', 'unavailable' or 'not loaded', without triggering the import"""
+    if HTML is not None:
+        return 'loaded'
+    return 'unavailable' if _import_error is not None else 'not loaded'
+
+
+class PDFRenderContext:
+    """Process-wide WeasyPrint state shared by every PDF render.
+
+    The font configuration and the compiled stylesheet are built once and
+    reused, so individual renders no longer pay for fontconfig scanning or
+    re-parsing the CSS. Pango's font map is not safe for concurrent use, so
+    renders sharing one context are serialised.
+    """
+
+    def __init__(self, stylesheet, url_fetcher=None):
+        self.stylesheet = stylesheet
+        # Resolves images and stylesheets referenced by documents; WeasyPrint's default when None
+        self.url_fetcher = url_fetcher
+        self._weasyprint_fetcher = None
+        self.font_config = None
+        self.css = None
+        self._init_lock = threading.Lock()
+        self._render_lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self.css is not None
+
+    def warm(self):
+        """Build the font configuration and compiled stylesheet if not done yet"""
+        if self.css is not None:
+            return
+        if not load_weasyprint():
+            raise RuntimeError("WeasyPrint not available")
+
+        with self._init_lock:
+            if self.css is not None:
+                return
+            if self.url_fetcher is not None and hasattr(self.url_fetcher, 'for_weasyprint'):
+                # Adapt to the url_fetcher protocol of the installed WeasyPrint version
+                self._weasyprint_fetcher = self.url_fetcher.for_weasyprint()
+            with timed('pdf_warm'):
+                font_config = FontConfiguration()
+                css = CSS(string=self.stylesheet, font_config=font_config, **self._fetcher_args())
+            self.font_config = font_config
+            self.css = css
+            logging.info("PDF render context initialised")
+
+    def write_pdf(self, html_document, target=None):
+        """Render a standalone HTML document to PDF
+
+        Returns the PDF bytes, or writes them to target (a path or binary
+        file object) and returns None.
+        """
+        self.warm()
+        with self._locked():
+            # Layout and serialisation are timed separately; together they equal HTML.write_pdf
+            with self._fetch_scope(), timed('layout'):
+                document = HTML(string=html_document, **self._fetcher_args()).render(
+                    stylesheets=[self.css],
+                    font_config=self.font_config,
+                    optimize_images=False  # Disable image optimization for Vercel
+                )
+            with timed('write_pdf'):
+                return document.write_pdf(target, optimize_images=False)
+
+    def render(self, html_document):
+        """Lay out a standalone HTML document and return the paginated WeasyPrint Document"""
+        self.warm()
+        with self._locked(), self._fetch_scope(), timed('layout'):
+            return HTML(string=html_document, **self._fetcher_args()).render(
+                stylesheets=[self.css],
+                font_config=self.font_config,
+                optimize_images=False
+            )
+
+    def write_documents(self, documents, target=None):
+        """Write the pages of several laid-out documents as one PDF, with the first one's metadata"""
+        pages = [page for document in documents for page in document.pages]
+        with self._locked(), timed('write_pdf'):
+            return documents[0].copy(pages).write_pdf(target, optimize_images=False)
+
+    def _fetcher_args(self):
+        fetcher = self._weasyprint_fetcher or self.url_fetcher
+        return {'url_fetcher': fetcher} if fetcher is not None else {}
+
+    def _fetch_scope(self):
+        """The url_fetcher's per-document fetch limit, when it has one"""
+        if hasattr(self.url_fetcher, 'document'):
+            return self.url_fetcher.document()
+        return nullcontext()
+
+    @contextmanager
+    def _locked(self):
+        """Hold the render lock, recording how long renders queue for it"""
+        with timed('pdf_lock_wait'):
+            self._render_lock.acquire()
+        try:
+            yield
+        finally:
+            self._render_lock.release()
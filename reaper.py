@@ -0,0 +1,107 @@
+import os
+import time
+import heapq
+import logging
+import itertools
+import threading
+
+
+def remove_file(path):
+    """Delete a file, ignoring files that are already gone"""
+    try:
+        os.remove(path)
+        logging.info(f"Removed expired file: {path}")
+    except FileNotFoundError:
+        pass
+
+
+class ExpiryReaper:
+    """Background thread that runs expiry actions when their deadline passes.
+
+    Deadlines live in a min-heap, so scheduling is O(log n) and the thread
+    only wakes for the earliest one instead of rescanning everything.
+    Optional sweep callables (e.g. a store's purge_expired) run every
+    sweep_interval seconds to catch entries written by other processes.
+    """
+
+    def __init__(self, sweep_interval=300):
+        self.sweep_interval = sweep_interval
+        self._heap = []
+        self._counter = itertools.count()
+        self._sweeps = []
+        self._condition = threading.Condition()
+        self._thread = None
+        self._pid = None
+        self._next_sweep = 0
+        self.reaped = 0
+
+    def schedule(self, expires_at, action, *args):
+        """Run action(*args) once time.time() reaches expires_at"""
+        with self._condition:
+            heapq.heappush(self._heap, (expires_at, next(self._counter), action, args))
+            self._ensure_running()
+            self._condition.notify()
+
+    def add_sweep(self, func):
+        """Run func() periodically from the reaper thread"""
+        with self._condition:
+            self._sweeps.append(func)
+            self._ensure_running()
+
+    def pending(self):
+        with self._condition:
+            return len(self._heap)
+
+    def stats(self):
+        with self._condition:
+            return {
+                'pending': len(self._heap),
+                'reaped': self.reaped,
+                'next_expiry_in': round(self._heap[0][0] - time.time(), 1) if self._heap else None,
+            }
+
+    def _ensure_running(self):
+        # Threads do not survive fork, so restart in each worker process (condition held)
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='expiry-reaper', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            due = []
+            with self._condition:
+                now = time.time()
+                while self._heap and self._heap[0][0] <= now:
+                    due.append(heapq.heappop(self._heap))
+
+                run_sweeps = self._sweeps and now >= self._next_sweep
+                if run_sweeps:
+                    self._next_sweep = now + self.sweep_interval
+
+                if not due and not run_sweeps:
+                    wait = self._next_sweep - now if self._sweeps else None
+                    if self._heap:
+                        until_next = self._heap[0][0] - now
+                        wait = until_next if wait is None else min(wait, until_next)
+                    self._condition.wait(wait)
+                    continue
+                sweeps = list(self._sweeps) if run_sweeps else []
+
+            reaped = 0
+            for _, _, action, args in due:
+                try:
+                    action(*args)
+                    reaped += 1
+                except Exception as e:
+                    logging.error(f"Expiry action failed: {e}")
+            if reaped:
+                with self._condition:
+                    self.reaped += reaped
+
+            for sweep in sweeps:
+                try:
+                    sweep()
+                except Exception as e:
+                    logging.error(f"Expiry sweep failed: {e}")
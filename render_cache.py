@@ -0,0 +1,294 @@
+import os
+import time
+import shutil
+import logging
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+# Temp files this old were left by a worker that died mid-write
+STALE_TEMP_SECONDS = 3600
+
+
+class RenderCache:
+    """Content-addressed cache for converted PDF/DOCX documents.
+
+    Entries are kept in a byte-size-bounded LRU in memory, with an optional
+    on-disk tier that survives worker restarts and is shared between workers
+    pointing at the same directory. Every disk_rescan_interval seconds a
+    write re-reads the directory, so the disk budget also counts other
+    workers' files.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, disk_dir=None, disk_max_bytes=512 * 1024 * 1024,
+                 max_entry_bytes=None, disk_rescan_interval=60):
+        self.max_bytes = max_bytes
+        # Larger entries skip the memory tier and are served straight from disk
+        self.max_entry_bytes = min(max_entry_bytes or max_bytes, max_bytes)
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.disk_rescan_interval = disk_rescan_interval
+
+        self._entries = OrderedDict()
+        self._size = 0
+        self._disk_entries = OrderedDict()
+        self._disk_size = 0
+        self._last_scan = time.monotonic()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+        if self.disk_dir:
+            self._load_disk_index()
+
+    @staticmethod
+    def make_key(content, format, version):
+        """Build a cache key from markdown content, output format and renderer version"""
+        digest = hashlib.sha256()
+        digest.update(version.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(format.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(content.encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Return cached bytes for key, or None on a miss"""
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.memory_hits += 1
+                return data
+
+        data = self._read_disk(key)
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._store_memory(key, data)
+        return data
+
+    def open(self, key):
+        """Look up key without loading large disk entries into memory
+
+        Returns (data, path): bytes for entries small enough to keep in
+        memory, otherwise the path of the on-disk copy. Both are None on a miss.
+        """
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.memory_hits += 1
+                return data, None
+
+        if self.disk_dir:
+            # Stat rather than trusting the index: other workers share the directory
+            path = self._disk_path(key)
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                size = None
+            if size is not None and size > self.max_entry_bytes:
+                with self._lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                    if key in self._disk_entries:
+                        self._disk_entries.move_to_end(key)
+                return None, path
+
+        return self.get(key), None
+
+    def put_file(self, key, fileobj, size):
+        """Store size bytes read from fileobj, streaming large entries to disk
+
+        Returns the path of the on-disk copy, or None if the disk tier is
+        disabled or the entry was too large for it.
+        """
+        if size <= self.max_entry_bytes:
+            data = fileobj.read()
+            self.put(key, data)
+            return self._disk_path(key) if self.disk_dir and key in self._disk_entries else None
+
+        if not self.disk_dir or size > self.disk_max_bytes:
+            return None
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, prefix='.tmp-')
+            with os.fdopen(fd, 'wb') as f:
+                shutil.copyfileobj(fileobj, f)
+            os.replace(tmp_path, self._disk_path(key))
+        except Exception as e:
+            logging.warning(f"Render cache disk write failed for {key}: {e}")
+            self._remove_file(tmp_path)
+            return None
+        self._index_disk_entry(key, size)
+        return self._disk_path(key)
+
+    def put(self, key, data):
+        """Store rendered bytes under key"""
+        with self._lock:
+            self._store_memory(key, data)
+        self._write_disk(key, data)
+
+    def clear(self):
+        """Drop all in-memory entries (the disk tier is left untouched)"""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        """Return hit/miss/eviction counters and current sizes"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'disk_evictions': self.disk_evictions,
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'max_entry_bytes': self.max_entry_bytes,
+                'disk_entries': len(self._disk_entries),
+                'disk_bytes': self._disk_size,
+                'disk_max_bytes': self.disk_max_bytes if self.disk_dir else 0,
+            }
+
+    def _store_memory(self, key, data):
+        """Insert into the memory LRU and evict until under the byte budget (lock held)"""
+        size = len(data)
+        if size > self.max_entry_bytes:
+            return
+
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._size -= len(previous)
+
+        self._entries[key] = data
+        self._size += size
+
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+            self.evictions += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key)
+
+    def _load_disk_index(self):
+        """Index existing disk entries at startup"""
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._disk_entries = self._scan_disk()
+            self._disk_size = sum(self._disk_entries.values())
+        except Exception as e:
+            logging.warning(f"Render cache disk tier disabled: {e}")
+            self.disk_dir = None
+
+    def _scan_disk(self):
+        """Return {key: size} for every file in the disk tier, oldest first, removing stale temp files"""
+        found = []
+        stale = time.time() - STALE_TEMP_SECONDS
+        with os.scandir(self.disk_dir) as entries:
+            for entry in entries:
+                try:
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    # Evicted by another worker meanwhile
+                    continue
+                if entry.name.startswith('.tmp-'):
+                    if stat.st_mtime < stale:
+                        self._remove_file(entry.path)
+                elif not entry.name.startswith('.'):
+                    found.append((stat.st_mtime, entry.name, stat.st_size))
+        return OrderedDict((name, size) for _, name, size in sorted(found))
+
+    @staticmethod
+    def _remove_file(path):
+        if path is None:
+            return
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                if key in self._disk_entries:
+                    self._disk_size -= self._disk_entries.pop(key)
+            return None
+        except Exception as e:
+            logging.warning(f"Render cache disk read failed for {key}: {e}")
+            return None
+
+        with self._lock:
+            if key in self._disk_entries:
+                self._disk_entries.move_to_end(key)
+        return data
+
+    def _write_disk(self, key, data):
+        if not self.disk_dir or len(data) > self.disk_max_bytes:
+            return
+        tmp_path = None
+        try:
+            # Write atomically so concurrent workers never read a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, prefix='.tmp-')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._disk_path(key))
+        except Exception as e:
+            logging.warning(f"Render cache disk write failed for {key}: {e}")
+            self._remove_file(tmp_path)
+            return
+
+        self._index_disk_entry(key, len(data))
+
+    def _index_disk_entry(self, key, size):
+        """Record a disk entry and evict the oldest ones over budget"""
+        scanned = None
+        if time.monotonic() - self._last_scan >= self.disk_rescan_interval:
+            # Pick up (and count) files written by other workers since the last scan
+            try:
+                scanned = self._scan_disk()
+            except OSError as e:
+                logging.warning(f"Render cache disk scan failed: {e}")
+        expired = []
+        with self._lock:
+            if scanned is not None:
+                self._disk_entries = scanned
+                self._disk_size = sum(scanned.values())
+                self._last_scan = time.monotonic()
+            if key in self._disk_entries:
+                self._disk_size -= self._disk_entries.pop(key)
+            self._disk_entries[key] = size
+            self._disk_size += size
+            while self._disk_size > self.disk_max_bytes:
+                old_key, old_size = self._disk_entries.popitem(last=False)
+                self._disk_size -= old_size
+                self.disk_evictions += 1
+                expired.append(old_key)
+
+        for old_key in expired:
+            self._remove_file(self._disk_path(old_key))
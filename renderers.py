@@ -0,0 +1,206 @@
+import time
+import logging
+import importlib
+import threading
+from converter import convert_markdown, parse_document
+
+
+class UnsupportedFormat(ValueError):
+    """Raised for an output format no renderer is registered for"""
+
+
+class RendererUnavailable(Exception):
+    """Raised when an output format's dependencies cannot be imported"""
+
+
+class SourceDocument:
+    """A markdown document parsed at most once and shared by every output format
+
+    Pass the HTML, TOC and metadata already stored with an upload to skip
+    parsing entirely; anything missing is filled in by a single parse on
+    first use.
+    """
+
+    def __init__(self, md_content, html=None, toc=None, title=None, metadata=None):
+        self.md_content = md_content
+        self._html = html
+        self._toc = toc
+        self._metadata = metadata
+        self.title = title or 'Markdown Document'
+
+    @property
+    def html(self):
+        if self._html is None:
+            self._html = convert_markdown(self.md_content)
+        return self._html
+
+    @property
+    def toc(self):
+        if self._toc is None:
+            self._parse()
+        return self._toc
+
+    @property
+    def metadata(self):
+        if self._metadata is None:
+            self._parse()
+        return self._metadata
+
+    def _parse(self):
+        document = parse_document(self.md_content)
+        if self._html is None:
+            self._html = document['html']
+        if self._toc is None:
+            self._toc = document['toc']
+        if self._metadata is None:
+            self._metadata = document['metadata']
+
+
+class Renderer:
+    """One output format: its MIME type, the modules it needs and the function that builds it.
+
+    The render function takes a SourceDocument and returns bytes; it
+    imports its writer module itself. Required modules are imported the
+    first time the format is used, so processes that never produce a
+    format never pay for its dependencies.
+    """
+
+    def __init__(self, format, mimetype, func, requires=(), label=None):
+        self.format = format
+        self.mimetype = mimetype
+        self.func = func
+        self.requires = tuple(requires)
+        self.label = label or format.upper()
+        self.load_seconds = None
+        self._loaded = False
+        self._error = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Import the format's dependencies, raising RendererUnavailable if they are missing"""
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded and self._error is None:
+                    started = time.perf_counter()
+                    try:
+                        for module in self.requires:
+                            importlib.import_module(module)
+                        self._loaded = True
+                    except (ImportError, OSError) as e:
+                        # WeasyPrint raises OSError when its system libraries are missing
+                        self._error = f"{self.label} output is not available: {e}"
+                        logging.warning(self._error)
+                    self.load_seconds = time.perf_counter() - started
+                    logging.info(f"{self.label} backend import took {self.load_seconds * 1000:.0f}ms")
+            if not self._loaded:
+                raise RendererUnavailable(self._error)
+        return self.func
+
+    def status(self):
+        """'loaded', 'unavailable' or 'not loaded', without importing anything"""
+        if self._loaded:
+            return 'loaded'
+        return 'unavailable' if self._error is not None else 'not loaded'
+
+    def available(self):
+        try:
+            self.load()
+            return True
+        except RendererUnavailable:
+            return False
+
+    def render(self, document):
+        return self.load()(document)
+
+
+RENDERERS = {}
+
+
+def register(format, mimetype, requires=(), label=None):
+    """Decorator adding a render function to the registry as an output format"""
+    def decorator(func):
+        RENDERERS[format] = Renderer(format, mimetype, func, requires, label)
+        return func
+    return decorator
+
+
+def get_renderer(format):
+    renderer = RENDERERS.get(format)
+    if renderer is None:
+        raise UnsupportedFormat(f"Unsupported format: {format}")
+    return renderer
+
+
+def is_supported(format):
+    return format in RENDERERS
+
+
+def formats():
+    """Every registered format name, whether or not its dependencies are installed"""
+    return list(RENDERERS)
+
+
+def load_all(formats=None):
+    """Import the dependencies of every (or the named) format ahead of first use
+
+    Returns {format: seconds spent importing}; formats whose dependencies
+    are missing are logged and left out.
+    """
+    timings = {}
+    for format in formats or list(RENDERERS):
+        renderer = get_renderer(format)
+        if renderer.available():
+            timings[format] = renderer.load_seconds or 0.0
+    return timings
+
+
+def render(document, format):
+    """Render a SourceDocument to bytes in one format"""
+    return get_renderer(format).render(document)
+
+
+def render_many(document, formats):
+    """Render one document to several formats from a single parse
+
+    Returns (format, data, error) tuples in the order requested; one
+    format failing does not stop the others.
+    """
+    results = []
+    for format in formats:
+        try:
+            results.append((format, render(document, format), None))
+        except Exception as e:
+            logging.error(f"Rendering {format} failed: {e}")
+            results.append((format, None, str(e) or e.__class__.__name__))
+    return results
+
+
+@register('pdf', 'application/pdf', requires=['weasyprint'])
+def render_pdf(document):
+    from rendering import render_pdf
+    return render_pdf(document.html)
+
+
+@register('docx', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+          requires=['docx'], label='Word')
+def render_docx(document):
+    from rendering import render_docx
+    return render_docx(document.md_content, document.html)
+
+
+@register('html', 'text/html')
+def render_html(document):
+    from rendering import build_styled_html
+    return build_styled_html(document.html).encode('utf-8')
+
+
+@register('epub', 'application/epub+zip', requires=['lxml'], label='EPUB')
+def render_epub(document):
+    from epub_writer import build_epub
+    return build_epub(document.html, title=document.title, toc_html=document.toc)
+
+
+@register('txt', 'text/plain', requires=['lxml'], label='Plain text')
+def render_text(document):
+    from text_writer import html_to_text
+    return html_to_text(document.html).encode('utf-8')
@@ -0,0 +1,334 @@
+import os
+import hashlib
+import tempfile
+from converter import MARKDOWN_EXTENSIONS, convert_markdown
+from pdf_context import PDFRenderContext
+from assets import AssetFetcher
+from metrics import timed
+from renderers import SourceDocument, render
+
+# Stylesheet for PDF output, compiled once by pdf_context
+PDF_STYLESHEET = """
+    /* Inter comes from the host's fonts, never the network: the nix 'inter' package on Replit,
+       fonts-inter elsewhere (see replit.md). Without it the system sans-serif is used. */
+    @font-face {
+        font-family: 'Inter';
+        src: local('Inter'), local('Inter Regular'), local('Inter-Regular');
+    }
+
+    * {
+        margin: 0;
+        padding: 0;
+        box-sizing: border-box;
+    }
+
+    body {
+        font-family: 'Inter', -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
+        line-height: 1.7;
+        color: #1a202c;
+        max-width: 800px;
+        margin: 0 auto;
+        padding: 40px 20px;
+        background-color: white;
+        font-size: 16px;
+    }
+
+    h1, h2, h3, h4, h5, h6 {
+        color: #2d3748;
+        margin-top: 40px;
+        margin-bottom: 20px;
+        page-break-after: avoid;
+        font-weight: 600;
+        line-height: 1.3;
+    }
+
+    h1 {
+        font-size: 2.5rem;
+        border-bottom: 3px solid #667eea;
+        padding-bottom: 15px;
+        margin-top: 0;
+        margin-bottom: 30px;
+        color: #1a202c;
+    }
+
+    h2 {
+        font-size: 2rem;
+        border-bottom: 2px solid #e2e8f0;
+        padding-bottom: 10px;
+        margin-top: 35px;
+        color: #2d3748;
+    }
+
+    h3 {
+        font-size: 1.5rem;
+        color: #4a5568;
+        margin-top: 30px;
+    }
+
+    h4 {
+        font-size: 1.25rem;
+        color: #4a5568;
+        margin-top: 25px;
+    }
+
+    p {
+        margin-bottom: 1.5rem;
+        text-align: justify;
+        color: #2d3748;
+    }
+
+    code {
+        background-color: #f7fafc;
+        color: #e53e3e;
+        padding: 4px 8px;
+        border-radius: 6px;
+        font-family: 'Monaco', 'Courier New', 'Fira Code', monospace;
+        font-size: 0.9em;
+        border: 1px solid #e2e8f0;
+    }
+
+    pre {
+        background-color: #f7fafc;
+        border: 1px solid #e2e8f0;
+        border-radius: 8px;
+        padding: 20px;
+        overflow-x: auto;
+        margin: 25px 0;
+        box-shadow: 0 2px 8px rgba(0,0,0,0.1);
+    }
+
+    pre code {
+        background-color: transparent;
+        padding: 0;
+        color: #2d3748;
+        border: none;
+        font-size: 0.95em;
+        line-height: 1.6;
+    }
+
+    blockquote {
+        border-left: 4px solid #667eea;
+        margin: 25px 0;
+        padding: 15px 25px;
+        color: #4a5568;
+        font-style: italic;
+        background-color: #f7fafc;
+        border-radius: 0 8px 8px 0;
+        box-shadow: 0 2px 4px rgba(0,0,0,0.05);
+    }
+
+    table {
+        border-collapse: collapse;
+        width: 100%;
+        margin: 25px 0;
+        font-size: 0.95rem;
+        box-shadow: 0 4px 12px rgba(0,0,0,0.1);
+        border-radius: 8px;
+        overflow: hidden;
+    }
+
+    table th, table td {
+        border: 1px solid #e2e8f0;
+        padding: 15px;
+        text-align: left;
+    }
+
+    table th {
+        background-color: #667eea;
+        color: white;
+        font-weight: 600;
+        text-transform: uppercase;
+        font-size: 0.85rem;
+        letter-spacing: 0.5px;
+    }
+
+    table tr:nth-child(even) {
+        background-color: #f7fafc;
+    }
+
+    table tr:hover {
+        background-color: #edf2f7;
+    }
+
+    ul, ol {
+        margin-bottom: 1.5rem;
+        padding-left: 2.5rem;
+        color: #2d3748;
+    }
+
+    li {
+        margin-bottom: 0.75rem;
+        line-height: 1.6;
+    }
+
+    a {
+        color: #667eea;
+        text-decoration: none;
+        border-bottom: 1px solid transparent;
+        transition: border-bottom 0.2s ease;
+    }
+
+    a:hover {
+        border-bottom: 1px solid #667eea;
+    }
+
+    img {
+        max-width: 100%;
+        height: auto;
+        border-radius: 8px;
+        margin: 15px 0;
+        box-shadow: 0 4px 12px rgba(0,0,0,0.1);
+    }
+
+    hr {
+        border: none;
+        border-top: 2px solid #e2e8f0;
+        margin: 40px 0;
+        height: 1px;
+    }
+
+    /* Print styles for excellent PDF output */
+    @media print {
+        body {
+            margin: 0;
+            padding: 30px;
+            font-size: 12pt;
+            line-height: 1.6;
+        }
+
+        h1, h2, h3, h4, h5, h6 {
+            page-break-after: avoid;
+            margin-top: 20pt;
+            margin-bottom: 10pt;
+        }
+
+        h1 {
+            font-size: 24pt;
+            margin-top: 0;
+        }
+
+        h2 {
+            font-size: 18pt;
+        }
+
+        h3 {
+            font-size: 14pt;
+        }
+
+        pre, blockquote, table {
+            page-break-inside: avoid;
+            margin: 15pt 0;
+        }
+
+        p {
+            margin-bottom: 12pt;
+            text-align: justify;
+        }
+
+        a {
+            color: #000;
+            text-decoration: underline;
+        }
+
+        code {
+            font-size: 10pt;
+        }
+
+        pre {
+            font-size: 10pt;
+            padding: 15pt;
+        }
+
+        table {
+            font-size: 10pt;
+        }
+
+        table th, table td {
+            padding: 8pt;
+        }
+
+        ul, ol {
+            margin-bottom: 12pt;
+        }
+
+        li {
+            margin-bottom: 6pt;
+        }
+    }
+"""
+
+# Bump when the PDF/DOCX conversion code changes so cached renders are invalidated
+RENDERER_REVISION = '3'
+RENDER_VERSION = hashlib.sha256(
+    f"{RENDERER_REVISION}|{','.join(MARKDOWN_EXTENSIONS)}|{PDF_STYLESHEET}".encode('utf-8')
+).hexdigest()[:16]
+
+# Images referenced by documents: fetched with a timeout and size cap, cached on disk for every
+# worker, and never fetched at all with ASSET_LOCAL_ONLY=1 (air-gapped deployments). Only public
+# hosts are contacted unless ASSET_ALLOW_PRIVATE=1 (intranet images behind a trusted upload form)
+asset_fetcher = AssetFetcher(
+    cache_dir=os.path.join(tempfile.gettempdir(), 'asset_cache') if os.environ.get('ASSET_CACHE_DISK', '1') == '1' else None,
+    timeout=float(os.environ.get('ASSET_FETCH_TIMEOUT', 5)),
+    max_bytes=int(os.environ.get('ASSET_MAX_BYTES', 10 * 1024 * 1024)),
+    local_only=os.environ.get('ASSET_LOCAL_ONLY', '0') == '1',
+    max_workers=int(os.environ.get('ASSET_FETCH_WORKERS', 8)),
+    cache_disk_max_bytes=int(os.environ.get('ASSET_CACHE_DISK_MAX_BYTES', 256 * 1024 * 1024)),
+    max_per_document=int(os.environ.get('ASSET_MAX_PER_DOCUMENT', 50)),
+    allow_private=os.environ.get('ASSET_ALLOW_PRIVATE', '0') == '1'
+)
+
+# Shared WeasyPrint fonts and compiled stylesheet, reused by every PDF render
+pdf_context = PDFRenderContext(PDF_STYLESHEET, url_fetcher=asset_fetcher)
+
+def markdown_to_html(md_content):
+    """Convert markdown to an HTML fragment"""
+    return convert_markdown(md_content)
+
+def build_styled_html(html_content, inline_styles=True):
+    """Wrap converted markdown in a standalone HTML document for PDF conversion
+
+    PDF renders pass inline_styles=False and apply the pre-compiled
+    stylesheet from pdf_context instead of re-parsing it every time.
+    """
+    style_block = f"<style>{PDF_STYLESHEET}</style>" if inline_styles else ""
+    return f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <title>Markdown Document</title>
+        {style_block}
+    </head>
+    <body>
+        {html_content}
+    </body>
+    </html>
+    """
+
+def render_pdf(html_content, target=None):
+    """Render converted markdown to PDF using the shared WeasyPrint context
+
+    Returns bytes, or writes into target (a path or binary file) if given.
+    """
+    with timed('styled_html'):
+        html_document = build_styled_html(html_content, inline_styles=False)
+    return pdf_context.write_pdf(html_document, target)
+
+def render_docx(md_content, html_content=None):
+    """Convert markdown (or its already-converted HTML) to DOCX bytes"""
+    # python-docx is only loaded by processes that actually build documents
+    from docx_writer import html_to_docx, docx_bytes
+    if html_content is None:
+        html_content = markdown_to_html(md_content)
+    with timed('docx_build'):
+        doc = html_to_docx(html_content)
+    with timed('docx_save'):
+        return docx_bytes(doc)
+
+def render_document(md_content, format, html_content=None, toc=None, metadata=None, title=None):
+    """Convert markdown to bytes in any format in the renderers registry
+
+    Used by background conversion jobs, batches and the CLI. Pass the
+    upload's stored html_content, toc and metadata when known to skip re-parsing.
+    """
+    return render(SourceDocument(md_content, html_content, toc, title=title, metadata=metadata), format)
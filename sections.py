@@ -0,0 +1,232 @@
+import re
+import json
+import threading
+from lxml import etree
+from markdown.extensions.toc import unique
+from converter import convert_markdown
+from render_cache import RenderCache
+from rendering import RENDER_VERSION
+from pdf_chunks import render_chunk, merge_chunks, pypdf_available
+from metrics import timed
+
+HEADING_RE = re.compile(r'(#{1,6})[ \t]')
+FENCE_RE = re.compile(r'[ \t]{0,3}(`{3,}|~{3,})')
+REFERENCE_DEF_RE = re.compile(r'[ \t]{0,3}\[[^\]^][^\]]*\]:[ \t]*\S')
+# Footnotes and abbreviations are numbered/applied across the whole document
+GLOBAL_DEF_RE = re.compile(r'^[ \t]{0,3}(\[\^[^\]]+\]:|\*\[[^\]]+\]:)', re.M)
+HEADING_ID_RE = re.compile(r'(<h[1-6]\b[^>]*?\sid=")([^"]*)"')
+
+
+def split_sections(md_content, max_level=2):
+    """Split markdown into sections that each start at a heading of level <= max_level
+
+    Headings inside fenced code are ignored. Link reference definitions
+    apply document-wide, so they are repeated at the end of every section;
+    documents with footnotes or abbreviations are returned whole.
+    """
+    if GLOBAL_DEF_RE.search(md_content):
+        return [md_content]
+
+    sections = []
+    current = []
+    references = []
+    fence = None
+    for line in md_content.splitlines(keepends=True):
+        match = FENCE_RE.match(line)
+        if fence is not None:
+            if match and match.group(1)[0] == fence[0] and len(match.group(1)) >= len(fence):
+                fence = None
+        elif match:
+            fence = match.group(1)
+        else:
+            heading = HEADING_RE.match(line)
+            if heading and len(heading.group(1)) <= max_level and current:
+                sections.append(''.join(current))
+                current = []
+            elif REFERENCE_DEF_RE.match(line):
+                references.append(line.rstrip('\n') + '\n')
+        current.append(line)
+    if current:
+        sections.append(''.join(current))
+
+    if references and len(sections) > 1:
+        definitions = ''.join(references)
+        sections = [f"{section.rstrip()}\n\n{definitions}" for section in sections]
+    return sections
+
+
+def unique_heading_ids(fragments):
+    """Renumber heading ids across separately converted HTML fragments
+
+    The toc extension only de-duplicates ids within one conversion, so two
+    sections with an "Intro" heading would both get id="intro". Renumbering
+    in document order with the toc extension's own rule gives the ids (and
+    so the anchors the document's toc links to) of a whole-document render.
+    """
+    seen = set()
+    return [HEADING_ID_RE.sub(lambda m: f'{m.group(1)}{unique(m.group(2), seen)}"', fragment)
+            for fragment in fragments]
+
+
+def render_fragment(doc, html_content):
+    """Append HTML to doc and return the added body XML as a cacheable fragment
+
+    Relationship ids are only meaningful inside one document, so hyperlink
+    targets are recorded by URL and re-related when the fragment is reused.
+    """
+    from docx.oxml.ns import qn
+    from docx_writer import html_to_docx
+    body = doc.element.body
+    # New content is inserted before the trailing sectPr, after the current last element
+    anchor = body[-1] if len(body) else None
+    if anchor is not None and anchor.tag == qn('w:sectPr'):
+        anchor = anchor.getprevious()
+    html_to_docx(html_content, doc)
+    following = anchor.itersiblings() if anchor is not None else iter(body)
+    added = [element for element in following if element.tag != qn('w:sectPr')]
+
+    links = {}
+    for element in added:
+        for link in element.iter(qn('w:hyperlink')):
+            rel_id = link.get(qn('r:id'))
+            if rel_id:
+                links[rel_id] = doc.part.rels[rel_id].target_ref
+    return {'xml': [etree.tostring(element, encoding='unicode') for element in added], 'links': links}
+
+
+def append_fragment(doc, fragment):
+    """Append a cached render_fragment to the end of a Document's body"""
+    from docx.oxml import parse_xml
+    from docx.oxml.ns import qn
+    from docx.opc.constants import RELATIONSHIP_TYPE
+    body = doc.element.body
+    sect_pr = body.find(qn('w:sectPr'))
+    rel_ids = {old_id: doc.part.relate_to(url, RELATIONSHIP_TYPE.HYPERLINK, is_external=True)
+               for old_id, url in fragment['links'].items()}
+    for xml in fragment['xml']:
+        element = parse_xml(xml)
+        for link in element.iter(qn('w:hyperlink')):
+            rel_id = link.get(qn('r:id'))
+            if rel_id in rel_ids:
+                link.set(qn('r:id'), rel_ids[rel_id])
+        if sect_pr is not None:
+            sect_pr.addprevious(element)
+        else:
+            body.append(element)
+
+
+class IncrementalRenderer:
+    """Render large documents section by section, reusing unchanged sections.
+
+    Section HTML and DOCX fragments are cached by content hash in a
+    RenderCache, so its disk tier shares them between workers. PDFs are
+    rendered per top-level chapter and each chapter's PDF bytes cached the
+    same way, within the cache's byte budget, then merged with pypdf. Each
+    chapter starts on a new page in incremental PDFs.
+    """
+
+    def __init__(self, cache, max_level=2):
+        self.cache = cache
+        self.max_level = max_level
+        self._lock = threading.Lock()
+
+        self.html_hits = 0
+        self.html_misses = 0
+        self.docx_hits = 0
+        self.docx_misses = 0
+        self.chapter_hits = 0
+        self.chapter_misses = 0
+
+    def html(self, md_content):
+        """Return the document's HTML, converting only sections not seen before"""
+        return '\n'.join(unique_heading_ids(self._sections_html(md_content)))
+
+    def _sections_html(self, md_content):
+        return [self._section_html(section) for section in split_sections(md_content, self.max_level)]
+
+    def docx(self, md_content):
+        """Return DOCX bytes stitched from cached per-section fragments"""
+        from docx_writer import docx_bytes
+        with timed('docx_build'):
+            doc = self._build_docx(md_content)
+        with timed('docx_save'):
+            return docx_bytes(doc)
+
+    def _build_docx(self, md_content):
+        from docx_writer import new_document
+        doc = new_document()
+        sections = split_sections(md_content, self.max_level)
+        fragments = unique_heading_ids(self._section_html(section) for section in sections)
+        for section, html_content in zip(sections, fragments):
+            key = RenderCache.make_key(html_content, 'section-docx', RENDER_VERSION)
+            cached = self.cache.get(key)
+            with self._lock:
+                if cached is not None:
+                    self.docx_hits += 1
+                else:
+                    self.docx_misses += 1
+            if cached is not None:
+                append_fragment(doc, json.loads(cached))
+            else:
+                fragment = render_fragment(doc, html_content)
+                self.cache.put(key, json.dumps(fragment).encode('utf-8'))
+        return doc
+
+    @staticmethod
+    def pdf_available():
+        """Incremental PDFs need pypdf to merge the chapters"""
+        return pypdf_available()
+
+    def write_pdf(self, md_content, target=None, toc_html=None):
+        """Render a PDF, laying out only the chapters that changed
+
+        Bookmarks are built from toc_html, the document's toc. Returns
+        bytes, or writes into target (a path or binary file) if given.
+        """
+        chapters = unique_heading_ids('\n'.join(self._sections_html(chapter))
+                                      for chapter in split_sections(md_content, max_level=1))
+        results = [self._pdf_chapter(html_content) for html_content in chapters]
+        with timed('pdf_merge'):
+            return merge_chunks(results, toc_html, target)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'html_hits': self.html_hits,
+                'html_misses': self.html_misses,
+                'docx_hits': self.docx_hits,
+                'docx_misses': self.docx_misses,
+                'chapter_hits': self.chapter_hits,
+                'chapter_misses': self.chapter_misses,
+            }
+
+    def _section_html(self, section):
+        key = RenderCache.make_key(section, 'section-html', RENDER_VERSION)
+        cached = self.cache.get(key)
+        with self._lock:
+            if cached is not None:
+                self.html_hits += 1
+            else:
+                self.html_misses += 1
+        if cached is not None:
+            return cached.decode('utf-8')
+        html_content = convert_markdown(section)
+        self.cache.put(key, html_content.encode('utf-8'))
+        return html_content
+
+    def _pdf_chapter(self, html_content):
+        """Return render_chunk's (pdf bytes, page count, anchor pages) for one chapter"""
+        key = RenderCache.make_key(html_content, 'chapter-pdf', RENDER_VERSION)
+        cached = self.cache.get(key)
+        with self._lock:
+            if cached is not None:
+                self.chapter_hits += 1
+            else:
+                self.chapter_misses += 1
+        if cached is not None:
+            header, _, data = cached.partition(b'\n')
+            header = json.loads(header)
+            return data, header['pages'], header['anchors']
+        data, pages, anchors = render_chunk(html_content)
+        self.cache.put(key, json.dumps({'pages': pages, 'anchors': anchors}).encode('utf-8') + b'\n' + data)
+        return data, pages, anchors
@@ -63,6 +63,9 @@ document.addEventListener('DOMContentLoaded', function() {
                 currentFilename = data.filename;
                 showPreview(data.preview_html, data.original_filename);
                 showNotification('File uploaded successfully!', 'success');
+                if (data.preview_url) {
+                    loadHighlightedPreview(data.preview_url, data.filename);
+                }
             } else {
                 showNotification(data.error || 'Upload failed', 'error');
                 resetUploadArea();
@@ -91,6 +94,18 @@ document.addEventListener('DOMContentLoaded', function() {
         previewSection.scrollIntoView({ behavior: 'smooth' });
     }
 
+    // Swap in the syntax-highlighted preview once the server has rendered it
+    function loadHighlightedPreview(url, filename) {
+        fetch(url)
+        .then(response => response.ok ? response.text() : null)
+        .then(html => {
+            if (html && currentFilename === filename) {
+                previewContent.innerHTML = html;
+            }
+        })
+        .catch(error => console.error('Preview error:', error));
+    }
+
     // Reset upload area
     function resetUploadArea() {
         uploadArea.innerHTML = `
@@ -107,92 +122,64 @@ document.addEventListener('DOMContentLoaded', function() {
         `;
     }
 
-    // Download PDF
-    downloadPdfBtn.addEventListener('click', function() {
+    // Download converted file as raw binary (no base64 round trip)
+    function downloadConverted(format, button, busyLabel, idleLabel, successMessage) {
         if (!currentFilename) return;
         
-        downloadPdfBtn.disabled = true;
-        downloadPdfBtn.textContent = 'Generating PDF...';
+        button.disabled = true;
+        button.textContent = busyLabel;
         
-        fetch(`/download/pdf/${currentFilename}`)
-        .then(response => response.json())
-        .then(data => {
-            if (data.success) {
-                // Convert base64 to blob and download
-                const byteCharacters = atob(data.data);
-                const byteNumbers = new Array(byteCharacters.length);
-                for (let i = 0; i < byteCharacters.length; i++) {
-                    byteNumbers[i] = byteCharacters.charCodeAt(i);
-                }
-                const byteArray = new Uint8Array(byteNumbers);
-                const blob = new Blob([byteArray], { type: 'application/pdf' });
-                
-                const url = window.URL.createObjectURL(blob);
-                const a = document.createElement('a');
-                a.href = url;
-                a.download = data.filename;
-                document.body.appendChild(a);
-                a.click();
-                window.URL.revokeObjectURL(url);
-                document.body.removeChild(a);
-                
-                showNotification('PDF downloaded successfully!', 'success');
+        fetch(`/download/${format}/${currentFilename}?mode=binary`)
+        .then(response => {
+            const contentType = response.headers.get('Content-Type') || '';
+            if (!response.ok || contentType.includes('application/json')) {
+                return response.json().then(data => {
+                    throw new Error(data.error || 'Conversion failed');
+                });
+            }
+            
+            // Use the server-provided filename, e.g. an .html fallback for PDFs
+            const disposition = response.headers.get('Content-Disposition') || '';
+            const match = disposition.match(/filename="?([^";]+)"?/);
+            const filename = match ? match[1] : `document.${format}`;
+            // Set when the server could not produce the requested format and sent HTML instead
+            const fallback = response.headers.get('X-Fallback-Reason');
+            return response.blob().then(blob => ({ blob, filename, fallback }));
+        })
+        .then(({ blob, filename, fallback }) => {
+            const url = window.URL.createObjectURL(blob);
+            const a = document.createElement('a');
+            a.href = url;
+            a.download = filename;
+            document.body.appendChild(a);
+            a.click();
+            window.URL.revokeObjectURL(url);
+            document.body.removeChild(a);
+            
+            if (fallback) {
+                showNotification(`${fallback}. Downloaded a printable HTML version instead.`, 'info');
             } else {
-                showNotification(data.error || 'PDF generation failed', 'error');
+                showNotification(successMessage, 'success');
             }
         })
         .catch(error => {
             console.error('Error:', error);
-            showNotification('PDF generation failed. Please try again.', 'error');
+            showNotification(error.message || 'Conversion failed. Please try again.', 'error');
         })
         .finally(() => {
-            downloadPdfBtn.disabled = false;
-            downloadPdfBtn.textContent = 'Download PDF';
+            button.disabled = false;
+            button.textContent = idleLabel;
         });
+    }
+
+    // Download PDF
+    downloadPdfBtn.addEventListener('click', function() {
+        downloadConverted('pdf', downloadPdfBtn, 'Generating PDF...', 'Download PDF', 'PDF downloaded successfully!');
     });
 
     // Download Word
     downloadWordBtn.addEventListener('click', function() {
-        if (!currentFilename) return;
-        
-        downloadWordBtn.disabled = true;
-        downloadWordBtn.textContent = 'Generating Word...';
-        
-        fetch(`/download/docx/${currentFilename}`)
-        .then(response => response.json())
-        .then(data => {
-            if (data.success) {
-                // Convert base64 to blob and download
-                const byteCharacters = atob(data.data);
-                const byteNumbers = new Array(byteCharacters.length);
-                for (let i = 0; i < byteCharacters.length; i++) {
-                    byteNumbers[i] = byteCharacters.charCodeAt(i);
-                }
-                const byteArray = new Uint8Array(byteNumbers);
-                const blob = new Blob([byteArray], { type: 'application/vnd.openxmlformats-officedocument.wordprocessingml.document' });
-                
-                const url = window.URL.createObjectURL(blob);
-                const a = document.createElement('a');
-                a.href = url;
-                a.download = data.filename;
-                document.body.appendChild(a);
-                a.click();
-                window.URL.revokeObjectURL(url);
-                document.body.removeChild(a);
-                
-                showNotification('Word document downloaded successfully!', 'success');
-            } else {
-                showNotification(data.error || 'Word generation failed', 'error');
-            }
-        })
-        .catch(error => {
-            console.error('Error:', error);
-            showNotification('Word generation failed. Please try again.', 'error');
-        })
-        .finally(() => {
-            downloadWordBtn.disabled = false;
-            downloadWordBtn.textContent = 'Download Word';
-        });
+        downloadConverted('docx', downloadWordBtn, 'Generating Word...', 'Download Word', 'Word document downloaded successfully!');
     });
 
     // Notification system
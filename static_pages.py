@@ -0,0 +1,130 @@
+import gzip
+import hashlib
+import logging
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+
+def accepted_encodings(accept_encoding):
+    """Parse an Accept-Encoding header into {encoding: q}; q=0 means the client refuses it"""
+    accepted = {}
+    for item in accept_encoding.split(','):
+        encoding, _, params = item.partition(';')
+        encoding = encoding.strip().lower()
+        if not encoding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[encoding] = q
+    return accepted
+
+
+def accepts_encoding(accepted, encoding):
+    """Whether the parsed header allows encoding, directly or through *"""
+    return accepted.get(encoding, accepted.get('*', 0.0)) > 0
+
+
+class StaticPage:
+    """One page held in memory with its compressed variants and ETag"""
+
+    def __init__(self, body, mimetype='text/html; charset=utf-8'):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.mimetype = mimetype
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        # Compressed once at load time, so the best levels cost nothing per request
+        self.variants = {'identity': body, 'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+        if BROTLI_AVAILABLE:
+            self.variants['br'] = brotli.compress(body, quality=11)
+
+    def choose_encoding(self, accept_encoding):
+        accepted = accepted_encodings(accept_encoding)
+        for encoding in ('br', 'gzip'):
+            if encoding in self.variants and accepts_encoding(accepted, encoding):
+                return encoding
+        return 'identity'
+
+
+class StaticPages:
+    """Pages loaded once and served from memory with gzip/brotli and conditional requests.
+
+    Each encoding gets its own strong ETag (the content hash plus a suffix).
+    If-None-Match is compared on the content hash alone, so a client
+    revalidating any variant of an unchanged page gets a 304 with no body.
+    """
+
+    def __init__(self, max_age=3600):
+        self.max_age = max_age
+        self._pages = {}
+        self.hits = 0
+        self.not_modified = 0
+
+    def add(self, name, body, mimetype='text/html; charset=utf-8'):
+        self._pages[name] = StaticPage(body, mimetype)
+
+    def load(self, name, path, mimetype='text/html; charset=utf-8'):
+        """Read a file into the page set; returns False if it could not be read"""
+        try:
+            with open(path, 'rb') as f:
+                self.add(name, f.read(), mimetype)
+            return True
+        except OSError as e:
+            logging.error(f"Could not load static page {path}: {e}")
+            return False
+
+    def __contains__(self, name):
+        return name in self._pages
+
+    def respond(self, name, if_none_match='', accept_encoding='', status=200):
+        """Return a (body, status, headers) tuple for a page, or None if it is not loaded"""
+        page = self._pages.get(name)
+        if page is None:
+            return None
+        self.hits += 1
+        encoding = page.choose_encoding(accept_encoding)
+        etag = page.etag if encoding == 'identity' else f'{page.etag}-{encoding}'
+        headers = {
+            'ETag': f'"{etag}"',
+            'Vary': 'Accept-Encoding',
+            'Cache-Control': f'public, max-age={self.max_age}',
+        }
+        if status == 200 and self._matches(page, if_none_match):
+            self.not_modified += 1
+            return b'', 304, headers
+
+        body = page.variants[encoding]
+        headers['Content-Type'] = page.mimetype
+        headers['Content-Length'] = str(len(body))
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return body, status, headers
+
+    @staticmethod
+    def _matches(page, if_none_match):
+        for tag in if_none_match.split(','):
+            tag = tag.strip()
+            if tag == '*':
+                return True
+            tag = tag.removeprefix('W/').strip('"')
+            if tag.split('-', 1)[0] == page.etag:
+                return True
+        return False
+
+    def stats(self):
+        return {
+            'pages': len(self._pages),
+            'bytes': sum(len(variant) for page in self._pages.values() for variant in page.variants.values()),
+            'hits': self.hits,
+            'not_modified': self.not_modified,
+            'brotli': BROTLI_AVAILABLE,
+        }
@@ -0,0 +1,572 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+
+def record_size(record):
+    """Approximate the memory footprint of an upload record by its content and HTML size"""
+    return sum(len((record.get(field) or '').encode('utf-8')) for field in ('content', 'html', 'preview_html', 'toc'))
+
+
+class FileLock:
+    """Exclusive lock shared by the threads of this process and by other processes
+
+    Other processes are excluded with flock() on path. The file is opened on
+    every acquire, so workers forked after the lock was created do not share
+    (and so bypass) one open file. Without fcntl only threads are excluded.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._fd = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        if FCNTL_AVAILABLE:
+            try:
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except BaseException:
+                self._release()
+                raise
+        return self
+
+    def __exit__(self, *exc_info):
+        self._release()
+
+    def _release(self):
+        if self._fd is not None:
+            # Closing the file drops the flock
+            os.close(self._fd)
+            self._fd = None
+        self._lock.release()
+
+
+class FileStore:
+    """Dict-like store for uploaded markdown records with expiry.
+
+    Records are JSON-serialisable dicts. Every backend supports
+    ``key in store``, ``store[key]``, ``store.get(key)``, assignment,
+    deletion and ``len(store)``; expired records behave as missing. They
+    are only removed by purge_expired(), so until then
+    ``get(key, include_expired=True)`` still returns them.
+    """
+
+    def __init__(self, ttl=3600):
+        self.ttl = ttl
+        self._transaction_lock = threading.Lock()
+
+    def transaction(self):
+        """Lock held across a read-modify-write of records, by every user of the same storage
+
+        Per process for memory stores; disk and SQLite stores, which
+        workers share, lock across processes.
+        """
+        return self._transaction_lock
+
+    def get(self, key, default=None, include_expired=False):
+        raise NotImplementedError
+
+    def put(self, key, record):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def purge_expired(self):
+        """Remove expired records and return how many were dropped"""
+        raise NotImplementedError
+
+    def expired_keys(self):
+        """Keys of the expired records the next purge_expired() would drop"""
+        raise NotImplementedError
+
+    def find_document(self, content_hash):
+        """Return a stored document with this content hash; only DedupStore shares documents"""
+        return None
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def stats(self):
+        return {'backend': self.backend, 'entries': len(self), 'ttl': self.ttl}
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __getitem__(self, key):
+        record = self.get(key)
+        if record is None:
+            raise KeyError(key)
+        return record
+
+    def __setitem__(self, key, record):
+        self.put(key, record)
+
+    def __delitem__(self, key):
+        self.delete(key)
+
+
+class MemoryStore(FileStore):
+    """Per-process store bounded by total content bytes, evicting least recently used"""
+
+    backend = 'memory'
+
+    def __init__(self, ttl=3600, max_bytes=64 * 1024 * 1024):
+        super().__init__(ttl)
+        self.max_bytes = max_bytes
+        self._size = 0
+        # key -> (record, size), in least-recently-used order
+        self._entries = OrderedDict()
+        # key -> expiry time, in insertion order; with a fixed TTL this is also expiry order
+        self._expiry = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key, default=None, include_expired=False):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (not include_expired and self._expiry[key] <= time.time()):
+                return default
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, record):
+        size = record_size(record)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (record, size)
+            self._expiry[key] = time.time() + self.ttl
+            self._size += size
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def purge_expired(self):
+        with self._lock:
+            return self._expire(time.time())
+
+    def expired_keys(self):
+        now = time.time()
+        with self._lock:
+            keys = []
+            for key, expires_at in self._expiry.items():
+                if expires_at > now:
+                    break
+                keys.append(key)
+            return keys
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self):
+        stats = super().stats()
+        with self._lock:
+            stats.update({'bytes': self._size, 'max_bytes': self.max_bytes, 'evictions': self.evictions})
+        return stats
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        self._expiry.pop(key, None)
+        if entry is not None:
+            self._size -= entry[1]
+
+    def _expire(self, now):
+        removed = 0
+        while self._expiry:
+            key, expires_at = next(iter(self._expiry.items()))
+            if expires_at > now:
+                break
+            self._remove(key)
+            removed += 1
+        return removed
+
+
+class DiskStore(FileStore):
+    """Store records as JSON files in a directory shared by all workers on the host
+
+    Record files are never opened to count or expire them: expiry is the
+    file's mtime plus the TTL. Every write also appends the key and time
+    to an expiry index file beside the records, so purge_expired() and
+    expired_keys() read that one file and stat only the records due,
+    instead of listing and stat-ing the whole directory. len() is a
+    counter kept by this worker's writes and purges and re-read from the
+    directory at most every count_interval seconds, so /metrics scrapes do
+    not list the directory each time.
+    """
+
+    backend = 'disk'
+    INDEX_NAME = '.expiry-index'
+
+    def __init__(self, directory, ttl=3600, count_interval=30):
+        super().__init__(ttl)
+        self.directory = directory
+        self.count_interval = count_interval
+        self._count = None
+        self._counted_at = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self._transaction_lock = FileLock(os.path.join(self.directory, '.lock'))
+        self._index_path = os.path.join(self.directory, self.INDEX_NAME)
+        self._index_lock = FileLock(self._index_path + '.lock')
+        if not os.path.exists(self._index_path):
+            self._build_index()
+
+    def _path(self, key):
+        # Keys are generated from secure_filename(), but never trust them as paths
+        return os.path.join(self.directory, os.path.basename(key) + '.json')
+
+    def get(self, key, default=None, include_expired=False):
+        path = self._path(key)
+        try:
+            if not include_expired and os.path.getmtime(path) + self.ttl <= time.time():
+                return default
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return default
+
+    def put(self, key, record):
+        # Write atomically so another worker never reads a partial record
+        path = self._path(key)
+        existed = os.path.exists(path)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(record, f)
+            os.replace(tmp_path, path)
+        except Exception:
+            self._unlink(tmp_path)
+            raise
+        with self._index_lock:
+            with open(self._index_path, 'a', encoding='utf-8') as f:
+                f.write(self._index_line(os.path.basename(key), time.time()))
+        if not existed:
+            self._adjust_count(1)
+
+    def delete(self, key):
+        if self._unlink(self._path(key)):
+            self._adjust_count(-1)
+
+    def purge_expired(self):
+        # Under the transaction lock, so a record is not removed while a DedupStore refreshes it
+        with self.transaction(), self._index_lock:
+            now = time.time()
+            keep = []
+            removed = 0
+            for written_at, name, line in self._read_index():
+                if written_at + self.ttl > now:
+                    keep.append(line)
+                elif self._expired(name, now):
+                    removed += self._unlink(self._path(name))
+                # Otherwise the record was deleted, or rewritten and indexed again
+            self._write_index(keep)
+        self._adjust_count(-removed)
+        return removed
+
+    def expired_keys(self):
+        now = time.time()
+        due = dict.fromkeys(name for written_at, name, _ in self._read_index() if written_at + self.ttl <= now)
+        return [name for name in due if self._expired(name, now)]
+
+    def __len__(self):
+        with self._lock:
+            if self._count is not None and time.monotonic() - self._counted_at < self.count_interval:
+                return self._count
+        with os.scandir(self.directory) as entries:
+            count = sum(1 for entry in entries if entry.name.endswith('.json'))
+        self._set_count(count)
+        return count
+
+    def _expired(self, name, now):
+        try:
+            return os.path.getmtime(self._path(name)) + self.ttl <= now
+        except FileNotFoundError:
+            return False
+
+    @staticmethod
+    def _index_line(name, written_at):
+        return json.dumps([written_at, name]) + '\n'
+
+    def _read_index(self):
+        """Return the index as (written_at, name, line) tuples, in no particular order"""
+        try:
+            with open(self._index_path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return []
+        entries = []
+        for line in lines:
+            try:
+                written_at, name = json.loads(line)
+            except ValueError:
+                # Being appended by another worker, or cut short by a crash
+                continue
+            entries.append((written_at, name, line))
+        return entries
+
+    def _write_index(self, lines):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.writelines(lines)
+            os.replace(tmp_path, self._index_path)
+        except Exception:
+            self._unlink(tmp_path)
+            raise
+
+    def _build_index(self):
+        """Index the records written before the index existed; the one directory scan expiry needs"""
+        with self._index_lock:
+            if os.path.exists(self._index_path):
+                return
+            lines = []
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if not entry.name.endswith('.json'):
+                        continue
+                    try:
+                        lines.append(self._index_line(entry.name[:-len('.json')], entry.stat().st_mtime))
+                    except FileNotFoundError:
+                        continue
+            self._write_index(lines)
+
+    def _set_count(self, count):
+        with self._lock:
+            self._count = count
+            self._counted_at = time.monotonic()
+
+    def _adjust_count(self, delta):
+        with self._lock:
+            if self._count is not None:
+                self._count = max(0, self._count + delta)
+
+    @staticmethod
+    def _unlink(path):
+        """Remove path, returning whether it existed"""
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+
+class SQLiteStore(FileStore):
+    """Store records in a SQLite database, indexed by key and by expiry time"""
+
+    backend = 'sqlite'
+
+    def __init__(self, path, ttl=3600):
+        super().__init__(ttl)
+        self.path = path
+        self._local = threading.local()
+        self._transaction_lock = FileLock(path + '.lock')
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "key TEXT PRIMARY KEY, record TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS files_expires_at ON files (expires_at)")
+
+    def _connect(self):
+        # sqlite3 connections cannot be shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key, default=None, include_expired=False):
+        row = self._connect().execute(
+            "SELECT record FROM files WHERE key = ? AND expires_at > ?",
+            (key, float('-inf') if include_expired else time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def put(self, key, record):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO files (key, record, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(record), time.time() + self.ttl)
+            )
+
+    def delete(self, key):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM files WHERE key = ?", (key,))
+
+    def purge_expired(self):
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM files WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    def expired_keys(self):
+        rows = self._connect().execute("SELECT key FROM files WHERE expires_at <= ?", (time.time(),))
+        return [row[0] for row in rows]
+
+    def __len__(self):
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM files WHERE expires_at > ?", (time.time(),)
+        ).fetchone()[0]
+
+
+class DedupStore(FileStore):
+    """Upload handles sharing one stored blob per distinct document body.
+
+    Each upload key maps to a small handle record (the uploader's filename
+    and upload time) that points at a blob holding the content, parsed HTML
+    and metadata, keyed by content hash. Blobs are reference counted: adding
+    a handle increments the count and refreshes the blob's expiry, deleting
+    one decrements it, and the blob goes with its last handle. A handle
+    deleted after it expired (the reaper runs at expiry) or dropped by
+    purge_expired() releases its reference too, once: deleting a handle
+    that is already gone changes nothing. Counts are updated inside the
+    wrapped store's transaction(), so workers sharing a disk or SQLite store
+    never lose an update. The blob never expires before the newest handle.
+    Reads and writes look like the wrapped store's.
+    """
+
+    # Fields that belong to one upload rather than to the shared document
+    HANDLE_FIELDS = ('original_filename', 'upload_time')
+    BLOB_PREFIX = 'blob-'
+
+    def __init__(self, store):
+        super().__init__(store.ttl)
+        self.store = store
+        self.dedup_hits = 0
+        self.blobs_created = 0
+
+    @property
+    def backend(self):
+        return self.store.backend
+
+    def _blob_key(self, content_hash):
+        return f'{self.BLOB_PREFIX}{content_hash}'
+
+    def find_document(self, content_hash):
+        """Return the stored blob for content_hash, or None if no live upload has that body"""
+        blob = self.store.get(self._blob_key(content_hash))
+        if blob is None:
+            return None
+        blob = dict(blob)
+        blob.pop('refs', None)
+        return blob
+
+    def get(self, key, default=None, include_expired=False):
+        handle = self.store.get(key, include_expired=include_expired)
+        if handle is None or 'blob' not in handle:
+            # Records written before deduplication are stored whole
+            return handle if handle is not None else default
+        blob = self.find_document(handle['blob'])
+        if blob is None:
+            return default
+        blob.update((field, handle[field]) for field in self.HANDLE_FIELDS if field in handle)
+        return blob
+
+    def put(self, key, record):
+        content_hash = record.get('content_hash')
+        if not content_hash:
+            self.store.put(key, record)
+            return
+        blob_key = self._blob_key(content_hash)
+        handle = {field: record[field] for field in self.HANDLE_FIELDS if field in record}
+        handle['blob'] = content_hash
+        with self.store.transaction():
+            blob = self.store.get(blob_key)
+            if blob is not None:
+                self.dedup_hits += 1
+                blob['refs'] = blob.get('refs', 0) + 1
+            else:
+                self.blobs_created += 1
+                blob = {field: value for field, value in record.items() if field not in self.HANDLE_FIELDS}
+                blob['refs'] = 1
+            # Rewriting the blob also pushes its expiry past the new handle's
+            self.store.put(blob_key, blob)
+            self.store.put(key, handle)
+
+    def delete(self, key):
+        with self.store.transaction():
+            # Expired handles still hold a reference until they are deleted
+            handle = self.store.get(key, include_expired=True)
+            if handle is None:
+                # Already released, e.g. by another worker's purge
+                return
+            self.store.delete(key)
+            if 'blob' not in handle:
+                return
+            blob_key = self._blob_key(handle['blob'])
+            blob = self.store.get(blob_key)
+            if blob is None:
+                # Expired with (or after) the newest handle; nothing else can use it
+                self.store.delete(blob_key)
+                return
+            blob['refs'] = blob.get('refs', 1) - 1
+            if blob['refs'] <= 0:
+                self.store.delete(blob_key)
+            else:
+                self.store.put(blob_key, blob)
+
+    def purge_expired(self):
+        # Release the references of expired handles before the wrapped store drops them
+        released = 0
+        for key in self.store.expired_keys():
+            if not key.startswith(self.BLOB_PREFIX):
+                self.delete(key)
+                released += 1
+        return released + self.store.purge_expired()
+
+    def expired_keys(self):
+        return self.store.expired_keys()
+
+    def __len__(self):
+        return len(self.store)
+
+    def stats(self):
+        stats = self.store.stats()
+        stats.update({'dedup': True, 'dedup_hits': self.dedup_hits, 'blobs_created': self.blobs_created})
+        return stats
+
+
+def create_store(default_backend='memory', base_dir=None):
+    """Create the upload store selected by the FILE_STORAGE_BACKEND environment variable"""
+    backend = os.environ.get('FILE_STORAGE_BACKEND', default_backend)
+    ttl = int(os.environ.get('FILE_STORAGE_TTL', 3600))
+    base_dir = base_dir or tempfile.gettempdir()
+
+    store = None
+    try:
+        if backend == 'disk':
+            store = DiskStore(os.path.join(base_dir, 'file_storage'), ttl=ttl)
+        elif backend == 'sqlite':
+            path = os.environ.get('FILE_STORAGE_SQLITE_PATH', os.path.join(base_dir, 'file_storage.sqlite3'))
+            store = SQLiteStore(path, ttl=ttl)
+    except Exception as e:
+        logging.error(f"Could not create {backend} file storage, using memory: {e}")
+
+    if store is None:
+        if backend not in ('memory', 'disk', 'sqlite'):
+            logging.warning(f"Unknown FILE_STORAGE_BACKEND {backend!r}, using memory")
+        max_bytes = int(os.environ.get('FILE_STORAGE_MAX_BYTES', 64 * 1024 * 1024))
+        store = MemoryStore(ttl=ttl, max_bytes=max_bytes)
+
+    # Identical uploads share one stored document unless disabled
+    if os.environ.get('FILE_STORAGE_DEDUP', '1') == '1':
+        store = DedupStore(store)
+    return store
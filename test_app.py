@@ -44,6 +44,49 @@ class TestMarkdownConverter(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn(b'Advertise with MarkdownConverter', response.data)
 
+class TestPreview(unittest.TestCase):
+    
+    def setUp(self):
+        self.app = app.test_client()
+    
+    def upload(self, content):
+        response = self.app.post('/upload', data={'file': (BytesIO(content), 'code.md')},
+                                 content_type='multipart/form-data')
+        return response.get_json()
+    
+    def test_upload_preview_is_plain(self):
+        """Test that uploads return an unhighlighted preview and a highlighted preview URL"""
+        data = self.upload(b'# Code\n\n```python\nprint("hi")\n```\n')
+        self.assertTrue(data['success'])
+        self.assertNotIn('codehilite', data['preview_html'])
+        self.assertIn('language-python', data['preview_html'])
+        
+        response = self.app.get(data['preview_url'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'codehilite', response.data)
+        self.assertIsNotNone(response.headers.get('ETag'))
+    
+    def test_preview_revalidates_with_etag(self):
+        """Test that an unchanged preview is answered with 304"""
+        data = self.upload(b'# ETag\n\n    indented code\n')
+        etag = self.app.get(data['preview_url']).headers['ETag']
+        response = self.app.get(data['preview_url'], headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+    
+    def test_upload_empty_file(self):
+        """Test that empty and whitespace-only files are accepted"""
+        for content in (b'', b'  \n\n'):
+            data = self.upload(content)
+            self.assertTrue(data['success'], data)
+            self.assertEqual(data['preview_html'], '')
+            # The second upload of the same body is served from the stored document
+            self.assertTrue(self.upload(content)['success'])
+    
+    def test_preview_missing_file(self):
+        """Test preview of an unknown upload"""
+        self.assertEqual(self.app.get('/preview/missing.md').status_code, 404)
+
 def test_markdown_conversion():
     """Test markdown to HTML conversion"""
     from markdown import markdown
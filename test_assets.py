@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Tests for the cached, time-limited asset fetcher used by PDF rendering
+"""
+
+import os
+import sys
+import time
+import base64
+import shutil
+import tempfile
+import threading
+import unittest
+import ipaddress
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add the current directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import assets
+from assets import AssetFetcher, AssetFetchError, is_public_address
+from pdf_context import PDFRenderContext, load_weasyprint
+
+# 1x1 transparent PNG
+PNG = base64.b64decode('iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk'
+                       'YPhfDwAChwGA60e6kgAAAABJRU5ErkJggg==')
+
+class AssetHandler(BaseHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        AssetHandler.requests.append(self.path)
+        if self.path.startswith('/slow'):
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.end_headers()
+            try:
+                for _ in range(20):
+                    self.wfile.write(b'x' * 1024)
+                    self.wfile.flush()
+                    time.sleep(0.1)
+            except (BrokenPipeError, ConnectionResetError):
+                # The fetcher gave up, as it should
+                pass
+            return
+        if self.path.startswith('/redirect'):
+            self.send_response(302)
+            self.send_header('Location', self.path.split('?to=', 1)[1])
+            self.end_headers()
+            return
+        if self.path.startswith('/missing'):
+            self.send_error(404)
+            return
+        body = b'y' * 4096 if self.path.startswith('/big') else PNG
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class TestAssetFetcher(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), AssetHandler)
+        cls.base = f'http://127.0.0.1:{cls.server.server_address[1]}'
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        AssetHandler.requests = []
+        self.cache_dir = tempfile.mkdtemp()
+        # The test server is on loopback, which the fetcher refuses by default
+        self.fetcher = AssetFetcher(cache_dir=self.cache_dir, timeout=1, max_bytes=2048, allow_private=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_fetch_is_cached(self):
+        result = self.fetcher(f'{self.base}/a.png')
+        self.assertEqual(result['string'], PNG)
+        self.assertEqual(result['mime_type'], 'image/png')
+        self.assertEqual(self.fetcher.fetch(f'{self.base}/a.png'), ('image/png', PNG))
+        self.assertEqual(AssetHandler.requests, ['/a.png'])
+
+    def test_disk_cache_shared_between_fetchers(self):
+        self.fetcher.fetch(f'{self.base}/a.png')
+        other = AssetFetcher(cache_dir=self.cache_dir, local_only=True)
+        self.assertEqual(other.fetch(f'{self.base}/a.png'), ('image/png', PNG))
+        self.assertEqual(len(AssetHandler.requests), 1)
+
+    def test_prefetch_fetches_concurrently_once(self):
+        urls = [f'{self.base}/{n}.png' for n in range(5)]
+        self.assertEqual(self.fetcher.prefetch(urls + urls + ['relative.png', 'data:,x'], wait=True), 5)
+        self.assertEqual(sorted(AssetHandler.requests), sorted(f'/{n}.png' for n in range(5)))
+        self.assertEqual(self.fetcher.prefetch(urls, wait=True), 0)
+        for url in urls:
+            self.fetcher.fetch(url)
+        self.assertEqual(len(AssetHandler.requests), 5)
+
+    def test_size_cap(self):
+        with self.assertRaises(AssetFetchError):
+            self.fetcher.fetch(f'{self.base}/big.png')
+
+    def test_timeout_covers_whole_transfer(self):
+        started = time.monotonic()
+        with self.assertRaises(AssetFetchError):
+            AssetFetcher(timeout=0.3, max_bytes=1024 * 1024, allow_private=True).fetch(f'{self.base}/slow.png')
+        self.assertLess(time.monotonic() - started, 1.5)
+
+    def test_failures_are_not_retried_immediately(self):
+        with self.assertRaises(AssetFetchError):
+            self.fetcher.fetch(f'{self.base}/missing.png')
+        with self.assertRaises(AssetFetchError):
+            self.fetcher.fetch(f'{self.base}/missing.png')
+        self.assertEqual(AssetHandler.requests, ['/missing.png'])
+        self.assertEqual(self.fetcher.stats()['failed'], 1)
+
+    def test_local_only_never_touches_the_network(self):
+        fetcher = AssetFetcher(cache_dir=self.cache_dir, local_only=True)
+        self.assertEqual(fetcher.prefetch([f'{self.base}/a.png'], wait=True), 0)
+        with self.assertRaises(AssetFetchError):
+            fetcher.fetch(f'{self.base}/a.png')
+        self.assertEqual(AssetHandler.requests, [])
+        self.assertEqual(fetcher.stats()['refused'], 1)
+
+    def test_schemes(self):
+        self.assertEqual(self.fetcher.fetch('data:text/plain;base64,aGk='), ('text/plain', b'hi'))
+        with self.assertRaises(AssetFetchError):
+            self.fetcher.fetch('file:///etc/passwd')
+
+    def test_prefetch_is_capped_per_document(self):
+        fetcher = AssetFetcher(cache_dir=self.cache_dir, max_per_document=2, allow_private=True)
+        urls = [f'{self.base}/{n}.png' for n in range(5)]
+        self.assertEqual(fetcher.prefetch(urls, wait=True), 2)
+        self.assertEqual(sorted(AssetHandler.requests), ['/0.png', '/1.png'])
+
+    def test_network_fetches_are_capped_per_document(self):
+        fetcher = AssetFetcher(cache_dir=self.cache_dir, max_per_document=2, allow_private=True)
+        urls = [f'{self.base}/{n}.png' for n in range(4)]
+        fetcher.fetch(urls[0])
+        with fetcher.document():
+            # Cache hits do not count
+            for url in urls[:3]:
+                fetcher.fetch(url)
+            with self.assertRaises(AssetFetchError):
+                fetcher.fetch(urls[3])
+        self.assertEqual(len(AssetHandler.requests), 3)
+        # The limit is per document
+        with fetcher.document():
+            fetcher.fetch(urls[3])
+
+    def test_public_addresses(self):
+        for address in ('8.8.8.8', '2606:4700::1111'):
+            self.assertTrue(is_public_address(ipaddress.ip_address(address)), address)
+        for address in ('127.0.0.1', '10.1.2.3', '192.168.0.1', '172.16.0.1', '169.254.169.254',
+                        '100.64.0.1', '0.0.0.0', '224.0.0.1', '::1', 'fe80::1', 'fd00::1', '::ffff:127.0.0.1'):
+            self.assertFalse(is_public_address(ipaddress.ip_address(address)), address)
+
+    def test_private_hosts_are_refused(self):
+        fetcher = AssetFetcher(cache_dir=self.cache_dir)
+        for url in (f'{self.base}/a.png', f'http://localhost:{self.server.server_address[1]}/a.png'):
+            with self.assertRaises(AssetFetchError):
+                fetcher.fetch(url)
+        self.assertEqual(AssetHandler.requests, [])
+
+    def test_redirects_are_checked(self):
+        fetcher = AssetFetcher(cache_dir=self.cache_dir)
+        target = f'http://10.255.255.1:{self.server.server_address[1]}/a.png'
+        # Let the loopback test server count as public, so only the redirect target is private
+        with mock.patch.object(assets, 'is_public_address', lambda ip: ip.is_loopback):
+            with self.assertRaises(AssetFetchError):
+                fetcher.fetch(f'{self.base}/redirect?to={target}')
+            self.assertEqual(AssetHandler.requests, [f'/redirect?to={target}'])
+            self.assertEqual(fetcher.fetch(f'{self.base}/redirect?to={self.base}/a.png'), ('image/png', PNG))
+
+    def test_redirect_to_other_schemes_is_refused(self):
+        with self.assertRaises(AssetFetchError):
+            self.fetcher.fetch(f'{self.base}/redirect?to=file:///etc/passwd')
+
+    @unittest.skipUnless(load_weasyprint(), "WeasyPrint not available")
+    def test_weasyprint_fetch_protocol(self):
+        from weasyprint import urls
+        fetcher = self.fetcher.for_weasyprint()
+        with urls.fetch(fetcher, f'{self.base}/a.png') as response:
+            self.assertEqual(response.read(), PNG)
+            self.assertEqual(response.content_type, 'image/png')
+        with urls.fetch(fetcher, f'{self.base}/a.png') as response:
+            self.assertEqual(response.read(), PNG)
+        self.assertEqual(AssetHandler.requests, ['/a.png'])
+        with self.assertRaises(urls.URLFetchingError):
+            with urls.fetch(fetcher, 'file:///etc/passwd'):
+                pass
+
+    @unittest.skipUnless(load_weasyprint(), "WeasyPrint not available")
+    def test_pdf_render_uses_the_fetcher(self):
+        context = PDFRenderContext('body { margin: 0 }', url_fetcher=self.fetcher)
+        html_document = f'<html><body><img src="{self.base}/a.png"><img src="{self.base}/a.png"></body></html>'
+        for _ in range(2):
+            self.assertTrue(context.write_pdf(html_document).startswith(b'%PDF'))
+        self.assertEqual(AssetHandler.requests, ['/a.png'])
+        self.assertGreaterEqual(self.fetcher.stats()['cache_hits'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Tests for batch conversion helpers
+"""
+
+import io
+import os
+import sys
+import json
+import zipfile
+import unittest
+
+# Add the current directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from batch import BatchConverter, BatchError, read_uploaded_documents, stream_zip
+
+def fake_render(content, format):
+    if 'fail' in content:
+        raise ValueError("cannot render")
+    return f"{format}:{content}".encode('utf-8')
+
+def make_zip(members):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w') as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    buf.seek(0)
+    return buf
+
+class TestReadDocuments(unittest.TestCase):
+
+    def test_zip_and_plain_uploads(self):
+        """Test that zips are expanded, paths are sanitised and bad members are reported"""
+        archive = make_zip({'docs/a.md': '# A', '../escape.md': '# E', 'bad.md': b'\xff\xfe', 'logo.png': 'x'})
+        documents, errors = read_uploaded_documents(
+            [('batch.zip', archive), ('b.markdown', io.BytesIO(b'# B')), ('notes.txt', io.BytesIO(b'x'))],
+            max_files=10, max_bytes=1024
+        )
+        self.assertEqual(sorted(name for name, _ in documents), ['b.markdown', 'docs/a.md', 'escape.md'])
+        self.assertEqual(sorted(e['source'] for e in errors), ['bad.md', 'notes.txt'])
+
+    def test_duplicate_names_are_suffixed(self):
+        """Test that repeated filenames get distinct outputs"""
+        documents, _ = read_uploaded_documents(
+            [('a.md', io.BytesIO(b'1')), ('a.md', io.BytesIO(b'2'))], max_files=10, max_bytes=1024
+        )
+        self.assertEqual([name for name, _ in documents], ['a.md', 'a-1.md'])
+
+    def test_limits(self):
+        """Test that file count and size limits reject the whole batch"""
+        with self.assertRaises(BatchError):
+            read_uploaded_documents([('a.zip', make_zip({'1.md': 'a', '2.md': 'b'}))], max_files=1, max_bytes=1024)
+        with self.assertRaises(BatchError):
+            read_uploaded_documents([('a.md', io.BytesIO(b'x' * 100))], max_files=10, max_bytes=10)
+        with self.assertRaises(BatchError):
+            read_uploaded_documents([('a.zip', io.BytesIO(b'not a zip'))], max_files=10, max_bytes=1024)
+
+class TestBatchConversion(unittest.TestCase):
+
+    def test_results_and_manifest(self):
+        """Test that successes land in the zip and failures only in the manifest"""
+        converter = BatchConverter(fake_render, max_workers=2, timeout=0)
+        try:
+            tasks = [('a.md', 'pdf', 'alpha'), ('b.md', 'docx', 'fail'), ('c.md', 'docx', 'gamma')]
+            results = ((task[0], task[1], data, error) for task, data, error in converter.run(tasks))
+            data = b''.join(stream_zip(results, [{'source': 'x.txt', 'error': 'skipped'}]))
+        finally:
+            converter.shutdown()
+
+        archive = zipfile.ZipFile(io.BytesIO(data))
+        self.assertEqual(archive.read('a.pdf'), b'pdf:alpha')
+        self.assertEqual(archive.read('c.docx'), b'docx:gamma')
+        manifest = json.loads(archive.read('manifest.json'))
+        self.assertEqual(sorted(f['output'] for f in manifest['files']), ['a.pdf', 'c.docx'])
+        self.assertEqual(sorted(e['source'] for e in manifest['errors']), ['b.md', 'x.txt'])
+        self.assertEqual(converter.stats()['failed'], 1)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Tests for the markdown-converter command-line tool
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+# Add the current directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cli import convert, parse_formats
+
+class TestCli(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.tmp.name, 'docs')
+        self.output = os.path.join(self.tmp.name, 'out')
+        os.makedirs(os.path.join(self.source, 'guide'))
+        os.makedirs(os.path.join(self.source, '.git'))
+        self.write('index.md', '# Index')
+        self.write('guide/setup.markdown', '# Setup\n\n- step')
+        self.write('.git/ignored.md', '# Ignored')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, content):
+        with open(os.path.join(self.source, name), 'w', encoding='utf-8') as f:
+            f.write(content)
+
+    def test_converts_directory_tree(self):
+        """Test that outputs mirror the source tree and hidden directories are skipped"""
+        summary = convert([self.source], self.output, ['html', 'docx'], workers=1)
+        self.assertEqual(summary['converted'], 2)
+        self.assertEqual(summary['failed'], 0)
+        for name in ['index.html', 'index.docx', 'guide/setup.html', 'guide/setup.docx']:
+            self.assertTrue(os.path.exists(os.path.join(self.output, name)), name)
+        self.assertFalse(os.path.exists(os.path.join(self.output, '.git')))
+        with open(os.path.join(self.output, 'index.html'), encoding='utf-8') as f:
+            self.assertIn('<h1 id="index">Index</h1>', f.read())
+
+    def test_incremental_skips_unchanged_files(self):
+        """Test that only changed files are converted again"""
+        convert([self.source], self.output, ['html'], workers=1)
+        summary = convert([self.source], self.output, ['html'], workers=1, incremental=True)
+        self.assertEqual((summary['converted'], summary['skipped']), (0, 2))
+
+        self.write('index.md', '# Index v2')
+        summary = convert([self.source], self.output, ['html'], workers=1, incremental=True)
+        self.assertEqual((summary['converted'], summary['skipped']), (1, 1))
+
+        # A new format for unchanged content still has to be produced
+        summary = convert([self.source], self.output, ['html', 'docx'], workers=1, incremental=True)
+        self.assertEqual(summary['converted'], 2)
+
+    def test_colliding_output_names_are_rejected(self):
+        other = os.path.join(self.tmp.name, 'other')
+        os.makedirs(other)
+        with open(os.path.join(other, 'INDEX.md'), 'w', encoding='utf-8') as f:
+            f.write('# Other index')
+        summary = convert([self.source, other], self.output, ['html'], workers=1)
+        self.assertEqual(summary['converted'], 2)
+        self.assertEqual(summary['failed'], 1)
+        self.assertIn('already used', summary['errors'][0]['error'])
+        # The first input's file was not overwritten
+        with open(os.path.join(self.output, 'index.html'), encoding='utf-8') as f:
+            self.assertIn('Index', f.read())
+        self.assertFalse(os.path.exists(os.path.join(self.output, 'INDEX.html')))
+
+    def test_parse_formats(self):
+        """Test format list parsing"""
+        self.assertEqual(parse_formats('PDF, docx,pdf'), ['pdf', 'docx'])
+        with self.assertRaises(Exception):
+            parse_formats('pdf,rtf')
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Tests for the pooled Markdown converter
+"""
+
+import os
+import sys
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the current directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import markdown
+from converter import MarkdownPool, MARKDOWN_EXTENSIONS, get_pool, convert_markdown, parse_document, document_html
+
+class TestMarkdownPool(unittest.TestCase):
+
+    def test_matches_markdown_markdown(self):
+        """Test that pooled output is identical to a fresh conversion"""
+        text = "# Title\n\n| a | b |\n|---|---|\n| 1 | 2 |\n\n```python\nx = 1\n```"
+        self.assertEqual(convert_markdown(text), markdown.markdown(text, extensions=MARKDOWN_EXTENSIONS))
+
+    def test_instances_are_reused(self):
+        """Test that sequential conversions share one instance"""
+        pool = MarkdownPool(MARKDOWN_EXTENSIONS)
+        pool.convert('# one')
+        pool.convert('# two')
+        stats = pool.stats()
+        self.assertEqual(stats['created'], 1)
+        self.assertEqual(stats['reused'], 1)
+
+    def test_no_state_leaks_between_documents(self):
+        """Test that footnotes and abbreviations do not carry over after reset"""
+        pool = MarkdownPool(MARKDOWN_EXTENSIONS)
+        first = pool.convert("Text[^1] with HTML\n\n[^1]: A note\n\n*[HTML]: Hyper Text")
+        self.assertIn('A note', first)
+        second = pool.convert("Plain HTML")
+        self.assertNotIn('A note', second)
+        self.assertNotIn('<abbr', second)
+
+    def test_failed_instance_is_dropped(self):
+        """Test that an instance whose conversion raised is not returned to the pool"""
+        pool = MarkdownPool(MARKDOWN_EXTENSIONS)
+        with self.assertRaises(RuntimeError):
+            with pool.instance():
+                raise RuntimeError("boom")
+        self.assertEqual(pool.stats()['idle'], 0)
+
+    def test_threaded_conversions(self):
+        """Test that concurrent conversions each get their own document"""
+        pool = MarkdownPool(MARKDOWN_EXTENSIONS, max_idle=4)
+        docs = [f"# Doc {n}\n\nBody {n}" for n in range(40)]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(pool.convert, docs))
+        for n, html in enumerate(results):
+            self.assertIn(f'Doc {n}</h1>', html)
+            self.assertIn(f'<p>Body {n}</p>', html)
+        self.assertLessEqual(pool.stats()['idle'], 4)
+
+    def test_get_pool_is_shared_per_profile(self):
+        """Test that each extension set gets a single shared pool"""
+        self.assertIs(get_pool(), get_pool(list(MARKDOWN_EXTENSIONS)))
+        self.assertIsNot(get_pool(), get_pool(['extra']))
+
+class TestParseDocument(unittest.TestCase):
+
+    def test_artifact_fields(self):
+        """Test that the parsed document carries HTML, TOC, hash and metadata"""
+        text = "# Title\n\n## Part one\n\n### Detail\n\nSome words here.\n\n![Diagram](img/diagram.png)"
+        document = parse_document(text)
+        self.assertEqual(document['html'], convert_markdown(text))
+        self.assertIn('href="#part-one"', document['toc'])
+        self.assertEqual(len(document['content_hash']), 64)
+        self.assertEqual(document['metadata']['heading_count'], 3)
+        self.assertEqual(document['metadata']['images'], ['img/diagram.png'])
+        self.assertEqual(document['metadata']['word_count'], 7)
+
+    def test_toc_does_not_leak_between_documents(self):
+        """Test that a document without headings gets an empty TOC after a reused instance"""
+        parse_document("# Heading")
+        document = parse_document("No headings")
+        self.assertEqual(document['metadata']['heading_count'], 0)
+        self.assertNotIn('<li>', document['toc'])
+
+    def test_document_html_falls_back_to_conversion(self):
+        """Test that records stored without HTML are converted on demand"""
+        self.assertEqual(document_html({'content': '# A', 'html': '<p>cached</p>'}), '<p>cached</p>')
+        self.assertEqual(document_html({'content': '# A'}), convert_markdown('# A'))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Tests for the single-pass Markdown HTML to DOCX writer
+"""
+
+import io
+import os
+import sys
+import unittest
+
+# Add the current directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import markdown
+from docx import Document
+from docx.oxml.ns import qn
+from docx_writer import html_to_docx, docx_bytes
+
+def convert(md_content):
+    html = markdown.markdown(md_content, extensions=['extra', 'tables', 'codehilite', 'toc'])
+    return Document(io.BytesIO(docx_bytes(html_to_docx(html))))
+
+def paragraphs(doc):
+    return [(p.style.name, p.text) for p in doc.paragraphs]
+
+class TestDocxWriter(unittest.TestCase):
+
+    def test_headings(self):
+        """Test that heading levels map to Title and Heading styles"""
+        doc = convert("# Title\n\n## Section\n\n#### Deep")
+        self.assertEqual(paragraphs(doc), [('Title', 'Title'), ('Heading 1', 'Section'), ('Heading 3', 'Deep')])
+
+    def test_nested_and_ordered_lists(self):
+        """Test that nesting depth selects the list style and any item number is recognised"""
+        doc = convert("- a\n    - b\n        - c\n\nText\n\n7. seven\n12. twelve")
+        self.assertEqual(paragraphs(doc), [
+            ('List Bullet', 'a'), ('List Bullet 2', 'b'), ('List Bullet 3', 'c'),
+            ('Normal', 'Text'),
+            ('List Number', 'seven'), ('List Number', 'twelve'),
+        ])
+
+    def test_inline_formats(self):
+        """Test that bold, italic and code become run formatting without markers"""
+        doc = convert("Plain **bold** *italic* `code`")
+        runs = {run.text.strip(): run for run in doc.paragraphs[0].runs}
+        self.assertEqual(doc.paragraphs[0].text, 'Plain bold italic code')
+        self.assertTrue(runs['bold'].bold)
+        self.assertTrue(runs['italic'].italic)
+        self.assertEqual(runs['code'].font.name, 'Courier New')
+
+    def test_code_block_keeps_lines(self):
+        """Test that fenced code keeps its line breaks without a trailing newline"""
+        doc = convert("```python\ndef f():\n    return 1\n```")
+        self.assertEqual(paragraphs(doc), [('No Spacing', 'def f():\n    return 1')])
+
+    def test_table(self):
+        """Test that tables become Word tables with bold headers"""
+        doc = convert("| A | B |\n|---|---|\n| 1 | 2 |\n| 3 | 4 |")
+        table = doc.tables[0]
+        self.assertEqual([[c.text for c in row.cells] for row in table.rows], [['A', 'B'], ['1', '2'], ['3', '4']])
+        self.assertTrue(table.rows[0].cells[0].paragraphs[0].runs[0].bold)
+
+    def test_links(self):
+        """Test that links become hyperlinks pointing at their target"""
+        doc = convert("See [docs](https://example.com/docs).")
+        paragraph = doc.paragraphs[0]
+        self.assertEqual(paragraph.text, 'See docs.')
+        hyperlink = paragraph._p.find(qn('w:hyperlink'))
+        self.assertIsNotNone(hyperlink)
+        rel = doc.part.rels[hyperlink.get(qn('r:id'))]
+        self.assertEqual(rel.target_ref, 'https://example.com/docs')
+
+    def test_line_break_and_quote(self):
+        """Test that hard breaks stay in one paragraph and blockquotes use the Quote style"""
+        doc = convert("one  \ntwo\n\n> quoted")
+        self.assertEqual(paragraphs(doc), [('Normal', 'one\ntwo'), ('Quote', 'quoted')])
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
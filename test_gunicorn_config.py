@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Tests for the gunicorn pre-fork warm-up
+"""
+
+import gc
+import os
+import sys
+import logging
+import unittest
+from types import SimpleNamespace
+
+# Add the current directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import gunicorn_config
+from highlighting import highlight_cache
+from renderers import get_renderer
+
+class TestGunicornConfig(unittest.TestCase):
+    def test_preloads_by_default(self):
+        self.assertTrue(gunicorn_config.preload_app)
+        self.assertEqual(gunicorn_config.worker_class, 'sync')
+
+    def test_when_ready_warms_the_master(self):
+        server = SimpleNamespace(cfg=SimpleNamespace(preload_app=True), log=logging.getLogger('gunicorn.test'))
+        before = highlight_cache.stats()['entries']
+        try:
+            gunicorn_config.when_ready(server)
+        finally:
+            gc.unfreeze()
+        self.assertEqual(get_renderer('docx').status(), 'loaded')
+        # The sample document's code blocks were highlighted (and cached) in the master
+        self.assertGreater(highlight_cache.stats()['entries'], before)
+
+    def test_no_warm_up_without_preload(self):
+        server = SimpleNamespace(cfg=SimpleNamespace(preload_app=False), log=logging.getLogger('gunicorn.test'))
+        self.assertIsNone(gunicorn_config.when_ready(server))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Tests for the Pygments highlighting cache
+"""
+
+import os
+import sys
+import unittest
+import markdown
+from markdown.extensions.codehilite import CodeHilite
+
+# Add the current directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from converter import MARKDOWN_EXTENSIONS, convert_markdown
+from highlighting import HighlightCache, highlight_cache
+
+SNIPPET = "```bash\npip install markdown-converter\n```\n"
+
+class TestHighlightCache(unittest.TestCase):
+    def setUp(self):
+        highlight_cache.clear()
+
+    def test_repeated_blocks_hit_cache(self):
+        before = highlight_cache.stats()
+        first = convert_markdown(f"# One\n\n{SNIPPET}")
+        second = convert_markdown(f"# Two\n\n{SNIPPET}\n{SNIPPET}")
+        stats = highlight_cache.stats()
+        self.assertEqual(stats['misses'] - before['misses'], 1)
+        self.assertEqual(stats['hits'] - before['hits'], 2)
+        self.assertIn('<div class="codehilite">', first)
+        self.assertEqual(second.count('<div class="codehilite">'), 2)
+
+    def test_output_matches_uncached(self):
+        text = f"{SNIPPET}\n    #!/usr/bin/env python\n    print('guessed')\n\n```\nno language\n```\n"
+        cached = convert_markdown(text)
+        cached_again = convert_markdown(text)
+        direct = markdown.markdown(text, extensions=['extra', 'tables', 'codehilite', 'toc'])
+        self.assertEqual(cached, direct)
+        self.assertEqual(cached_again, direct)
+        self.assertGreater(highlight_cache.stats()['hits'], 0)
+
+    def test_stock_codehilite_is_untouched(self):
+        """Test that the cache only applies through MARKDOWN_EXTENSIONS, not to every markdown user"""
+        self.assertIs(CodeHilite.hilite, markdown.extensions.codehilite.CodeHilite.__dict__['hilite'])
+        self.assertNotIn('codehilite', MARKDOWN_EXTENSIONS)
+        before = highlight_cache.stats()
+        markdown.markdown(SNIPPET, extensions=['extra', 'codehilite'])
+        after = highlight_cache.stats()
+        self.assertEqual((after['hits'], after['misses']), (before['hits'], before['misses']))
+
+    def test_language_and_options_are_part_of_key(self):
+        before = highlight_cache.stats()['misses']
+        convert_markdown("```python\nx = 1\n```\n")
+        convert_markdown("```ruby\nx = 1\n```\n")
+        convert_markdown("```python hl_lines=\"1\"\nx = 1\n```\n")
+        self.assertEqual(highlight_cache.stats()['misses'] - before, 3)
+
+    def test_byte_bound_evicts_oldest(self):
+        cache = HighlightCache(max_bytes=10)
+        cache.put(b'a', 'aaaaaa')
+        cache.put(b'b', 'bbbbbb')
+        self.assertIsNone(cache.get(b'a'))
+        self.assertEqual(cache.get(b'b'), 'bbbbbb')
+        self.assertEqual(cache.stats()['evictions'], 1)
+        cache.put(b'c', 'c' * 11)
+        self.assertIsNone(cache.get(b'c'))
+
+    def test_byte_bound_counts_utf8_bytes(self):
+        cache = HighlightCache(max_bytes=10)
+        # Four characters, eight bytes
+        cache.put(b'a', 'éééé')
+        self.assertEqual(cache.stats()['bytes'], 8)
+        cache.put(b'b', 'bbb')
+        self.assertIsNone(cache.get(b'a'))
+        self.assertEqual(cache.stats()['bytes'], 3)
+        cache.put(b'c', 'ééééé' + 'c')
+        self.assertIsNone(cache.get(b'c'))
+
+if __name__ == '__main__':
+    unittest.main()
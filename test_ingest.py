@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Tests for streaming upload ingestion
+"""
+
+import io
+import os
+import sys
+import hashlib
+import unittest
+
+# Add the current directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ingest import UploadQuota, UploadTooLarge, read_upload
+
+class TestReadUpload(unittest.TestCase):
+    def test_decodes_across_chunk_boundaries(self):
+        text = '# Überschrift\n\nnaïve café — ✓ 日本語\n' * 20
+        data = text.encode('utf-8')
+        # A 3-byte chunk splits most of the multi-byte characters
+        content, content_hash, size = read_upload(io.BytesIO(data), len(data), chunk_size=3)
+        self.assertEqual(content, text)
+        self.assertEqual(content_hash, hashlib.sha256(data).hexdigest())
+        self.assertEqual(size, len(data))
+
+    def test_stops_once_over_limit(self):
+        stream = io.BytesIO(b'x' * 1000)
+        with self.assertRaises(UploadTooLarge):
+            read_upload(stream, 100, chunk_size=64)
+        # Nothing past the first chunk over the limit is read
+        self.assertEqual(stream.tell(), 128)
+
+    def test_rejects_invalid_utf8(self):
+        with self.assertRaises(UnicodeDecodeError):
+            read_upload(io.BytesIO(b'abc\xff'), 100)
+        # A truncated multi-byte sequence at the end is invalid too
+        with self.assertRaises(UnicodeDecodeError):
+            read_upload(io.BytesIO('é'.encode('utf-8')[:1]), 100)
+
+class TestUploadQuota(unittest.TestCase):
+    def test_disabled_by_default(self):
+        quota = UploadQuota()
+        quota.record('a', 10 ** 9)
+        self.assertIsNone(quota.remaining('a'))
+
+    def test_tracks_usage_per_tenant(self):
+        quota = UploadQuota(max_bytes=100, window=3600)
+        quota.record('a', 60)
+        quota.record('a', 30)
+        self.assertEqual(quota.remaining('a'), 10)
+        self.assertEqual(quota.remaining('b'), 100)
+
+    def test_usage_expires_after_window(self):
+        quota = UploadQuota(max_bytes=100, window=0)
+        quota.record('a', 100)
+        self.assertEqual(quota.remaining('a'), 100)
+        quota.record('b', 50)
+        self.assertEqual(quota.purge_expired(), 1)
+        self.assertEqual(quota.stats()['tenants'], 0)
+
+class TestUploadEndpoint(unittest.TestCase):
+    def setUp(self):
+        import app
+        self.module = app
+        self.client = app.app.test_client()
+
+    def test_raw_body_upload(self):
+        body = '# Raw\n\nUploaded as the request body.\n'.encode('utf-8')
+        response = self.client.post('/upload?filename=raw.md', data=body, content_type='text/markdown')
+        self.assertEqual(response.status_code, 200)
+        result = response.get_json()
+        self.assertTrue(result['success'])
+        record = self.module.file_storage.get(result['filename'])
+        self.assertEqual(record['content_hash'], hashlib.sha256(body).hexdigest())
+
+    def test_multipart_upload(self):
+        response = self.client.post('/upload', data={'file': (io.BytesIO(b'# Form\n'), 'form.md')},
+                                    content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('<h1', response.get_json()['preview_html'])
+
+    def test_duplicate_uploads_share_document(self):
+        body = b'# Shared template\n\nSame body from two users.\n'
+        first = self.client.post('/upload?filename=a.md', data=body, content_type='text/markdown').get_json()
+        hits = self.module.file_storage.stats()['dedup_hits']
+        second = self.client.post('/upload?filename=b.md', data=body, content_type='text/markdown').get_json()
+        self.assertEqual(self.module.file_storage.stats()['dedup_hits'], hits + 1)
+        self.assertNotEqual(first['filename'], second['filename'])
+        self.assertEqual(self.module.file_storage.get(second['filename'])['original_filename'], 'b.md')
+        self.assertEqual(first['preview_html'], second['preview_html'])
+
+    def test_quota_exceeded(self):
+        quota = self.module.upload_quota
+        old_max = quota.max_bytes
+        quota.max_bytes = 10
+        try:
+            response = self.client.post('/upload?filename=big.md', data=b'#' * 50, content_type='text/markdown',
+                                        environ_base={'REMOTE_ADDR': '203.0.113.9'})
+            self.assertEqual(response.status_code, 429)
+            self.assertIn('Retry-After', response.headers)
+        finally:
+            quota.max_bytes = old_max
+
+if __name__ == '__main__':
+    unittest.main()
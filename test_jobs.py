@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Tests for the background conversion job queue
+"""
+
+import os
+import sys
+import time
+import operator
+import tempfile
+import unittest
+from unittest import mock
+
+# Add the current directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from jobs import JobQueue, QueueFullError, pool_size
+from storage import DiskStore
+
+def wait_for(queue, job_id, timeout=15):
+    """Poll a job until it leaves the queued/running states"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job['status'] not in ('queued', 'running'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+class TestJobQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.queues = []
+
+    def tearDown(self):
+        for queue in self.queues:
+            queue.shutdown()
+
+    def make_queue(self, func, **kwargs):
+        queue = JobQueue(func, max_workers=1, **kwargs)
+        self.queues.append(queue)
+        return queue
+
+    def test_job_result_and_callback(self):
+        """Test that a finished job exposes its result and fires on_result"""
+        results = []
+        queue = self.make_queue(operator.add, on_result=lambda job, data: results.append((job['tag'], data)))
+        job_id = queue.submit(2, 3, tag='sum')
+
+        job = wait_for(queue, job_id)
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(job['result'], 5)
+        self.assertEqual(results, [('sum', 5)])
+
+    def test_failed_job_reports_error(self):
+        """Test that exceptions in the worker mark the job failed"""
+        queue = self.make_queue(operator.truediv)
+        job = wait_for(queue, queue.submit(1, 0))
+        self.assertEqual(job['status'], 'failed')
+        self.assertIn('division', job['error'])
+
+    def test_queue_depth_limit(self):
+        """Test that submissions beyond max_pending are rejected"""
+        queue = self.make_queue(time.sleep, max_pending=1)
+        queue.submit(0.5)
+        with self.assertRaises(QueueFullError):
+            queue.submit(0.5)
+        self.assertEqual(queue.stats()['rejected'], 1)
+
+    def test_job_timeout(self):
+        """Test that a job running past its timeout is aborted"""
+        queue = self.make_queue(time.sleep, timeout=1)
+        job = wait_for(queue, queue.submit(5))
+        self.assertEqual(job['status'], 'timeout')
+
+    def test_add_completed(self):
+        """Test that precomputed results are available immediately"""
+        queue = self.make_queue(operator.add)
+        job = queue.get(queue.add_completed(b'cached', format='pdf'))
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(job['result'], b'cached')
+        self.assertEqual(queue.depth(), 0)
+
+    def test_pools_split_cores_among_web_workers(self):
+        """Test that pools default to the cores left per web worker"""
+        with mock.patch('os.cpu_count', return_value=8):
+            with mock.patch.dict(os.environ, {'WEB_CONCURRENCY': '4'}):
+                self.assertEqual(pool_size(), 2)
+                self.assertEqual(JobQueue(operator.add).max_workers, 2)
+            with mock.patch.dict(os.environ, {'WEB_CONCURRENCY': '16'}):
+                self.assertEqual(pool_size(), 1)
+
+    def test_pool_workers_are_not_forked(self):
+        """Test that workers start from a clean process, not a fork of the threaded web worker"""
+        queue = self.make_queue(operator.add)
+        wait_for(queue, queue.submit(1, 1))
+        self.assertNotEqual(queue._executor._mp_context.get_start_method(), 'fork')
+
+    def test_shared_store_lets_other_workers_poll(self):
+        """Test that a job submitted in one worker can be polled and its result found from another"""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        results = {}
+        store_result = lambda job, data: results.__setitem__(job['cache_key'], data)
+        queue = self.make_queue(operator.add, on_result=store_result, store=DiskStore(tmp.name))
+        other = self.make_queue(operator.add, store=DiskStore(tmp.name))
+
+        job_id = queue.submit(2, 3, cache_key='k', format='pdf')
+        self.assertIn(other.get(job_id)['status'], ('queued', 'running', 'done'))
+        wait_for(queue, job_id)
+        job = other.get(job_id)
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(job['format'], 'pdf')
+        # Results are not held in either worker's memory
+        self.assertIsNone(job['result'])
+        self.assertIsNone(queue.get(job_id)['result'])
+        self.assertEqual(results, {'k': 5})
+        self.assertIsNone(other.get('unknown'))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
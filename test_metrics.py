@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Tests for timing histograms and the /metrics exposition
+"""
+
+import os
+import sys
+import unittest
+
+# Add the current directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from metrics import MetricsRegistry, size_bucket
+
+class TestMetricsRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry(prefix='test')
+
+    def test_histogram_buckets_are_cumulative(self):
+        self.registry.observe('stage_seconds', 0.003, stage='parse')
+        self.registry.observe('stage_seconds', 0.2, stage='parse')
+        output = self.registry.render()
+        self.assertIn('test_stage_seconds_bucket{stage="parse",le="0.005"} 1', output)
+        self.assertIn('test_stage_seconds_bucket{stage="parse",le="0.25"} 2', output)
+        self.assertIn('test_stage_seconds_bucket{stage="parse",le="+Inf"} 2', output)
+        self.assertIn('test_stage_seconds_count{stage="parse"} 2', output)
+        self.assertIn('# TYPE test_stage_seconds histogram', output)
+
+    def test_timed_uses_bound_labels(self):
+        self.registry.bind(format='pdf', size='10k')
+        with self.registry.timed('layout'):
+            pass
+        self.registry.reset_labels()
+        with self.registry.timed('layout'):
+            pass
+        output = self.registry.render()
+        self.assertIn('test_stage_seconds_count{format="pdf",size="10k",stage="layout"} 1', output)
+        self.assertIn('test_stage_seconds_count{stage="layout"} 1', output)
+
+    def test_timed_records_failures(self):
+        with self.assertRaises(ValueError):
+            with self.registry.timed('docx_build'):
+                raise ValueError("boom")
+        self.assertIn('test_stage_seconds_count{stage="docx_build"} 1', self.registry.render())
+
+    def test_counter_and_collector(self):
+        self.registry.inc('http_requests_total', status='200')
+        self.registry.inc('http_requests_total', status='200')
+        self.registry.add_collector(lambda: [
+            ('cache_hit_rate', 'gauge', 'Cache hit rate', 0.5),
+            ('cache_bytes', 'gauge', 'Cache size', {(('tier', 'disk'),): 1024, (('tier', 'memory'),): None}),
+        ])
+        output = self.registry.render()
+        self.assertIn('test_http_requests_total{status="200"} 2', output)
+        self.assertIn('test_cache_hit_rate 0.5', output)
+        self.assertIn('test_cache_bytes{tier="disk"} 1024', output)
+        self.assertNotIn('tier="memory"', output)
+
+    def test_label_values_are_escaped(self):
+        self.registry.observe('stage_seconds', 0.1, stage='a"b')
+        self.assertIn('stage="a\\"b"', self.registry.render())
+
+    def test_size_bucket(self):
+        self.assertEqual(size_bucket(500), '10k')
+        self.assertEqual(size_bucket(50 * 1024), '100k')
+        self.assertEqual(size_bucket(1024 * 1024), '1m')
+        self.assertEqual(size_bucket(50 * 1024 * 1024), 'larger')
+
+class TestMetricsEndpoint(unittest.TestCase):
+    def test_metrics_route(self):
+        from app import app
+        client = app.test_client()
+        client.get('/debug')
+        response = client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        body = response.get_data(as_text=True)
+        self.assertIn('markdown_converter_http_request_seconds_count{endpoint="debug",method="GET"}', body)
+        self.assertIn('markdown_converter_render_cache_hit_rate', body)
+        self.assertIn('markdown_converter_conversion_queue_depth', body)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Tests for chunked large-document PDF rendering
+"""
+
+import io
+import os
+import sys
+import unittest
+
+# Add the current directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from converter import parse_document
+from pdf_context import load_weasyprint
+from pdf_chunks import ChunkedPDFRenderer, merge_chunks, pypdf_available, split_html, toc_outline
+
+def chapters(count, words=300):
+    return ''.join(
+        f"# Chapter {n}\n\n{'word ' * words}\n\n## Part {n}.1\n\n| a | b |\n|---|---|\n| {n} | x |\n\n"
+        f"```python\nprint({n})\n```\n\n"
+        for n in range(count)
+    )
+
+class TestSplitHtml(unittest.TestCase):
+    def test_breaks_only_before_section_headings(self):
+        html_content = parse_document(chapters(6))['html']
+        chunks = split_html(html_content, 1000)
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertRegex(chunk.lstrip(), r'^<h[12] ')
+        # Nothing is lost or duplicated across chunks
+        self.assertEqual(''.join(chunks).count('<table>'), 6)
+        self.assertEqual(''.join(chunks).count('class="codehilite"'), 6)
+
+    def test_small_document_is_one_chunk(self):
+        html_content = parse_document(chapters(2, words=5))['html']
+        self.assertEqual(len(split_html(html_content, 1024 * 1024)), 1)
+
+    def test_oversized_section_stays_whole(self):
+        html_content = parse_document('# Only\n\n' + 'word ' * 5000 + '\n\n### Deep\n\nmore\n')['html']
+        self.assertEqual(len(split_html(html_content, 100)), 1)
+
+    def test_empty(self):
+        self.assertEqual(split_html('', 100), [''])
+
+class TestTocOutline(unittest.TestCase):
+    def test_nested_entries(self):
+        toc = parse_document(chapters(2))['toc']
+        outline = toc_outline(toc)
+        self.assertEqual([title for title, _, _ in outline], ['Chapter 0', 'Chapter 1'])
+        self.assertEqual(outline[0][1], 'chapter-0')
+        self.assertEqual(outline[1][2][0][0], 'Part 1.1')
+
+    def test_no_toc(self):
+        self.assertEqual(toc_outline(''), [])
+
+def blank_pdf(pages):
+    from pypdf import PdfWriter
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=595, height=842)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+@unittest.skipUnless(pypdf_available(), "pypdf required")
+class TestMergeChunks(unittest.TestCase):
+    def test_pages_in_order_with_bookmarks(self):
+        from pypdf import PdfReader
+        toc = parse_document("# Chapter 0\n\n## Part 0.1\n\n# Chapter 1\n")['toc']
+        results = [(blank_pdf(2), 2, {'chapter-0': 0, 'part-01': 1}), (blank_pdf(1), 1, {'chapter-1': 0})]
+        reader = PdfReader(io.BytesIO(merge_chunks(results, toc)))
+        self.assertEqual(len(reader.pages), 3)
+        chapters_outline = [item for item in reader.outline if not isinstance(item, list)]
+        self.assertEqual([item.title for item in chapters_outline], ['Chapter 0', 'Chapter 1'])
+        self.assertEqual([reader.get_destination_page_number(item) for item in chapters_outline], [0, 2])
+        self.assertEqual(reader.get_destination_page_number(reader.outline[1][0]), 1)
+
+    def test_writes_into_target(self):
+        from pypdf import PdfReader
+        target = io.BytesIO()
+        self.assertIsNone(merge_chunks([(blank_pdf(1), 1, {})], '', target=target))
+        self.assertEqual(len(PdfReader(io.BytesIO(target.getvalue())).pages), 1)
+
+class TestChunkedPDFRenderer(unittest.TestCase):
+    def test_stats(self):
+        renderer = ChunkedPDFRenderer(max_workers=2, chunk_bytes=4096)
+        stats = renderer.stats()
+        self.assertEqual(stats['available'], pypdf_available())
+        self.assertEqual(stats['documents'], 0)
+
+    @unittest.skipUnless(pypdf_available() and load_weasyprint(), "pypdf and WeasyPrint required")
+    def test_merged_pdf_has_all_pages_and_bookmarks(self):
+        from pypdf import PdfReader
+        document = parse_document(chapters(4))
+        renderer = ChunkedPDFRenderer(max_workers=2, chunk_bytes=2000)
+        try:
+            data = renderer.write_pdf(document['html'], document['toc'])
+        finally:
+            renderer.shutdown()
+        self.assertGreater(renderer.stats()['chunks'], 1)
+        reader = PdfReader(io.BytesIO(data))
+        self.assertGreaterEqual(len(reader.pages), renderer.stats()['chunks'])
+        titles = [item.title for item in reader.outline if not isinstance(item, list)]
+        self.assertEqual(titles, ['Chapter 0', 'Chapter 1', 'Chapter 2', 'Chapter 3'])
+        pages = [reader.get_destination_page_number(item) for item in reader.outline if not isinstance(item, list)]
+        self.assertEqual(pages, sorted(pages))
+
+if __name__ == '__main__':
+    unittest.main()
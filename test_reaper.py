@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Tests for the background expiry reaper
+"""
+
+import os
+import sys
+import time
+import tempfile
+import unittest
+
+# Add the current directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from reaper import ExpiryReaper, remove_file
+
+def wait_until(condition, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+class TestExpiryReaper(unittest.TestCase):
+
+    def test_actions_run_in_deadline_order(self):
+        """Test that actions fire once due, earliest first"""
+        reaper = ExpiryReaper()
+        fired = []
+        now = time.time()
+        reaper.schedule(now + 0.2, fired.append, 'late')
+        reaper.schedule(now + 0.05, fired.append, 'early')
+        reaper.schedule(now + 3600, fired.append, 'future')
+
+        self.assertTrue(wait_until(lambda: len(fired) == 2))
+        self.assertEqual(fired, ['early', 'late'])
+        self.assertEqual(reaper.pending(), 1)
+
+    def test_removes_expired_file(self):
+        """Test that scheduled temp files are deleted"""
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        reaper = ExpiryReaper()
+        reaper.schedule(time.time(), remove_file, path)
+        self.assertTrue(wait_until(lambda: not os.path.exists(path)))
+
+    def test_periodic_sweep(self):
+        """Test that sweep callables run on the reaper thread"""
+        reaper = ExpiryReaper(sweep_interval=0.05)
+        calls = []
+        reaper.add_sweep(lambda: calls.append(1))
+        self.assertTrue(wait_until(lambda: len(calls) >= 2))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Tests for the content-addressed render cache
+"""
+
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+# Add the current directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from render_cache import RenderCache
+
+class TestRenderCache(unittest.TestCase):
+
+    def test_key_depends_on_content_format_and_version(self):
+        """Test that any input change produces a different key"""
+        key = RenderCache.make_key('# Doc', 'pdf', 'v1')
+        self.assertEqual(key, RenderCache.make_key('# Doc', 'pdf', 'v1'))
+        self.assertNotEqual(key, RenderCache.make_key('# Doc!', 'pdf', 'v1'))
+        self.assertNotEqual(key, RenderCache.make_key('# Doc', 'docx', 'v1'))
+        self.assertNotEqual(key, RenderCache.make_key('# Doc', 'pdf', 'v2'))
+
+    def test_hit_and_miss_counters(self):
+        """Test that lookups are counted"""
+        cache = RenderCache(max_bytes=1024)
+        self.assertIsNone(cache.get('a'))
+        cache.put('a', b'pdf-bytes')
+        self.assertEqual(cache.get('a'), b'pdf-bytes')
+
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['bytes'], len(b'pdf-bytes'))
+
+    def test_lru_eviction_by_size(self):
+        """Test that the least recently used entry is evicted first"""
+        cache = RenderCache(max_bytes=10)
+        cache.put('a', b'aaaa')
+        cache.put('b', b'bbbb')
+        cache.get('a')
+        cache.put('c', b'cccc')
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), b'aaaa')
+        self.assertEqual(cache.get('c'), b'cccc')
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertLessEqual(cache.stats()['bytes'], 10)
+
+    def test_oversized_entry_is_not_kept_in_memory(self):
+        """Test that a single entry larger than the budget is skipped"""
+        cache = RenderCache(max_bytes=4)
+        cache.put('big', b'0123456789')
+        self.assertIsNone(cache.get('big'))
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_disk_tier_survives_new_instance(self):
+        """Test that renders written to disk are found by a fresh cache"""
+        with tempfile.TemporaryDirectory() as disk_dir:
+            RenderCache(max_bytes=1024, disk_dir=disk_dir).put('k', b'rendered')
+
+            cache = RenderCache(max_bytes=1024, disk_dir=disk_dir)
+            self.assertEqual(cache.get('k'), b'rendered')
+            self.assertEqual(cache.stats()['disk_hits'], 1)
+
+            # Promoted into memory on the first disk hit
+            self.assertEqual(cache.get('k'), b'rendered')
+            self.assertEqual(cache.stats()['memory_hits'], 1)
+
+    def test_disk_tier_is_size_bounded(self):
+        """Test that the oldest disk entries are removed over budget"""
+        with tempfile.TemporaryDirectory() as disk_dir:
+            cache = RenderCache(max_bytes=1024, disk_dir=disk_dir, disk_max_bytes=8)
+            cache.put('a', b'aaaa')
+            cache.put('b', b'bbbb')
+            cache.put('c', b'cccc')
+
+            self.assertFalse(os.path.exists(os.path.join(disk_dir, 'a')))
+            self.assertTrue(os.path.exists(os.path.join(disk_dir, 'c')))
+            self.assertEqual(cache.stats()['disk_evictions'], 1)
+
+    def test_disk_budget_counts_other_workers_files(self):
+        """Test that a rescan makes every worker's writes count against the shared disk budget"""
+        with tempfile.TemporaryDirectory() as disk_dir:
+            first = RenderCache(max_bytes=1024, disk_dir=disk_dir, disk_max_bytes=12, disk_rescan_interval=0)
+            second = RenderCache(max_bytes=1024, disk_dir=disk_dir, disk_max_bytes=12, disk_rescan_interval=0)
+            for n in range(3):
+                first.put(f'first-{n}', b'aaaa')
+                second.put(f'second-{n}', b'bbbb')
+            self.assertLessEqual(sum(os.path.getsize(os.path.join(disk_dir, name)) for name in os.listdir(disk_dir)), 12)
+            self.assertTrue(os.path.exists(os.path.join(disk_dir, 'second-2')))
+
+    def test_failed_disk_write_leaves_no_temp_file(self):
+        """Test that a write failing halfway removes its temp file"""
+        class Broken(io.BytesIO):
+            def read(self, *args):
+                raise OSError('disk full')
+
+        with tempfile.TemporaryDirectory() as disk_dir:
+            cache = RenderCache(max_bytes=1024, disk_dir=disk_dir, max_entry_bytes=4)
+            self.assertIsNone(cache.put_file('big', Broken(), 10))
+            self.assertEqual(os.listdir(disk_dir), [])
+
+    def test_large_entries_are_served_from_disk(self):
+        """Test that entries over max_entry_bytes stream to disk and are opened by path"""
+        with tempfile.TemporaryDirectory() as disk_dir:
+            cache = RenderCache(max_bytes=1024, disk_dir=disk_dir, max_entry_bytes=4)
+            path = cache.put_file('big', io.BytesIO(b'0123456789'), 10)
+            self.assertEqual(path, os.path.join(disk_dir, 'big'))
+            self.assertEqual(cache.stats()['entries'], 0)
+
+            data, path = cache.open('big')
+            self.assertIsNone(data)
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), b'0123456789')
+
+            cache.put('small', b'abc')
+            self.assertEqual(cache.open('small'), (b'abc', None))
+            self.assertEqual(cache.open('missing'), (None, None))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Tests for the output format registry and the EPUB and plain-text writers
+"""
+
+import io
+import os
+import sys
+import json
+import zipfile
+import subprocess
+import unittest
+from lxml import etree
+
+# Add the current directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import renderers
+from converter import parse_document, pool_stats
+from renderers import (
+    Renderer, RendererUnavailable, SourceDocument, UnsupportedFormat, formats, render, render_many
+)
+from text_writer import html_to_text
+
+MARKDOWN = """# Guide
+
+Intro with **bold** text&nbsp;and a <br> raw break.
+
+## Install
+
+- one
+- two
+
+| a | b |
+|---|---|
+| 1 | 2 |
+
+```bash
+pip install markdown-converter
+```
+"""
+
+def parsed_document():
+    document = parse_document(MARKDOWN)
+    return SourceDocument(MARKDOWN, document['html'], document['toc'], title='Guide')
+
+def parse_count():
+    return sum(pool['created'] + pool['reused'] for pool in pool_stats())
+
+class TestRegistry(unittest.TestCase):
+    def test_registered_formats(self):
+        self.assertEqual(formats(), ['pdf', 'docx', 'html', 'epub', 'txt'])
+
+    def test_unknown_format(self):
+        with self.assertRaises(UnsupportedFormat):
+            render(parsed_document(), 'rtf')
+
+    def test_missing_dependency(self):
+        renderer = Renderer('fake', 'application/x-fake', lambda document: b'', requires=['no_such_module_here'])
+        self.assertFalse(renderer.available())
+        with self.assertRaises(RendererUnavailable):
+            renderer.render(parsed_document())
+
+    def test_render_many_shares_one_parse(self):
+        document = parsed_document()
+        before = parse_count()
+        results = render_many(document, ['html', 'epub', 'txt', 'docx'])
+        self.assertEqual(parse_count(), before)
+        self.assertEqual([format for format, _, _ in results], ['html', 'epub', 'txt', 'docx'])
+        self.assertTrue(all(error is None for _, _, error in results))
+
+    def test_render_many_reports_failures(self):
+        renderers.RENDERERS['broken'] = Renderer('broken', 'text/plain', lambda document: 1 / 0)
+        try:
+            results = render_many(parsed_document(), ['broken', 'txt'])
+        finally:
+            del renderers.RENDERERS['broken']
+        self.assertIsNone(results[0][1])
+        self.assertIn('division by zero', results[0][2])
+        self.assertIsNotNone(results[1][1])
+
+    def test_source_document_parses_lazily(self):
+        document = SourceDocument(MARKDOWN)
+        self.assertIn('<h2 id="install">', document.html)
+        self.assertIn('href="#install"', document.toc)
+
+    def test_source_document_metadata(self):
+        document = SourceDocument(MARKDOWN)
+        self.assertEqual(document.metadata['heading_count'], 2)
+        stored = SourceDocument(MARKDOWN, metadata={'heading_count': 7})
+        self.assertEqual(stored.metadata['heading_count'], 7)
+
+    def test_render_document_uses_stored_toc(self):
+        """Test that jobs rendering an upload's stored HTML and TOC never parse it again"""
+        from rendering import render_document
+        document = parse_document(MARKDOWN)
+        before = parse_count()
+        data = render_document(MARKDOWN, 'epub', document['html'], document['toc'], document['metadata'], 'Guide')
+        self.assertEqual(parse_count(), before)
+        self.assertTrue(data.startswith(b'PK'))
+
+class TestLazyBackends(unittest.TestCase):
+    def test_app_import_skips_heavy_backends(self):
+        script = ("import sys, json, app; "
+                  "print(json.dumps([m for m in ('weasyprint', 'docx', 'requests') if m in sys.modules]))")
+        env = dict(os.environ, PRELOAD_BACKENDS='0', RENDER_CACHE_DISK='0', FILE_STORAGE_BACKEND='memory')
+        result = subprocess.run([sys.executable, '-c', script], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                env=env, capture_output=True, text=True, timeout=60)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(json.loads(result.stdout.strip().splitlines()[-1]), [])
+
+    def test_status_does_not_load(self):
+        renderer = Renderer('fake', 'application/x-fake', lambda document: b'', requires=['json'])
+        self.assertEqual(renderer.status(), 'not loaded')
+        self.assertTrue(renderer.available())
+        self.assertEqual(renderer.status(), 'loaded')
+        self.assertIsNotNone(renderer.load_seconds)
+
+    def test_warm_up_loads_available_backends(self):
+        import app
+        timings = app.warm_up()
+        self.assertIn('import_docx', timings)
+        self.assertEqual(renderers.get_renderer('docx').status(), 'loaded')
+        self.assertNotEqual(renderers.get_renderer('pdf').status(), 'not loaded')
+
+class TestEpub(unittest.TestCase):
+    def test_package_structure(self):
+        data = render(parsed_document(), 'epub')
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            first = archive.infolist()[0]
+            self.assertEqual(first.filename, 'mimetype')
+            self.assertEqual(first.compress_type, zipfile.ZIP_STORED)
+            self.assertEqual(archive.read('mimetype'), b'application/epub+zip')
+            for name in ['META-INF/container.xml', 'OEBPS/content.opf', 'OEBPS/nav.xhtml', 'OEBPS/content.xhtml']:
+                # Every part must be well-formed XML
+                etree.fromstring(archive.read(name))
+            nav = archive.read('OEBPS/nav.xhtml').decode('utf-8')
+            self.assertIn('href="content.xhtml#install"', nav)
+            self.assertIn('<ol>', nav)
+            self.assertIn(b'<dc:title>Guide</dc:title>', archive.read('OEBPS/content.opf'))
+
+class TestPlainText(unittest.TestCase):
+    def test_structure_is_kept(self):
+        text = render(parsed_document(), 'txt').decode('utf-8')
+        self.assertTrue(text.startswith('Guide\n=====\n'))
+        self.assertIn('Install\n-------', text)
+        self.assertIn('- one\n- two', text)
+        self.assertIn('a\tb', text)
+        self.assertIn('pip install markdown-converter', text)
+        self.assertNotIn('<', text)
+
+    def test_empty(self):
+        self.assertEqual(html_to_text(''), '\n')
+
+class TestDownloadFormats(unittest.TestCase):
+    def setUp(self):
+        from app import app
+        self.client = app.test_client()
+        response = self.client.post('/upload?filename=guide.md', data=MARKDOWN.encode('utf-8'),
+                                    content_type='text/markdown')
+        self.filename = response.get_json()['filename']
+
+    def test_text_and_epub_downloads(self):
+        response = self.client.get(f'/download/txt/{self.filename}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertIn('guide.txt', response.headers['Content-Disposition'])
+
+        response = self.client.get(f'/download/epub/{self.filename}')
+        self.assertEqual(response.headers['Content-Type'], 'application/epub+zip')
+
+    def test_several_formats_in_one_zip(self):
+        response = self.client.get(f'/download/html,txt,epub/{self.filename}')
+        self.assertEqual(response.status_code, 200)
+        with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+            names = set(archive.namelist())
+        self.assertEqual(names, {'guide.html', 'guide.txt', 'guide.epub', 'manifest.json'})
+
+    def test_unknown_format_rejected(self):
+        self.assertEqual(self.client.get(f'/download/rtf/{self.filename}').status_code, 400)
+        self.assertEqual(self.client.get(f'/download/pdf,rtf/{self.filename}').status_code, 400)
+
+    @unittest.skipIf(renderers.get_renderer('pdf').available(), "WeasyPrint is installed")
+    def test_pdf_fallback_is_labelled(self):
+        response = self.client.get(f'/download/pdf/{self.filename}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Type'], 'text/html; charset=utf-8')
+        self.assertEqual(response.headers['X-Requested-Format'], 'pdf')
+        self.assertIn('guide.html', response.headers['Content-Disposition'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Tests for section splitting and incremental rendering
+"""
+
+import io
+import os
+import re
+import sys
+import unittest
+from unittest import mock
+
+# Add the current directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from docx import Document
+from docx.oxml.ns import qn
+from pdf_context import load_weasyprint
+from render_cache import RenderCache
+from rendering import render_docx
+from converter import parse_document
+from pdf_chunks import pypdf_available
+import sections
+from sections import split_sections, unique_heading_ids, IncrementalRenderer
+
+MANUAL = """# Manual
+
+Intro with a [link](https://example.com/intro).
+
+```bash
+# not a heading
+```
+
+## Install
+
+Run the [installer][dl].
+
+# Usage
+
+Some *usage* text.
+
+[dl]: https://example.com/download
+"""
+
+class TestSplitSections(unittest.TestCase):
+
+    def test_splits_at_top_level_headings_outside_code(self):
+        """Test that # and ## start sections but headings in fences do not"""
+        sections = split_sections(MANUAL)
+        self.assertEqual([s.splitlines()[0] for s in sections], ['# Manual', '## Install', '# Usage'])
+        self.assertIn('# not a heading', sections[0])
+        self.assertEqual(len(split_sections(MANUAL, max_level=1)), 2)
+
+    def test_reference_definitions_reach_every_section(self):
+        """Test that link references defined in one section resolve in the others"""
+        for section in split_sections(MANUAL):
+            self.assertIn('[dl]: https://example.com/download', section)
+
+    def test_footnotes_keep_the_document_whole(self):
+        """Test that documents with footnotes are not split"""
+        text = "# A\n\nNote[^1]\n\n# B\n\n[^1]: Footnote"
+        self.assertEqual(split_sections(text), [text])
+
+class TestIncrementalRenderer(unittest.TestCase):
+
+    def test_docx_matches_full_render_and_reuses_sections(self):
+        """Test that stitched output matches a full render and only changed sections are rebuilt"""
+        renderer = IncrementalRenderer(RenderCache(max_bytes=16 * 1024 * 1024))
+        full = Document(io.BytesIO(render_docx(MANUAL)))
+        first = Document(io.BytesIO(renderer.docx(MANUAL)))
+        self.assertEqual([p.text for p in first.paragraphs], [p.text for p in full.paragraphs])
+
+        edited = Document(io.BytesIO(renderer.docx(MANUAL.replace('Some *usage*', 'Edited *usage*'))))
+        stats = renderer.stats()
+        self.assertEqual(stats['docx_misses'], 4)
+        self.assertEqual(stats['docx_hits'], 2)
+        self.assertIn('Edited usage text.', [p.text for p in edited.paragraphs])
+
+        # Hyperlinks from cached fragments point at relationships of the new document
+        targets = [edited.part.rels[link.get(qn('r:id'))].target_ref
+                   for link in edited.element.body.iter(qn('w:hyperlink'))]
+        self.assertEqual(targets, ['https://example.com/intro', 'https://example.com/download'])
+
+    def test_html_reuses_cached_sections(self):
+        """Test that section HTML is served from the cache on the second pass"""
+        renderer = IncrementalRenderer(RenderCache(max_bytes=16 * 1024 * 1024))
+        html = renderer.html(MANUAL)
+        self.assertEqual(renderer.html(MANUAL), html)
+        self.assertEqual(renderer.stats()['html_hits'], 3)
+        self.assertIn('href="https://example.com/download"', html)
+
+    def test_heading_ids_match_a_whole_document_render(self):
+        """Test that repeated headings in different sections do not share an id"""
+        text = "# One\n\n## Intro\n\nx\n\n# Two\n\n## Intro\n\ny\n\n## Intro\n"
+        renderer = IncrementalRenderer(RenderCache(max_bytes=16 * 1024 * 1024))
+        ids = lambda html_content: re.findall(r' id="([^"]+)"', html_content)
+        self.assertEqual(ids(renderer.html(text)), ['one', 'intro', 'two', 'intro_1', 'intro_2'])
+        self.assertEqual(ids(renderer.html(text)), ids(parse_document(text)['html']))
+
+    def test_unique_heading_ids(self):
+        fragments = unique_heading_ids(['<h1 id="a">A</h1><h2 id="a_1">A</h2>', '<h1 id="a">A</h1><p id="a">x</p>'])
+        self.assertEqual(fragments[1], '<h1 id="a_2">A</h1><p id="a">x</p>')
+
+    @unittest.skipUnless(load_weasyprint() and pypdf_available(), "WeasyPrint and pypdf required")
+    def test_pdf_reuses_unchanged_chapters(self):
+        """Test that only edited chapters are laid out again"""
+        renderer = IncrementalRenderer(RenderCache(max_bytes=16 * 1024 * 1024))
+        self.assertTrue(renderer.write_pdf(MANUAL, toc_html=parse_document(MANUAL)['toc']).startswith(b'%PDF'))
+        renderer.write_pdf(MANUAL.replace('Some *usage*', 'Edited *usage*'))
+        self.assertEqual(renderer.stats()['chapter_hits'], 1)
+        self.assertEqual(renderer.stats()['chapter_misses'], 3)
+
+    @unittest.skipUnless(pypdf_available(), "pypdf required")
+    def test_pdf_merges_cached_chapters(self):
+        """Test the merge of cached and new chapters, with a one-page layout per chapter standing in for WeasyPrint"""
+        from pypdf import PdfReader, PdfWriter
+
+        def layout(html_content):
+            writer = PdfWriter()
+            writer.add_blank_page(width=595, height=842)
+            buffer = io.BytesIO()
+            writer.write(buffer)
+            return buffer.getvalue(), 1, {name: 0 for name in re.findall(r' id="([^"]+)"', html_content)}
+
+        renderer = IncrementalRenderer(RenderCache(max_bytes=16 * 1024 * 1024))
+        toc = parse_document(MANUAL)['toc']
+        with mock.patch.object(sections, 'render_chunk', side_effect=layout) as render_chunk:
+            first = renderer.write_pdf(MANUAL, toc_html=toc)
+            target = io.BytesIO()
+            self.assertIsNone(renderer.write_pdf(MANUAL.replace('Some *usage*', 'Edited *usage*'), target, toc))
+        self.assertEqual(render_chunk.call_count, 3)
+        self.assertEqual(renderer.stats()['chapter_hits'], 1)
+        for data in (first, target.getvalue()):
+            reader = PdfReader(io.BytesIO(data))
+            self.assertEqual(len(reader.pages), 2)
+            chapters = [item for item in reader.outline if not isinstance(item, list)]
+            self.assertEqual([reader.get_destination_page_number(item) for item in chapters], [0, 1])
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Tests for preloaded, precompressed page serving
+"""
+
+import os
+import sys
+import gzip
+import unittest
+
+# Add the current directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from static_pages import StaticPage, StaticPages, BROTLI_AVAILABLE, accepted_encodings
+
+PAGE = '<html><body>' + '<p>Markdown to PDF</p>' * 200 + '</body></html>'
+
+class TestStaticPages(unittest.TestCase):
+    def setUp(self):
+        self.pages = StaticPages(max_age=60)
+        self.pages.add('page', PAGE)
+
+    def test_identity_response(self):
+        body, status, headers = self.pages.respond('page')
+        self.assertEqual(status, 200)
+        self.assertEqual(body, PAGE.encode('utf-8'))
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertEqual(headers['Cache-Control'], 'public, max-age=60')
+        self.assertEqual(headers['Vary'], 'Accept-Encoding')
+
+    def test_gzip_variant(self):
+        body, status, headers = self.pages.respond('page', accept_encoding='gzip, deflate')
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(body), PAGE.encode('utf-8'))
+        self.assertLess(len(body), len(PAGE))
+        self.assertTrue(headers['ETag'].endswith('-gzip"'))
+
+    @unittest.skipUnless(BROTLI_AVAILABLE, "brotli not installed")
+    def test_brotli_preferred(self):
+        import brotli
+        body, status, headers = self.pages.respond('page', accept_encoding='gzip, br')
+        self.assertEqual(headers['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(body), PAGE.encode('utf-8'))
+
+    def test_refused_encodings_are_not_sent(self):
+        page = StaticPage(PAGE)
+        self.assertEqual(page.choose_encoding('br;q=0, gzip;q=0'), 'identity')
+        self.assertEqual(page.choose_encoding('gzip;q=0'), 'identity')
+        self.assertEqual(page.choose_encoding('br;q=0, gzip;q=0.5'), 'gzip')
+        self.assertEqual(page.choose_encoding('*;q=0'), 'identity')
+        self.assertEqual(page.choose_encoding('*'), 'br' if BROTLI_AVAILABLE else 'gzip')
+        # Names are matched whole, not as substrings
+        self.assertEqual(page.choose_encoding('x-gzipped'), 'identity')
+        self.assertEqual(accepted_encodings('GZIP; q=0.8, br;q=bad'), {'gzip': 0.8, 'br': 0.0})
+
+    def test_conditional_request(self):
+        _, _, headers = self.pages.respond('page', accept_encoding='gzip')
+        body, status, _ = self.pages.respond('page', if_none_match=headers['ETag'])
+        self.assertEqual(status, 304)
+        self.assertEqual(body, b'')
+        self.assertEqual(self.pages.respond('page', if_none_match='"stale"')[1], 200)
+        self.assertEqual(self.pages.stats()['not_modified'], 1)
+
+    def test_unknown_page(self):
+        self.assertIsNone(self.pages.respond('missing'))
+
+class TestPageRoutes(unittest.TestCase):
+    def setUp(self):
+        from app import app
+        self.client = app.test_client()
+
+    def test_blog_post_compressed_and_revalidated(self):
+        response = self.client.get('/blog/convert-markdown-to-pdf-online-free', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn(b'<html', gzip.decompress(response.data).lower())
+
+        response = self.client.get('/blog/convert-markdown-to-pdf-online-free',
+                                   headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_unknown_blog_post(self):
+        self.assertEqual(self.client.get('/blog/not-a-post').status_code, 404)
+
+    def test_home_page(self):
+        response = self.client.get('/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'MarkdownConverter', response.data)
+
+if __name__ == '__main__':
+    unittest.main()
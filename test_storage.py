@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Tests for the pluggable upload storage backends
+"""
+
+import os
+import sys
+import time
+import tempfile
+import unittest
+import multiprocessing
+from unittest import mock
+
+# Add the current directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from storage import MemoryStore, DiskStore, SQLiteStore, DedupStore
+
+def make_record(content='# Hello'):
+    return {'content': content, 'original_filename': 'hello.md', 'upload_time': '2025-01-01T00:00:00'}
+
+def hashed_record(name, content='# Template'):
+    return {**make_record(content), 'original_filename': name, 'content_hash': f'hash-{content}', 'html': '<h1>T</h1>'}
+
+def put_handles(directory, keys):
+    """One worker process uploading the same document under several keys"""
+    store = DedupStore(DiskStore(directory))
+    for key in keys:
+        store.put(key, hashed_record(key))
+
+def delete_handles(directory, keys):
+    """One worker process releasing handles, some of which other workers release too"""
+    store = DedupStore(DiskStore(directory))
+    for key in keys:
+        store.delete(key)
+
+class StoreBehaviour:
+    """Checks shared by every backend"""
+
+    def make_store(self, ttl=3600):
+        raise NotImplementedError
+
+    def test_put_get_delete(self):
+        store = self.make_store()
+        store['a_hello.md'] = make_record()
+        self.assertIn('a_hello.md', store)
+        self.assertEqual(store['a_hello.md']['content'], '# Hello')
+        self.assertEqual(len(store), 1)
+
+        del store['a_hello.md']
+        self.assertNotIn('a_hello.md', store)
+        self.assertIsNone(store.get('a_hello.md'))
+        with self.assertRaises(KeyError):
+            store['a_hello.md']
+
+    def test_expired_records_are_missing(self):
+        store = self.make_store(ttl=0)
+        store.put('old.md', make_record())
+        self.assertIsNone(store.get('old.md'))
+        self.assertEqual(store.expired_keys(), ['old.md'])
+        # Kept until purged, for callers that must clean up after expired records
+        self.assertEqual(store.get('old.md', include_expired=True)['content'], '# Hello')
+        store.purge_expired()
+        self.assertEqual(len(store), 0)
+
+class TestMemoryStore(StoreBehaviour, unittest.TestCase):
+
+    def make_store(self, ttl=3600):
+        return MemoryStore(ttl=ttl, max_bytes=1024)
+
+    def test_byte_cap_evicts_least_recently_used(self):
+        store = MemoryStore(max_bytes=10)
+        store.put('a', make_record('aaaa'))
+        store.put('b', make_record('bbbb'))
+        store.get('a')
+        store.put('c', make_record('cccc'))
+
+        self.assertIsNone(store.get('b'))
+        self.assertIsNotNone(store.get('a'))
+        self.assertEqual(store.stats()['evictions'], 1)
+        self.assertLessEqual(store.stats()['bytes'], 10)
+
+class TestDiskStore(StoreBehaviour, unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_store(self, ttl=3600):
+        return DiskStore(self.tmp.name, ttl=ttl)
+
+    def test_shared_between_instances(self):
+        """Test that a second worker pointing at the same directory sees uploads"""
+        self.make_store().put('shared.md', make_record())
+        self.assertEqual(self.make_store()['shared.md']['original_filename'], 'hello.md')
+
+    def test_len_and_purge_never_read_records(self):
+        """Test that counting uses a kept counter and expiry the index and mtimes, never opening record files"""
+        store = DiskStore(self.tmp.name, count_interval=60)
+        store.put('a.md', make_record())
+        self.assertEqual(len(store), 1)
+        with mock.patch('os.scandir', side_effect=AssertionError('directory listed')):
+            store.put('b.md', make_record())
+            store.put('b.md', make_record())
+            self.assertEqual(len(store), 2)
+            store.delete('a.md')
+            self.assertEqual(len(store), 1)
+
+        # Another worker's record is counted from the next directory scan
+        self.make_store().put('c.md', make_record())
+        real_open = open
+        def open_index_only(path, *args, **kwargs):
+            if str(path).endswith('.json'):
+                raise AssertionError('record opened')
+            return real_open(path, *args, **kwargs)
+        with mock.patch('builtins.open', side_effect=open_index_only):
+            self.assertEqual(store.purge_expired(), 0)
+        self.assertEqual(len(store), 1)
+        store.count_interval = 0
+        self.assertEqual(len(store), 2)
+
+    def test_expiry_uses_the_index_not_the_directory(self):
+        """Test that sweeps find expired records from the index, without listing the directory"""
+        store = DiskStore(self.tmp.name, ttl=60)
+        for key in ('a.md', 'b.md', 'c.md'):
+            store.put(key, make_record())
+        store.put('b.md', make_record())
+        store.delete('c.md')
+        later = time.time() + 61
+        with mock.patch('os.scandir', side_effect=AssertionError('directory listed')), \
+                mock.patch('time.time', return_value=later):
+            self.assertEqual(sorted(store.expired_keys()), ['a.md', 'b.md'])
+            self.assertEqual(store.purge_expired(), 2)
+            self.assertEqual(store.expired_keys(), [])
+        self.assertEqual(len(store), 0)
+        self.assertEqual(store._read_index(), [])
+
+    def test_index_built_for_existing_records(self):
+        """Test that records written before the index existed still expire"""
+        self.make_store(ttl=0).put('old.md', make_record())
+        os.remove(os.path.join(self.tmp.name, DiskStore.INDEX_NAME))
+        store = self.make_store(ttl=0)
+        self.assertEqual(store.expired_keys(), ['old.md'])
+        self.assertEqual(store.purge_expired(), 1)
+
+class TestSQLiteStore(StoreBehaviour, unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_store(self, ttl=3600):
+        return SQLiteStore(os.path.join(self.tmp.name, 'files.sqlite3'), ttl=ttl)
+
+class TestDedupStore(StoreBehaviour, unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_store(self, ttl=3600):
+        return DedupStore(DiskStore(self.tmp.name, ttl=ttl))
+
+    def hashed_record(self, name, content='# Template'):
+        return hashed_record(name, content)
+
+    def test_identical_uploads_share_one_blob(self):
+        store = self.make_store()
+        store.put('a_readme.md', self.hashed_record('README.md'))
+        store.put('b_template.md', self.hashed_record('template.md'))
+
+        # Two handles and one blob
+        self.assertEqual(len(store), 3)
+        self.assertEqual(store.stats()['dedup_hits'], 1)
+        self.assertEqual(store['a_readme.md']['original_filename'], 'README.md')
+        self.assertEqual(store['b_template.md']['original_filename'], 'template.md')
+        self.assertEqual(store['b_template.md']['html'], '<h1>T</h1>')
+        self.assertNotIn('refs', store['a_readme.md'])
+        self.assertEqual(store.find_document('hash-# Template')['content'], '# Template')
+
+    def test_blob_removed_with_last_reference(self):
+        store = self.make_store()
+        store.put('a.md', self.hashed_record('a.md'))
+        store.put('b.md', self.hashed_record('b.md'))
+
+        store.delete('a.md')
+        self.assertIsNone(store.get('a.md'))
+        self.assertEqual(store['b.md']['content'], '# Template')
+
+        store.delete('b.md')
+        self.assertIsNone(store.find_document('hash-# Template'))
+        self.assertEqual(len(store), 0)
+
+    def expire(self, store, key):
+        past = time.time() - store.ttl - 1
+        os.utime(store.store._path(key), (past, past))
+        # As if written then: the expiry index holds write times
+        with open(store.store._index_path, 'a', encoding='utf-8') as f:
+            f.write(store.store._index_line(key, past))
+
+    def blob_refs(self, store):
+        return store.store.get('blob-hash-# Template')['refs']
+
+    def test_delete_after_expiry_releases_reference(self):
+        """Test that the reaper, which deletes handles once they expire, still decrements the blob"""
+        store = self.make_store()
+        store.put('a.md', self.hashed_record('a.md'))
+        store.put('b.md', self.hashed_record('b.md'))
+        self.expire(store, 'a.md')
+        self.assertIsNone(store.get('a.md'))
+
+        store.delete('a.md')
+        self.assertEqual(self.blob_refs(store), 1)
+        store.delete('b.md')
+        self.assertIsNone(store.find_document('hash-# Template'))
+        self.assertEqual(len(store), 0)
+
+    def test_purge_releases_references_of_expired_handles(self):
+        store = self.make_store()
+        store.put('a.md', self.hashed_record('a.md'))
+        store.put('b.md', self.hashed_record('b.md'))
+        self.expire(store, 'a.md')
+
+        self.assertEqual(store.purge_expired(), 1)
+        self.assertEqual(self.blob_refs(store), 1)
+        self.assertEqual(store['b.md']['content'], '# Template')
+
+    def test_delete_is_idempotent(self):
+        store = self.make_store()
+        store.put('a.md', self.hashed_record('a.md'))
+        store.put('b.md', self.hashed_record('b.md'))
+        store.delete('a.md')
+        store.delete('a.md')
+        self.assertEqual(self.blob_refs(store), 1)
+        self.assertEqual(store['b.md']['content'], '# Template')
+
+    def test_reference_counts_shared_between_processes(self):
+        """Test that workers sharing a directory neither lose increments nor release a handle twice"""
+        context = multiprocessing.get_context('spawn')
+        batches = [[f'{worker}-{n}.md' for n in range(20)] for worker in range(4)]
+        workers = [context.Process(target=put_handles, args=(self.tmp.name, keys)) for keys in batches]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        store = self.make_store()
+        self.assertEqual(self.blob_refs(store), 80)
+
+        # Every worker releases the first half of every batch, as racing reapers and purges would
+        released = [key for keys in batches for key in keys[:10]]
+        workers = [context.Process(target=delete_handles, args=(self.tmp.name, released)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.blob_refs(store), 40)
+        self.assertEqual(store['3-19.md']['content'], '# Template')
+
+    def test_distinct_content_not_shared(self):
+        store = self.make_store()
+        store.put('a.md', self.hashed_record('a.md', '# One'))
+        store.put('b.md', self.hashed_record('b.md', '# Two'))
+        self.assertEqual(store['a.md']['content'], '# One')
+        self.assertEqual(store['b.md']['content'], '# Two')
+        self.assertEqual(store.stats()['blobs_created'], 2)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,48 @@
+import re
+from lxml import etree, html as lxml_html
+
+BLOCK_TAGS = {'p', 'div', 'pre', 'blockquote', 'ul', 'ol', 'dl', 'dt', 'dd', 'table', 'hr',
+              'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+HEADING_UNDERLINES = {'h1': '=', 'h2': '-'}
+BLANK_LINES_RE = re.compile(r'\n[ \t]*\n(?:[ \t]*\n)+')
+TRAILING_SPACE_RE = re.compile(r'[ \t]+\n')
+
+
+def html_to_text(html_content):
+    """Render converted markdown as plain text
+
+    Block elements are separated by blank lines, list items get bullets or
+    numbers, table cells are tab-separated and code keeps its line breaks.
+    """
+    root = lxml_html.fragment_fromstring(html_content or '', create_parent='div')
+    etree.strip_elements(root, 'script', 'style', with_tail=False)
+
+    for element in root.iter('br'):
+        element.tail = '\n' + (element.tail or '')
+    for element in root.iter('hr'):
+        element.text = '----'
+    for element in root.iter('img'):
+        alt = element.get('alt')
+        if alt:
+            element.tail = f'[{alt}]' + (element.tail or '')
+    for element in root.iter('td', 'th'):
+        element.tail = '\t'
+    for element in root.iter('tr'):
+        element.tail = '\n'
+    for element in root.iter(*BLOCK_TAGS):
+        element.text = ('\n' if element.tag in ('ul', 'ol') else '\n\n') + (element.text or '')
+        element.tail = '\n\n' + (element.tail or '')
+    for element in root.iter('ol', 'ul'):
+        indent = '  ' * sum(1 for _ in element.iterancestors('ul', 'ol'))
+        for number, item in enumerate(element.iterchildren('li'), 1):
+            marker = indent + (f'{number}. ' if element.tag == 'ol' else '- ')
+            # Loose list items wrap their text in a paragraph
+            target = item[0] if not (item.text or '').strip() and len(item) and item[0].tag == 'p' else item
+            target.text = marker + (target.text or '').lstrip()
+            item.tail = '\n' + (item.tail or '').strip()
+    for element in root.iter(*HEADING_UNDERLINES):
+        title = element.text_content().strip()
+        element.tail = '\n' + HEADING_UNDERLINES[element.tag] * len(title) + element.tail
+
+    text = TRAILING_SPACE_RE.sub('\n', root.text_content())
+    return BLANK_LINES_RE.sub('\n\n', text).strip() + '\n'